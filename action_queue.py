@@ -0,0 +1,245 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first: enforcement before notifications
+PRIORITY = {'ban': 0, 'kick': 1, 'quarantine': 2, 'timeout': 3, 'unquarantine': 4, 'dm': 8, 'log': 9}
+# A pending enforcement action makes requests of equal or lower severity against the same user redundant
+SEVERITY = {'ban': 3, 'kick': 2, 'quarantine': 1, 'timeout': 1}
+# Concurrent requests per route kind (route = (kind, scope)); unknown kinds get 1
+DEFAULT_ROUTE_LIMITS = {'ban': 1, 'member': 4, 'dm': 2, 'log': 1}
+
+Route = Tuple[Hashable, ...]
+
+class _Job:
+    __slots__ = ('priority', 'seq', 'kind', 'route', 'run', 'target', 'dedupe_key', 'group_id', 'enqueued_at')
+
+    def __init__(self, priority: int, seq: int, kind: str, route: Route, run: Optional[Callable[[], Awaitable[Any]]],
+                 target: Optional[Tuple[Hashable, Hashable]], dedupe_key: Optional[Hashable],
+                 group_id: Optional[int], enqueued_at: float):
+        self.priority = priority
+        self.seq = seq
+        self.kind = kind
+        self.route = route
+        self.run = run
+        self.target = target
+        self.dedupe_key = dedupe_key
+        # Coalesced group this job flushes, if any
+        self.group_id = group_id
+        self.enqueued_at = enqueued_at
+
+    def __lt__(self, other: '_Job') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class ActionQueue:
+    """
+    Prioritised, de-duplicating async queue for moderation REST calls.
+
+    Event handlers submit() and return at once; a pool of workers drains
+    the queue, highest priority (bans) first. At most route_limits[kind]
+    jobs per route are handed to the workers at a time and the rest wait
+    in that route's own heap, so a saturated route never holds a worker
+    and one guild's raid cannot starve the rest. Repeated requests
+    against the same user are dropped while an equal or stronger action
+    is pending, and kinds with a coalescer (bulk ban) are merged into one
+    call per group.
+    """
+
+    def __init__(self, workers: int = 8, route_limits: Optional[Dict[str, int]] = None, bulk_size: int = 200):
+        self.worker_count = workers
+        self.route_limits = dict(DEFAULT_ROUTE_LIMITS, **(route_limits or {}))
+        self.bulk_size = bulk_size
+
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._seq = itertools.count()
+        # route -> jobs of that route queued for the workers or running, capped at its limit
+        self._dispatched: Dict[Route, int] = defaultdict(int)
+        # route -> heap of its jobs waiting for a free slot
+        self._route_pending: Dict[Route, List[_Job]] = {}
+        # kind -> async fn(group_key, items) that runs one merged call
+        self._coalescers: Dict[str, Callable[[Hashable, List[Any]], Awaitable[Any]]] = {}
+        # group_id -> (group_key, [(item, target, dedupe_key)]) waiting for the group's flush job
+        self._groups: Dict[int, Tuple[Hashable, List[tuple]]] = {}
+        # group_key -> id of the group still accepting items
+        self._open_groups: Dict[Hashable, int] = {}
+        # (guild_id, user_id) -> severities of pending/in-flight enforcement
+        self._pending_targets: Dict[Tuple[Hashable, Hashable], List[int]] = defaultdict(list)
+        self._pending_keys = set()
+
+        self.submitted = 0
+        self.executed = 0
+        self.failed = 0
+        self.deduplicated = 0
+        self.coalesced = 0
+        self.in_flight = 0
+        self.executed_by_kind: Dict[str, int] = defaultdict(int)
+        self._total_wait = 0.0
+        self._jobs_started = 0
+        # Completion times for the drain rate
+        self._completions = deque(maxlen=10000)
+
+    def register_coalescer(self, kind: str, handler: Callable[[Hashable, List[Any]], Awaitable[Any]]):
+        self._coalescers[kind] = handler
+
+    def start(self):
+        """Start the worker pool (needs a running event loop)"""
+        if self._workers:
+            return
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self, timeout: float = 10.0):
+        """Let queued actions drain for up to timeout seconds, then cancel the workers"""
+        if self._queue is not None and self._workers:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Moderation queue stopped with {self.depth()} action(s) pending")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, kind: str, route: Route, run: Optional[Callable[[], Awaitable[Any]]] = None,
+               target: Optional[Tuple[Hashable, Hashable]] = None, dedupe_key: Optional[Hashable] = None,
+               group_key: Optional[Hashable] = None, item: Any = None) -> bool:
+        """
+        Queue an action. target (guild_id, user_id) enables severity
+        de-duplication for enforcement kinds, dedupe_key drops exact
+        repeats, and group_key/item merge the action into the kind's
+        coalescer. Returns False if the action was dropped as redundant.
+        """
+        severity = SEVERITY.get(kind)
+        if target is not None and severity is not None:
+            if any(pending >= severity for pending in self._pending_targets.get(target, ())):
+                self.deduplicated += 1
+                return False
+        if dedupe_key is not None:
+            if dedupe_key in self._pending_keys:
+                self.deduplicated += 1
+                return False
+            self._pending_keys.add(dedupe_key)
+        if target is not None and severity is not None:
+            self._pending_targets[target].append(severity)
+
+        self.submitted += 1
+        group_id = None
+        if group_key is not None and kind in self._coalescers:
+            group_id = self._open_groups.get(group_key)
+            if group_id is not None:
+                entries = self._groups[group_id][1]
+                entries.append((item, target, dedupe_key))
+                self.coalesced += 1
+                if len(entries) >= self.bulk_size:
+                    del self._open_groups[group_key]
+                return True
+            group_id = next(self._seq)
+            self._groups[group_id] = (group_key, [(item, target, dedupe_key)])
+            self._open_groups[group_key] = group_id
+
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        if not self._workers:
+            self.start()
+        job = _Job(PRIORITY.get(kind, 5), next(self._seq), kind, route, run, target, dedupe_key, group_id,
+                   time.monotonic())
+        if self._dispatched[route] < self.route_limits.get(route[0], 1):
+            self._dispatched[route] += 1
+            self._queue.put_nowait(job)
+        else:
+            heapq.heappush(self._route_pending.setdefault(route, []), job)
+        return True
+
+    async def _worker(self):
+        queue = self._queue
+        while True:
+            job = await queue.get()
+            try:
+                await self._execute(job)
+            finally:
+                # Hand the route's slot on before task_done, so join() also waits for route-pending jobs
+                self._dispatch_next(job.route)
+                queue.task_done()
+
+    def _dispatch_next(self, route: Route):
+        """Give a finished job's slot to the route's next pending job, or free it"""
+        pending = self._route_pending.get(route)
+        if pending:
+            self._queue.put_nowait(heapq.heappop(pending))
+            if not pending:
+                del self._route_pending[route]
+        else:
+            self._dispatched[route] -= 1
+            if not self._dispatched[route]:
+                del self._dispatched[route]
+
+    async def _execute(self, job: _Job):
+        group_key = None
+        if job.group_id is not None:
+            # Close the group only now, so items keep joining while the job waits
+            group_key, entries = self._groups.pop(job.group_id)
+            if self._open_groups.get(group_key) == job.group_id:
+                del self._open_groups[group_key]
+        else:
+            entries = [(None, job.target, job.dedupe_key)]
+
+        self.in_flight += 1
+        self._jobs_started += 1
+        self._total_wait += time.monotonic() - job.enqueued_at
+        try:
+            if job.group_id is not None:
+                await self._coalescers[job.kind](group_key, [entry[0] for entry in entries])
+            else:
+                await job.run()
+            self.executed += len(entries)
+            self.executed_by_kind[job.kind] += len(entries)
+        except Exception as e:
+            self.failed += len(entries)
+            logger.error(f"Moderation action {job.kind} on {job.route} failed: {e}")
+        finally:
+            self.in_flight -= 1
+            now = time.monotonic()
+            for _, target, dedupe_key in entries:
+                self._completions.append(now)
+                self._release(job.kind, target, dedupe_key)
+
+    def _release(self, kind: str, target, dedupe_key):
+        if dedupe_key is not None:
+            self._pending_keys.discard(dedupe_key)
+        severity = SEVERITY.get(kind)
+        if target is not None and severity is not None:
+            pending = self._pending_targets.get(target)
+            if pending:
+                pending.remove(severity)
+                if not pending:
+                    del self._pending_targets[target]
+
+    def depth(self) -> int:
+        """Jobs waiting for a worker or for a slot on their route"""
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return queued + sum(len(pending) for pending in self._route_pending.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        recent = sum(1 for completed in self._completions if now - completed <= 60)
+        started = self._jobs_started
+        return {
+            'depth': self.depth(),
+            'in_flight': self.in_flight,
+            'submitted': self.submitted,
+            'executed': self.executed,
+            'failed': self.failed,
+            'deduplicated': self.deduplicated,
+            'coalesced': self.coalesced,
+            'executed_by_kind': dict(self.executed_by_kind),
+            'drain_rate_per_min': recent,
+            'avg_wait_ms': round(self._total_wait / started * 1000, 2) if started else 0.0
+        }
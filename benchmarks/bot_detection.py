@@ -0,0 +1,85 @@
+"""
+Score a join burst with BotDetector.analyze_member (one call per member)
+and with analyze_members (one batch), and check both reach the same
+verdicts.
+
+    python benchmarks/bot_detection.py [--members 500] [--rounds 20]
+
+Needs discord.py installed (bot_detection imports it for type hints);
+members are lightweight stand-ins, not real discord objects. Per-member
+INFO logging is disabled so only the scoring is measured.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import string
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_detection import BotDetector
+from config import ConfigManager
+
+DEFAULT_AVATAR = object()
+
+def make_members(count):
+    now = datetime.utcnow()
+    guild = SimpleNamespace(id=1)
+    members = []
+    for i in range(count):
+        raider = random.random() < 0.6
+        if raider:
+            name = 'user' + ''.join(random.choices(string.digits, k=random.randint(3, 6)))
+            created = now - timedelta(minutes=random.randint(1, 600))
+        else:
+            name = random.choice(['alex', 'minh', 'sarah', 'nguyen', 'chris', 'linh']) + random.choice(['', '_', '.']) \
+                + ''.join(random.choices(string.ascii_lowercase, k=random.randint(0, 5)))
+            created = now - timedelta(days=random.randint(0, 2000))
+        avatar = None if raider and random.random() < 0.8 else object()
+        members.append(SimpleNamespace(
+            id=10 ** 17 + i, guild=guild, roles=(), name=name, display_name=name,
+            created_at=created, joined_at=now, avatar=avatar,
+            display_avatar=avatar or DEFAULT_AVATAR, default_avatar=DEFAULT_AVATAR
+        ))
+    return members
+
+async def per_member(detector, members):
+    return [await detector.analyze_member(member) for member in members]
+
+async def batched(detector, members):
+    return await detector.analyze_members(members)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    random.seed(args.seed)
+    members = make_members(args.members)
+    config_manager = ConfigManager()
+
+    results = {}
+    print(f"{'path':<12} {'ms/burst':>9} {'members/s':>10} {'flagged':>8}")
+    for name, run in (('per-member', per_member), ('batch', batched)):
+        detector = BotDetector(config_manager)
+        verdicts = asyncio.run(run(detector, members))
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            asyncio.run(run(detector, members))
+        elapsed = (time.perf_counter() - started) / args.rounds
+        results[name] = verdicts
+        print(f"{name:<12} {elapsed * 1000:>9.2f} {len(members) / elapsed:>10.0f} {sum(verdicts):>8}")
+
+    mismatches = sum(a != b for a, b in zip(results['per-member'], results['batch']))
+    print(f"verdict mismatches: {mismatches}")
+
+if __name__ == '__main__':
+    main()
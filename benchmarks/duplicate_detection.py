@@ -0,0 +1,137 @@
+"""
+Compare SpamDetector's old exact-count duplicate tracking with the SimHash
+NearDuplicateIndex: per-message cost on distinct chatter and on verbatim
+repeats, and how many mutated spam bursts each one catches. The "short+"
+column is the share of users flagged for five one-word replies that differ
+only in punctuation ("yes!", "yes.", "yes?").
+
+    python benchmarks/duplicate_detection.py [--users 2000] [--messages 50]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from near_duplicate import NearDuplicateIndex
+
+WORDS = ("the a to is in it you that of and i for on was with he she they we this my your game play server "
+         "discord time help get can will just like know what so good when one all do new out up see about how").split()
+SPAM = [
+    "FREE NITRO for everyone click here https://discord-gift.com/abc",
+    "join my server for free robux giveaway today only",
+    "buy cheap followers now at example dot com best prices",
+]
+
+class ExactCounter:
+    """The pre-SimHash algorithm: exact lowercase counts with an O(n) min() eviction"""
+
+    def __init__(self):
+        self.duplicate_messages = defaultdict(lambda: defaultdict(int))
+
+    def add(self, user_id, content):
+        content = content.strip().lower()
+        self.duplicate_messages[user_id][content] += 1
+        count = self.duplicate_messages[user_id][content]
+        if len(self.duplicate_messages[user_id]) > 20:
+            oldest_content = min(self.duplicate_messages[user_id].keys(),
+                                 key=lambda k: self.duplicate_messages[user_id][k])
+            del self.duplicate_messages[user_id][oldest_content]
+        return count
+
+class SimHashCounter:
+    def __init__(self, max_distance):
+        self.max_distance = max_distance
+        self.indexes = {}
+
+    def add(self, user_id, content):
+        index = self.indexes.get(user_id)
+        if index is None:
+            index = self.indexes[user_id] = NearDuplicateIndex(max_distance=self.max_distance)
+        return index.add(content)
+
+def mutate(text, edits=1):
+    for _ in range(edits):
+        i = random.randrange(len(text))
+        text = text[:i] + random.choice(string.ascii_letters + string.digits) + text[i + 1:]
+    return text
+
+def chat_stream(users, messages):
+    for _ in range(messages):
+        for user in range(users):
+            yield str(user), ' '.join(random.choices(WORDS, k=random.randint(3, 14)))
+
+def repeat_stream(users, messages):
+    """Every user posts the same line over and over, like a flood of copy-pasted spam"""
+    lines = [' '.join(random.choices(WORDS, k=random.randint(3, 14))) for _ in range(users)]
+    for _ in range(messages):
+        for user in range(users):
+            yield str(user), lines[user]
+
+def throughput(counter, stream):
+    started = time.perf_counter()
+    count = 0
+    for user_id, content in stream:
+        counter.add(user_id, content)
+        count += 1
+    return (time.perf_counter() - started) / count * 1e6
+
+def detection_rate(make_counter, edits, bursts=300, threshold=3):
+    """Fraction of 5-message mutated spam bursts whose count exceeds the duplicate threshold"""
+    caught = 0
+    for burst in range(bursts):
+        counter = make_counter()
+        base = random.choice(SPAM)
+        counts = [counter.add('spammer', mutate(base, edits) if i else base) for i in range(5)]
+        caught += max(counts) > threshold
+    return caught / bursts
+
+def false_positive_rate(make_counter, messages=2000, threshold=3):
+    """Fraction of ordinary messages whose duplicate count exceeds the threshold"""
+    counter = make_counter()
+    flagged = 0
+    for i in range(messages):
+        content = ' '.join(random.choices(WORDS, k=random.randint(3, 14)))
+        flagged += counter.add('chatter', content) > threshold
+    return flagged / messages
+
+def short_false_positive_rate(make_counter, users=400, threshold=3):
+    """Fraction of users flagged for answering with one word five times, punctuated differently each time"""
+    counter = make_counter()
+    flagged = 0
+    for user in range(users):
+        word = random.choice(WORDS)
+        endings = random.sample(['!', '.', '?', '!!', '?!', '...', '!!!', '??'], 5)
+        flagged += max(counter.add(f'chatter{user}', word + ending) for ending in endings) > threshold
+    return flagged / users
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    candidates = [
+        ('exact (old)', ExactCounter),
+        ('simhash d=0', lambda: SimHashCounter(0)),
+        ('simhash d=10', lambda: SimHashCounter(10)),
+    ]
+
+    print(f"{'method':<14} {'us/msg':>8} {'repeat':>8} {'1 edit':>8} {'2 edits':>8} {'3 edits':>8} {'false+':>8} {'short+':>8}")
+    for name, make_counter in candidates:
+        random.seed(args.seed)
+        cost = throughput(make_counter(), chat_stream(args.users, args.messages))
+        repeat_cost = throughput(make_counter(), repeat_stream(args.users, args.messages))
+        rates = [detection_rate(make_counter, edits) for edits in (1, 2, 3)]
+        false_positives = false_positive_rate(make_counter)
+        short_false_positives = short_false_positive_rate(make_counter)
+        print(f"{name:<14} {cost:>8.2f} {repeat_cost:>8.2f} " + ' '.join(f"{rate:>8.0%}" for rate in rates)
+              + f" {false_positives:>8.2%} {short_false_positives:>8.2%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Measure what logger.info costs the event loop thread with the old
+synchronous handlers (StreamHandler + FileHandler on the root logger)
+and with setup_logging's QueueHandler/QueueListener pipeline.
+
+    python benchmarks/logging_overhead.py [--records 20000] [--slow-disk-us 0]
+
+Each record is logged from a coroutine, like the join/detection log
+lines, and timed individually. The console stream goes to a file in a
+temporary directory. --slow-disk-us adds a sleep to every file write to
+stand in for a slow or contended disk.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging_setup
+
+def legacy_setup(log_dir):
+    """The pre-queue setup_logging: handlers run on the logging thread"""
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    root_logger.addHandler(console_handler)
+    file_handler = logging.FileHandler(os.path.join(log_dir, 'antibot_legacy.log'), encoding='utf-8')
+    file_handler.setFormatter(formatter)
+    root_logger.addHandler(file_handler)
+    return file_handler
+
+def slow_down(handler, delay_us):
+    """Make every write through handler sleep for delay_us"""
+    if not delay_us:
+        return
+    emit = handler.emit
+
+    def slow_emit(record):
+        time.sleep(delay_us / 1e6)
+        emit(record)
+    handler.emit = slow_emit
+
+async def log_records(count):
+    logger = logging.getLogger('bot_detection')
+    timings = []
+    for i in range(count):
+        started = time.perf_counter_ns()
+        logger.info(f"Analyzed member user{i}#0001: suspicion score 3/6 (Account age: 2 days, No avatar)")
+        timings.append(time.perf_counter_ns() - started)
+        if i % 100 == 0:
+            await asyncio.sleep(0)
+    return timings
+
+def report(name, timings, wall):
+    timings.sort()
+    p99 = timings[int(len(timings) * 0.99)]
+    print(f"{name:<8} {statistics.mean(timings) / 1000:>9.2f} {timings[len(timings) // 2] / 1000:>8.2f} "
+          f"{p99 / 1000:>8.2f} {timings[-1] / 1000:>9.1f} {wall * 1000:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--slow-disk-us', type=int, default=0)
+    args = parser.parse_args()
+
+    real_stderr = sys.stderr
+    with tempfile.TemporaryDirectory() as log_dir, open(os.path.join(log_dir, 'console.log'), 'w') as console:
+        print(f"{'setup':<8} {'mean_us':>9} {'p50_us':>8} {'p99_us':>8} {'max_us':>9} {'wall_ms':>9}")
+        sys.stderr = console
+        try:
+            file_handler = legacy_setup(log_dir)
+            slow_down(file_handler, args.slow_disk_us)
+            started = time.perf_counter()
+            timings = asyncio.run(log_records(args.records))
+            report('sync', timings, time.perf_counter() - started)
+
+            listener = logging_setup.setup_logging(log_dir=log_dir)
+            slow_down(listener.handlers[-1], args.slow_disk_us)
+            started = time.perf_counter()
+            timings = asyncio.run(log_records(args.records))
+            report('queued', timings, time.perf_counter() - started)
+            drain_started = time.perf_counter()
+            logging_setup.shutdown_logging()
+            drained = time.perf_counter() - drain_started
+        finally:
+            sys.stderr = real_stderr
+    print(f"listener drained its backlog {drained * 1000:.1f}ms after the loop finished")
+
+if __name__ == '__main__':
+    main()
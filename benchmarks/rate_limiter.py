@@ -0,0 +1,116 @@
+"""
+Compare SpamDetector's old per-user timestamp deque with the sliding-window
+RateLimiter: cost per message, memory per tracked user, how soon a flood is
+caught, and the count reported for a user just over the limit (steady one
+message per 1.5s against 5/10s; with a 30/300s limit as well, the longer
+window is the one reported).
+
+    python benchmarks/rate_limiter.py [--users 20000] [--messages 20]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict, deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import RateLimit, RateLimiter
+
+class DequeCounter:
+    """The pre-RateLimiter algorithm: a 50-entry timestamp deque per user, trimmed on every message"""
+
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+        self.user_message_times = defaultdict(lambda: deque(maxlen=50))
+
+    def hit(self, user_id, now):
+        message_times = self.user_message_times[user_id]
+        cutoff_time = now - self.period
+        while message_times and message_times[0] < cutoff_time:
+            message_times.popleft()
+        message_times.append(now)
+        return len(message_times) - self.limit
+
+    def count(self, user_id, now):
+        return self.hit(user_id, now) + self.limit
+
+class WindowCounter:
+    def __init__(self, limits):
+        self.limits = limits
+        self.limiter = RateLimiter(max_keys=10 ** 7, clock=lambda: 0.0)
+
+    def hit(self, user_id, now):
+        return self.limiter.excess(user_id, self.limits, now)[0]
+
+    def count(self, user_id, now):
+        return self.limiter.excess(user_id, self.limits, now)[1]
+
+def stream(users, messages):
+    now = 0.0
+    for _ in range(messages):
+        for user in range(users):
+            now += random.random() * 0.001
+            yield user, now
+
+def measure(counter, events):
+    started = time.perf_counter()
+    for user_id, now in events:
+        counter.hit(user_id, now)
+    return (time.perf_counter() - started) / len(events) * 1e6
+
+def memory_per_user(make_counter, users, messages):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    counter = make_counter()
+    for user_id, now in stream(users, messages):
+        counter.hit(user_id, now)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return used / users
+
+def burst_detection(make_counter, rate):
+    """Messages a flooding user gets through before the first over-limit hit"""
+    counter = make_counter()
+    now = 0.0
+    for sent in range(1, 1000):
+        now += 1.0 / rate
+        if counter.hit('flooder', now) > 0:
+            return sent
+    return None
+
+def steady_count(make_counter, gap=1.5, messages=100):
+    """Largest count reported for a user sending one message every gap seconds"""
+    counter = make_counter()
+    return max(counter.count('chatter', 0.37 + i * gap) for i in range(messages))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    candidates = [
+        ('deque (old)', lambda: DequeCounter(5, 10)),
+        ('window 1 limit', lambda: WindowCounter([RateLimit(5, 10)])),
+        ('window 2 limits', lambda: WindowCounter([RateLimit(5, 10), RateLimit(30, 300)])),
+    ]
+
+    print(f"{'method':<16} {'us/msg':>8} {'B/user':>8} {'caught@2/s':>11} {'count@1/1.5s':>13}")
+    for name, make_counter in candidates:
+        random.seed(args.seed)
+        events = list(stream(args.users, args.messages))
+        cost = measure(make_counter(), events)
+        random.seed(args.seed)
+        memory = memory_per_user(make_counter, args.users, args.messages)
+        caught = burst_detection(make_counter, 2.0)
+        steady = steady_count(make_counter)
+        print(f"{name:<16} {cost:>8.2f} {memory:>8.0f} {caught!s:>11} {steady:>13}")
+
+if __name__ == '__main__':
+    main()
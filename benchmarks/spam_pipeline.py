@@ -0,0 +1,98 @@
+"""
+Compare SpamDetector.check_message with and without early-exit short
+circuiting on ordinary chat plus a share of spam: median/p95 time per
+message and whether both reach the same verdicts. --tree runs the same
+stream against another checkout instead (e.g. a git worktree of an older
+commit), to compare the pipeline against the code it replaced.
+
+    python benchmarks/spam_pipeline.py [--messages 20000] [--spam-share 0.02] [--tree DIR]
+
+Needs discord.py installed (spam_detection imports it for type hints);
+messages are lightweight stand-ins, not real discord objects.
+"""
+import argparse
+import asyncio
+import inspect
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = ("the a to is in it you that of and i for on was with he she they we this my your game play server "
+         "discord time help get can will just like know what so good when one all do new out up see about how").split()
+SPAM = [
+    "FREE NITRO for everyone click here https://discord-gift.com/abc @everyone",
+    "join my server for free robux giveaway today only https://bit.ly/xyz",
+]
+
+def make_messages(count, users, spam_share):
+    guild = SimpleNamespace(id=1, name='bench')
+    channels = [SimpleNamespace(id=100 + i) for i in range(5)]
+    authors = [SimpleNamespace(id=1000 + i, roles=(), bot=False) for i in range(users)]
+    spammer = SimpleNamespace(id=1, roles=(), bot=False)
+    messages = []
+    for i in range(count):
+        if random.random() < spam_share:
+            author, content, everyone = spammer, random.choice(SPAM), True
+        else:
+            author, content, everyone = random.choice(authors), ' '.join(random.choices(WORDS, k=random.randint(3, 14))), False
+        messages.append(SimpleNamespace(
+            id=i, guild=guild, channel=random.choice(channels), author=author, content=content,
+            mentions=[], role_mentions=[], mention_everyone=everyone
+        ))
+    return messages
+
+async def run(detector, messages):
+    verdicts = []
+    durations = []
+    for message in messages:
+        started = time.perf_counter_ns()
+        verdicts.append(await detector.check_message(message))
+        durations.append(time.perf_counter_ns() - started)
+    return verdicts, durations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--spam-share', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--tree', default=ROOT, help="checkout to import SpamDetector from")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.tree))
+    from config import ConfigManager
+    from spam_detection import SpamDetector
+
+    logging.disable(logging.WARNING)
+    random.seed(args.seed)
+    messages = make_messages(args.messages, args.users, args.spam_share)
+    config_manager = ConfigManager()
+
+    if 'short_circuit' in inspect.signature(SpamDetector).parameters:
+        pipelines = {'full': {'short_circuit': False}, 'short-circuit': {'short_circuit': True}}
+    else:
+        pipelines = {'unstaged': {}}
+
+    results = {}
+    print(f"{'pipeline':<14} {'p50 us':>8} {'p95 us':>8} {'spam':>6}")
+    for name, options in pipelines.items():
+        detector = SpamDetector(config_manager, **options)
+        verdicts, durations = asyncio.run(run(detector, messages))
+        durations.sort()
+        results[name] = verdicts
+        p50 = statistics.median(durations) / 1000
+        p95 = durations[int(len(durations) * 0.95)] / 1000
+        print(f"{name:<14} {p50:>8.1f} {p95:>8.1f} {sum(verdicts):>6}")
+
+    if len(results) == 2:
+        mismatches = sum(a != b for a, b in zip(results['full'], results['short-circuit']))
+        print(f"verdict mismatches: {mismatches}")
+
+if __name__ == '__main__':
+    main()
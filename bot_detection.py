@@ -1,15 +1,40 @@
 import discord
-import re
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
-from config import ConfigManager
+from typing import List, Dict, Any, Sequence
+from config import ConfigManager, GuildPolicy
+from confusables import SkeletonCache
 
 logger = logging.getLogger(__name__)
 
+# Maximum points per check: account age, profile picture, username, join behavior
+AGE_POINTS, AVATAR_POINTS, NAME_POINTS, JOIN_POINTS = 3, 2, 3, 2
+
+def _age_points(age_days: int, min_age_days: int) -> int:
+    if age_days >= min_age_days:
+        return 0
+    if age_days < 1:
+        return 3
+    if age_days < 3:
+        return 2
+    return 1
+
+def _join_points(seconds_after_creation: float) -> int:
+    if seconds_after_creation < 300:
+        return 2
+    if seconds_after_creation < 3600:
+        return 1
+    return 0
+
+def _is_suspicious(score: int, max_score: int) -> bool:
+    """score / max_score >= 60%, in integers"""
+    return max_score > 0 and score * 5 >= max_score * 3
+
 class BotDetector:
     def __init__(self, config_manager: ConfigManager):
         self.config_manager = config_manager
+        # Homoglyph-folded usernames; the same names recur across joins and guilds
+        self.name_skeletons = SkeletonCache(max_size=20000)
         
     async def analyze_member(self, member: discord.Member) -> bool:
         """
@@ -17,13 +42,13 @@ class BotDetector:
         Returns True if member appears to be a bot/malicious
         """
         guild_id = str(member.guild.id)
-        config = self.config_manager.get_guild_config(guild_id)
+        policy = self.config_manager.get_guild_policy(guild_id)
         
-        if not config['bot_detection']['enabled']:
+        if not policy.bot_detection_enabled:
             return False
             
         # Check if member is whitelisted
-        if self._is_whitelisted(member, config):
+        if self._is_whitelisted(member, policy):
             return False
             
         suspicious_score = 0
@@ -31,32 +56,32 @@ class BotDetector:
         reasons = []
         
         # Check account age
-        age_score, age_reason = self._check_account_age(member, config)
+        age_score, age_reason = self._check_account_age(member, policy)
         suspicious_score += age_score
-        max_score += 3
+        max_score += AGE_POINTS
         if age_reason:
             reasons.append(age_reason)
         
         # Check profile picture
-        if config['bot_detection']['check_profile_picture']:
+        if policy.check_profile_picture:
             pic_score, pic_reason = self._check_profile_picture(member)
             suspicious_score += pic_score
-            max_score += 2
+            max_score += AVATAR_POINTS
             if pic_reason:
                 reasons.append(pic_reason)
         
         # Check username patterns
-        if config['bot_detection']['check_username_patterns']:
-            name_score, name_reason = self._check_username_patterns(member, config)
+        if policy.check_username_patterns:
+            name_score, name_reason = self._check_username_patterns(member, policy)
             suspicious_score += name_score
-            max_score += 3
+            max_score += NAME_POINTS
             if name_reason:
                 reasons.append(name_reason)
         
         # Check join behavior
         behavior_score, behavior_reason = self._check_join_behavior(member)
         suspicious_score += behavior_score
-        max_score += 2
+        max_score += JOIN_POINTS
         if behavior_reason:
             reasons.append(behavior_reason)
         
@@ -69,28 +94,65 @@ class BotDetector:
             logger.info(f"Reasons: {', '.join(reasons)}")
         
         # Consider suspicious if score is above threshold (60%)
-        return suspicion_percentage >= 60
+        return _is_suspicious(suspicious_score, max_score)
     
-    def _is_whitelisted(self, member: discord.Member, config: Dict[str, Any]) -> bool:
-        """Check if member is whitelisted"""
-        whitelist = config.get('whitelist', {})
+    async def analyze_members(self, members: Sequence[discord.Member]) -> List[bool]:
+        """
+        Score a burst of joins together; same verdicts as analyze_member.
+        Config is resolved once per guild and username checks once per
+        distinct name, and each member is scored in a single pass.
+        """
+        verdicts = [False] * len(members)
+        now = datetime.utcnow()
+        policies: Dict[int, GuildPolicy] = {}
+        name_scores: Dict[tuple, int] = {}
+        scored = 0
+        flagged = 0
         
-        # Check user whitelist
-        if str(member.id) in whitelist.get('users', []):
-            return True
+        for index, member in enumerate(members):
+            guild_id = member.guild.id
+            policy = policies.get(guild_id)
+            if policy is None:
+                policy = policies[guild_id] = self.config_manager.get_guild_policy(str(guild_id))
+            if not policy.bot_detection_enabled or self._is_whitelisted(member, policy):
+                continue
+            scored += 1
             
-        # Check role whitelist
-        member_role_ids = [str(role.id) for role in member.roles]
-        whitelisted_roles = whitelist.get('roles', [])
-        
-        if any(role_id in member_role_ids for role_id in whitelisted_roles):
-            return True
+            created_at = member.created_at
+            joined_at = member.joined_at
+            # A missing creation date scores 2, as in _check_account_age
+            score = _age_points((now - created_at.replace(tzinfo=None)).days, policy.min_account_age_days) if created_at else 2
+            if created_at and joined_at:
+                score += _join_points((joined_at - created_at).total_seconds())
+            maximum = AGE_POINTS + JOIN_POINTS
             
-        return False
+            if policy.check_profile_picture:
+                maximum += AVATAR_POINTS
+                score += self._check_profile_picture(member)[0]
+            
+            if policy.check_username_patterns:
+                maximum += NAME_POINTS
+                key = (guild_id, member.name, member.display_name)
+                name_score = name_scores.get(key)
+                if name_score is None:
+                    name_score = name_scores[key] = self._check_username_patterns(member, policy)[0]
+                score += name_score
+            
+            if _is_suspicious(score, maximum):
+                verdicts[index] = True
+                flagged += 1
+        
+        if members:
+            logger.info(f"Batch bot analysis: {flagged}/{scored} suspicious ({len(members)} joins, {len(policies)} guild(s))")
+        return verdicts
     
-    def _check_account_age(self, member: discord.Member, config: Dict[str, Any]) -> tuple:
+    def _is_whitelisted(self, member: discord.Member, policy: GuildPolicy) -> bool:
+        """Check if member is whitelisted"""
+        return policy.is_whitelisted(member)
+    
+    def _check_account_age(self, member: discord.Member, policy: GuildPolicy) -> tuple:
         """Check if account is too new"""
-        min_age_days = config['bot_detection']['min_account_age_days']
+        min_age_days = policy.min_account_age_days
         
         if not member.created_at:
             return 2, "No creation date available"
@@ -98,13 +160,13 @@ class BotDetector:
         account_age = datetime.utcnow() - member.created_at.replace(tzinfo=None)
         age_days = account_age.days
         
-        if age_days < min_age_days:
-            if age_days < 1:
-                return 3, f"Very new account (created {account_age})"
-            elif age_days < 3:
-                return 2, f"New account ({age_days} days old)"
-            else:
-                return 1, f"Relatively new account ({age_days} days old)"
+        points = _age_points(age_days, min_age_days)
+        if points == 3:
+            return 3, f"Very new account (created {account_age})"
+        elif points == 2:
+            return 2, f"New account ({age_days} days old)"
+        elif points == 1:
+            return 1, f"Relatively new account ({age_days} days old)"
                 
         return 0, None
     
@@ -119,21 +181,22 @@ class BotDetector:
             
         return 0, None
     
-    def _check_username_patterns(self, member: discord.Member, config: Dict[str, Any]) -> tuple:
+    def _check_username_patterns(self, member: discord.Member, policy: GuildPolicy) -> tuple:
         """Check username for suspicious patterns"""
         username = member.name.lower()
         display_name = member.display_name.lower()
         
-        suspicious_patterns = config['bot_detection'].get('suspicious_patterns', [])
-        
-        # Check against defined patterns
-        for pattern in suspicious_patterns:
-            try:
-                if re.search(pattern, username) or re.search(pattern, display_name):
+        # Check against defined patterns (compiled once when the config is loaded),
+        # on the names as written and on their homoglyph skeletons
+        names = {username, display_name, self.name_skeletons(member.name), self.name_skeletons(member.display_name)}
+        combined = policy.suspicious_name_pattern
+        if combined is not None:
+            if any(combined.search(name) for name in names):
+                return 3, f"Username matches suspicious pattern"
+        else:
+            for pattern in policy.suspicious_patterns:
+                if any(pattern.search(name) for name in names):
                     return 3, f"Username matches suspicious pattern"
-            except re.error:
-                logger.warning(f"Invalid regex pattern: {pattern}")
-                continue
         
         # Additional heuristics
         score = 0
@@ -166,11 +229,11 @@ class BotDetector:
         """Check suspicious join behavior"""
         # Check if joined very recently after creation
         if member.created_at and member.joined_at:
-            time_diff = member.joined_at - member.created_at
+            points = _join_points((member.joined_at - member.created_at).total_seconds())
             
-            if time_diff < timedelta(minutes=5):
+            if points == 2:
                 return 2, "Joined very quickly after account creation"
-            elif time_diff < timedelta(hours=1):
+            elif points == 1:
                 return 1, "Joined shortly after account creation"
                 
         return 0, None
@@ -200,9 +263,13 @@ class BotDetector:
             
         return False
     
+    def get_stats(self) -> Dict[str, Any]:
+        """Name skeleton cache counters for BotMonitor"""
+        return {'name_skeleton_cache': self.name_skeletons.get_stats()}
+    
     def add_to_whitelist(self, guild_id: str, user_id: str) -> bool:
         """Add user to whitelist"""
-        config = self.config_manager.get_guild_config(guild_id)
+        config = self.config_manager.get_guild_config_copy(guild_id)
         
         if 'whitelist' not in config:
             config['whitelist'] = {'users': [], 'roles': []}
@@ -215,7 +282,7 @@ class BotDetector:
     
     def remove_from_whitelist(self, guild_id: str, user_id: str) -> bool:
         """Remove user from whitelist"""
-        config = self.config_manager.get_guild_config(guild_id)
+        config = self.config_manager.get_guild_config_copy(guild_id)
         
         if 'whitelist' in config and str(user_id) in config['whitelist']['users']:
             config['whitelist']['users'].remove(str(user_id))
@@ -0,0 +1,108 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Mapping with LRU eviction at max_entries and TTL expiry after ttl seconds
+    without access.
+
+    Entries are kept in access order, so both the LRU victim and every
+    expired entry sit at the front; sweep() only touches what it evicts.
+    With a factory, cache[key] creates missing values like a defaultdict.
+    """
+
+    def __init__(self, factory: Optional[Callable[[], Any]] = None, max_entries: int = 50000,
+                 ttl: float = 3600.0, clock: Callable[[], float] = time.monotonic):
+        self.factory = factory
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        # key -> [value, last_access]
+        self._data: "OrderedDict[Hashable, list]" = OrderedDict()
+
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+        self.sweeps = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._data))
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            if self.factory is None:
+                raise KeyError(key)
+            value = self.factory()
+            self[key] = value
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any):
+        data = self._data
+        if key in data:
+            entry = data[key]
+            entry[0] = value
+            entry[1] = self._clock()
+            data.move_to_end(key)
+            return
+        while len(data) >= self.max_entries:
+            data.popitem(last=False)
+            self.evicted_lru += 1
+        data[key] = [value, self._clock()]
+
+    def __delitem__(self, key: Hashable):
+        del self._data[key]
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value and mark it as recently used"""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        now = self._clock()
+        if now - entry[1] > self.ttl:
+            del self._data[key]
+            self.evicted_ttl += 1
+            return default
+        entry[1] = now
+        self._data.move_to_end(key)
+        return entry[0]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Evict every entry idle for longer than ttl; returns how many were evicted"""
+        now = self._clock() if now is None else now
+        data = self._data
+        evicted = 0
+        while data:
+            oldest = next(iter(data.values()))
+            if now - oldest[1] <= self.ttl:
+                break
+            data.popitem(last=False)
+            evicted += 1
+        self.evicted_ttl += evicted
+        self.sweeps += 1
+        return evicted
+
+    def clear(self):
+        self._data.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._data),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'evicted_lru': self.evicted_lru,
+            'evicted_ttl': self.evicted_ttl,
+            'sweeps': self.sweeps
+        }
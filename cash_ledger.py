@@ -0,0 +1,412 @@
+import json
+import os
+import time
+import shutil
+import logging
+import threading
+from datetime import date, datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from economy_store import EconomyStore, make_key, split_key
+from persistence import PersistenceWorker
+
+logger = logging.getLogger(__name__)
+
+def _parse_date(value: Any) -> Optional[date]:
+    """Convert a stored last_daily value back into a date object"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (ValueError, TypeError):
+        return None
+
+def _format_date(value: Any) -> Optional[str]:
+    """Convert a last_daily value into its JSON form"""
+    if value and hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value or None
+
+def _fsync_dir(path: str):
+    """fsync the directory holding path, so a file created in it survives a crash"""
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class CashLedger:
+    """
+    Append-only write-ahead ledger for the cash economy.
+
+    Every mutation is appended to a JSONL file as one small record and
+    written through to the OS immediately; fsync is batched by sync().
+    compact() periodically folds the ledger into a full snapshot
+    (the existing user_cash_backup.json format) and truncates the ledger.
+    Both files keep the legacy "guild_user" string keys; in memory the
+    accounts live in an EconomyStore keyed by integer IDs.
+    Each record carries a sequence number and the snapshot stores the last
+    one it contains, so replay after a crash at any point is exact.
+
+    With a PersistenceWorker, fsync and snapshot writes happen on the
+    worker thread. Compaction rotates the live ledger to a ".compacting"
+    segment on the loop (a rename) and the worker removes that segment
+    once the snapshot covering it is on disk; load() replays both.
+
+    fsync is debounced: it runs once no record has been appended for
+    flush_debounce seconds, but never later than flush_max_latency after
+    the oldest unsynced record, so a burst (a settled round, an autocycled
+    ?txshow) costs one fsync and the durability window stays bounded.
+    """
+
+    def __init__(self, snapshot_path: str = "user_cash_backup.json", ledger_path: Optional[str] = None,
+                 compact_every: int = 5000, compact_interval: float = 600.0,
+                 worker: Optional[PersistenceWorker] = None,
+                 flush_debounce: float = 0.25, flush_max_latency: float = 1.0):
+        self.snapshot_path = snapshot_path
+        self.ledger_path = ledger_path or f"{snapshot_path}.ledger"
+        self.pending_path = f"{self.ledger_path}.compacting"
+        self.compact_every = compact_every
+        self.compact_interval = compact_interval
+        self.worker = worker
+        self.flush_debounce = flush_debounce
+        self.flush_max_latency = flush_max_latency
+
+        self._seq = 0
+        self._file = None
+        self._unsynced = 0
+        # Monotonic times of the oldest unsynced record and the latest append
+        self._dirty_since: Optional[float] = None
+        self._last_append = 0.0
+        self._entries_since_compact = 0
+        self._last_compact = time.monotonic()
+        # Set while a snapshot write is queued or running on the worker
+        self._compacting = False
+        # id(ledger file) -> records handed to an fsync job that has not completed yet
+        self._awaiting_fsync: Dict[int, int] = {}
+        self._fsync_lock = threading.Lock()
+
+        # Counters; the flush/snapshot ones are updated from the worker thread
+        self.records_appended = 0
+        self.records_flushed = 0
+        self.bytes_appended = 0
+        self.flushes = 0
+        self.flush_ms_total = 0.0
+        self.flush_ms_max = 0.0
+        self.snapshots = 0
+        self.snapshot_bytes = 0
+        self.snapshot_ms_total = 0.0
+
+    def load(self) -> EconomyStore:
+        """Load the latest snapshot and replay ledger entries recorded after it"""
+        memory, snapshot_seq = self._load_snapshot()
+        self._seq = snapshot_seq
+
+        # A leftover segment means the process died before its snapshot landed
+        replayed = self._replay_segment(self.pending_path, memory, snapshot_seq)
+        replayed += self._replay_segment(self.ledger_path, memory, snapshot_seq)
+
+        self._entries_since_compact = replayed
+        return memory
+
+    def _replay_segment(self, path: str, memory: EconomyStore, snapshot_seq: int) -> int:
+        """Apply the records of one ledger file that are newer than the snapshot"""
+        if not os.path.exists(path):
+            return 0
+
+        replayed = 0
+        good_offset = 0
+        with open(path, 'rb') as f:
+            for raw_line in f:
+                try:
+                    entry = json.loads(raw_line)
+                except ValueError:
+                    # A torn trailing write from a crash; everything after it is discarded
+                    logger.warning(f"Discarding partial ledger record at offset {good_offset} in {path}")
+                    break
+                if not raw_line.endswith(b'\n'):
+                    # Complete JSON but no terminator: still a torn write
+                    logger.warning(f"Discarding unterminated ledger record at offset {good_offset} in {path}")
+                    break
+                good_offset += len(raw_line)
+
+                seq = entry.get('seq', 0)
+                if seq <= snapshot_seq:
+                    continue  # Already folded into the snapshot
+                self._apply_entry(memory, entry)
+                self._seq = max(self._seq, seq)
+                replayed += 1
+
+        # Drop any torn tail so new records are not appended after garbage
+        if good_offset != os.path.getsize(path):
+            with open(path, 'r+b') as f:
+                f.truncate(good_offset)
+
+        if replayed:
+            logger.info(f"Replayed {replayed} ledger entries from {path}")
+        return replayed
+
+    def _load_snapshot(self) -> Tuple[EconomyStore, int]:
+        """Read the snapshot file, returning the accounts and its ledger sequence"""
+        memory = EconomyStore()
+        if not os.path.exists(self.snapshot_path):
+            logger.info("No backup file found, starting with empty memory")
+            return memory, 0
+
+        with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+            backup_data = json.load(f)
+
+        for key, data in backup_data.get('user_cash_memory', {}).items():
+            try:
+                guild_id, user_id = split_key(key)
+            except ValueError:
+                logger.warning(f"Skipping malformed account key {key!r} in {self.snapshot_path}")
+                continue
+            memory.set(guild_id, user_id, data.get('cash', 0), _parse_date(data.get('last_daily')), data.get('daily_streak', 0))
+
+        logger.info(f"Loaded backup data for {len(memory)} users from {self.snapshot_path}")
+        return memory, backup_data.get('ledger_seq', 0)
+
+    def _apply_entry(self, memory: EconomyStore, entry: Dict[str, Any]):
+        """Apply a single ledger record to the in-memory accounts"""
+        op = entry.get('op')
+        if op == 'add':
+            memory.add(*split_key(entry['key']), entry['delta'])
+        elif op == 'batch':
+            for key, delta in entry['deltas']:
+                memory.add(*split_key(key), delta)
+        elif op == 'set':
+            memory.set(*split_key(entry['key']), entry['cash'], _parse_date(entry.get('last_daily')), entry.get('daily_streak', 0))
+        else:
+            logger.warning(f"Unknown ledger op {op!r} (seq {entry.get('seq')})")
+
+    def record_add(self, key: str, delta: int):
+        """Record a relative cash change (bets, winnings)"""
+        self._append({'op': 'add', 'key': key, 'delta': delta})
+
+    def record_add_batch(self, deltas: List[Tuple[str, int]]):
+        """Record several relative cash changes as one atomic record (round settlements)"""
+        self._append({'op': 'batch', 'deltas': [[key, delta] for key, delta in deltas]})
+
+    def record_set(self, key: str, cash: int, last_daily: Any, daily_streak: int):
+        """Record an absolute account update (daily rewards, admin edits, transfers)"""
+        self._append({
+            'op': 'set',
+            'key': key,
+            'cash': cash,
+            'last_daily': _format_date(last_daily),
+            'daily_streak': daily_streak
+        })
+
+    def _append(self, entry: Dict[str, Any]):
+        """Append a record and hand it to the OS; fsync happens in sync()"""
+        self._seq += 1
+        entry['seq'] = self._seq
+
+        if self._file is None:
+            self._file = open(self.ledger_path, 'a', encoding='utf-8')
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+        self._file.write(line)
+        self._file.flush()
+
+        now = time.monotonic()
+        if self._dirty_since is None:
+            self._dirty_since = now
+        self._last_append = now
+        self._unsynced += 1
+        self._entries_since_compact += 1
+        self.records_appended += 1
+        self.bytes_appended += len(line.encode('utf-8'))
+
+    def _run(self, job, key=None):
+        """Run blocking I/O on the worker thread, or inline without one"""
+        if self.worker is not None:
+            self.worker.submit(job, key)
+        else:
+            job()
+
+    def flush_delay(self) -> Optional[float]:
+        """Seconds until the pending records are due for fsync (0 = now), None if clean"""
+        if self._dirty_since is None:
+            return None
+        now = time.monotonic()
+        due = min(self._last_append + self.flush_debounce, self._dirty_since + self.flush_max_latency)
+        return max(0.0, due - now)
+
+    def sync_if_due(self) -> int:
+        """fsync only once the debounce or max-latency window has elapsed"""
+        if self.flush_delay() != 0.0:
+            return 0
+        return self.sync()
+
+    def sync(self) -> int:
+        """fsync all records appended since the last sync; returns how many were synced"""
+        if not self._unsynced or self._file is None:
+            self._dirty_since = None
+            return 0
+
+        ledger_file = self._file
+        synced, self._unsynced = self._unsynced, 0
+        self._dirty_since = None
+        self._hand_to_fsync(ledger_file, synced)
+        self._run(lambda: self._fsync(ledger_file), key=('fsync', id(ledger_file)))
+        return synced
+
+    def _hand_to_fsync(self, ledger_file, count: int):
+        """Note records of ledger_file that the next fsync of it will make durable"""
+        with self._fsync_lock:
+            self._awaiting_fsync[id(ledger_file)] = self._awaiting_fsync.get(id(ledger_file), 0) + count
+
+    def _fsync(self, ledger_file):
+        """fsync the ledger file, count its records as flushed and record how long it took (worker thread)"""
+        # Taken before the fsync: records handed over later may not be covered by it
+        with self._fsync_lock:
+            covered = self._awaiting_fsync.pop(id(ledger_file), 0)
+        started = time.perf_counter()
+        try:
+            os.fsync(ledger_file.fileno())
+        except Exception:
+            # Still not durable; a later fsync of the same file covers them
+            self._hand_to_fsync(ledger_file, covered)
+            raise
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.records_flushed += covered
+        self.flushes += 1
+        self.flush_ms_total += elapsed_ms
+        self.flush_ms_max = max(self.flush_ms_max, elapsed_ms)
+
+    def needs_compaction(self) -> bool:
+        """Check if the ledger has grown enough (or aged enough) to fold into a snapshot"""
+        if not self._entries_since_compact:
+            return False
+        if self._entries_since_compact >= self.compact_every:
+            return True
+        return time.monotonic() - self._last_compact >= self.compact_interval
+
+    def compact(self, memory: EconomyStore) -> bool:
+        """Snapshot the accounts and start a new ledger; the file write happens on the worker"""
+        if self._compacting:
+            return False
+
+        try:
+            # Capture is the only O(users) step on the caller's thread; Account
+            # fields are immutable values, so the tuples are a consistent copy
+            rows = [(guild_id, user_id, account.cash, account.last_daily, account.daily_streak)
+                    for guild_id, user_id, account in memory.items()]
+            snapshot_seq = self._seq
+            self._rotate()
+        except Exception as e:
+            logger.error(f"Error compacting cash ledger: {e}")
+            return False
+
+        # The rotated segment is fsynced by _rotate's close job
+        self._unsynced = 0
+        self._dirty_since = None
+        self._entries_since_compact = 0
+        self._last_compact = time.monotonic()
+        self._compacting = True
+        self._run(lambda: self._write_snapshot(rows, snapshot_seq))
+        return True
+
+    def _rotate(self):
+        """Move the live ledger aside so new records go to a fresh file"""
+        old_file, self._file = self._file, None
+        if old_file is not None:
+            self._hand_to_fsync(old_file, self._unsynced)
+
+        if os.path.exists(self.ledger_path):
+            if os.path.exists(self.pending_path):
+                # An earlier snapshot write failed; keep its records and add ours behind them.
+                # The copy must be durable before the ledger is truncated, or a crash in between
+                # loses records already counted as flushed
+                with open(self.ledger_path, 'rb') as src, open(self.pending_path, 'ab') as dst:
+                    shutil.copyfileobj(src, dst)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                _fsync_dir(self.pending_path)
+                with open(self.ledger_path, 'w', encoding='utf-8'):
+                    pass
+            else:
+                os.replace(self.ledger_path, self.pending_path)
+
+        if old_file is not None:
+            # Closed on the worker so it can never race a queued fsync of the same file
+            self._run(lambda: self._fsync_and_close(old_file))
+
+    def _fsync_and_close(self, ledger_file):
+        """fsync a rotated-out ledger file and close it (worker thread)"""
+        try:
+            self._fsync(ledger_file)
+        finally:
+            ledger_file.close()
+            # Its id may be reused by a later file object
+            with self._fsync_lock:
+                self._awaiting_fsync.pop(id(ledger_file), None)
+
+    def _write_snapshot(self, rows: List[Tuple[int, int, int, Any, int]], snapshot_seq: int):
+        """Write a full snapshot and drop the segment it covers (worker thread)"""
+        started = time.perf_counter()
+        try:
+            save_memory = {}
+            for guild_id, user_id, cash, last_daily, daily_streak in rows:
+                save_memory[make_key(guild_id, user_id)] = {
+                    'cash': cash,
+                    'last_daily': _format_date(last_daily),
+                    'daily_streak': daily_streak
+                }
+
+            backup_data = {
+                'user_cash_memory': save_memory,
+                'last_backup': datetime.utcnow().isoformat(),
+                'ledger_seq': snapshot_seq
+            }
+
+            # Atomic write using temporary file
+            temp_file = f"{self.snapshot_path}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(backup_data, f, ensure_ascii=False, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+                written = f.tell()
+            os.replace(temp_file, self.snapshot_path)
+
+            # The snapshot now covers the rotated segment. A crash before this
+            # point is harmless: replay skips seq <= ledger_seq.
+            if os.path.exists(self.pending_path):
+                os.remove(self.pending_path)
+
+            self.snapshots += 1
+            self.snapshot_bytes += written
+            self.snapshot_ms_total += (time.perf_counter() - started) * 1000
+            logger.debug(f"Compacted cash ledger into snapshot of {len(save_memory)} users (seq {snapshot_seq})")
+        except Exception as e:
+            logger.error(f"Error compacting cash ledger: {e}")
+        finally:
+            self._compacting = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Write counters for monitoring"""
+        return {
+            'records_appended': self.records_appended,
+            'records_flushed': self.records_flushed,
+            'unsynced_records': self._unsynced,
+            'flushes': self.flushes,
+            'avg_flush_ms': round(self.flush_ms_total / self.flushes, 2) if self.flushes else 0,
+            'max_flush_ms': round(self.flush_ms_max, 2),
+            'snapshots': self.snapshots,
+            'avg_snapshot_ms': round(self.snapshot_ms_total / self.snapshots, 2) if self.snapshots else 0,
+            'bytes_written': self.bytes_appended + self.snapshot_bytes
+        }
+
+    def close(self):
+        """Sync and close the ledger file, waiting for queued writes to finish"""
+        if self._file is not None:
+            self.sync()
+            ledger_file, self._file = self._file, None
+            self._run(ledger_file.close)
+        if self.worker is not None:
+            self.worker.wait_idle()
@@ -1,12 +1,215 @@
+import copy
 import json
 import os
 import logging
-from typing import Dict, Any
+import re
+import time
+from types import MappingProxyType
+from typing import Dict, Any, FrozenSet, Iterable, Mapping, Optional, Tuple
+
+from pattern_matcher import MultiPatternMatcher
+from rate_limiter import RateLimit
 
 logger = logging.getLogger(__name__)
 
+# Used when a config has no spam_detection.suspicious_domains / spam_keywords
+DEFAULT_SUSPICIOUS_DOMAINS = (
+    'discord.gg',  # Invite links (context dependent)
+    'bit.ly', 'tinyurl.com', 'ow.ly',  # URL shorteners
+    'free-discord-nitro', 'discord-nitro',  # Fake nitro scams
+    'steam-gift', 'free-csgo', 'free-game'  # Gaming scams
+)
+DEFAULT_SPAM_KEYWORDS = (
+    'free nitro', 'discord nitro free', 'free discord',
+    'click here', 'limited time', 'act now',
+    'congratulations', 'you have won', 'claim now'
+)
+
+def _freeze(value: Any) -> Any:
+    """Recursively convert dicts/lists into read-only mappings/tuples"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _thaw(value: Any) -> Any:
+    """Recursively convert a frozen config back into plain dicts/lists"""
+    if isinstance(value, Mapping):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+def _to_int(value: Any, default: Optional[int] = None) -> Optional[int]:
+    """Resolve a config value (int or numeric string) to an int"""
+    if value is None or isinstance(value, bool):
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def _to_float(value: Any, default: float) -> float:
+    """Resolve a config value (number or numeric string) to a float"""
+    if value is None or isinstance(value, bool):
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+def _to_id_set(values: Iterable[Any]) -> FrozenSet[int]:
+    """Resolve a list of user/role IDs (stored as strings) to a frozenset of ints"""
+    ids = set()
+    for value in values or ():
+        resolved = _to_int(value)
+        if resolved is not None:
+            ids.add(resolved)
+    return frozenset(ids)
+
+def _compile_patterns(guild_id: str, patterns: Iterable[str]) -> Tuple[re.Pattern, ...]:
+    """Compile regex patterns once, skipping (and logging) invalid ones"""
+    compiled = []
+    for pattern in patterns or ():
+        try:
+            compiled.append(re.compile(pattern))
+        except (re.error, TypeError) as e:
+            logger.warning(f"Invalid regex pattern {pattern!r} in config for guild {guild_id}: {e}")
+    return tuple(compiled)
+
+def _combine_patterns(patterns: Tuple[re.Pattern, ...]) -> Optional[re.Pattern]:
+    """One alternation over compiled patterns so a name is scanned once; None when they cannot be merged"""
+    if not patterns:
+        return None
+    # Back-references would point at the wrong group once the patterns are concatenated
+    if any(pattern.flags & ~re.UNICODE or re.search(r'\\\d|\(\?P=', pattern.pattern) for pattern in patterns):
+        return None
+    try:
+        return re.compile('|'.join(f"(?:{pattern.pattern})" for pattern in patterns))
+    except re.error:
+        return None
+
+def _to_rate_limits(guild_id: str, values: Iterable[Any]) -> Tuple[RateLimit, ...]:
+    """Resolve [[count, seconds], ...] into RateLimit objects, skipping (and logging) invalid ones"""
+    limits = []
+    for value in values or ():
+        try:
+            count, seconds = value
+            if int(count) <= 0 or float(seconds) <= 0:
+                raise ValueError("count and seconds must be positive")
+            limits.append(RateLimit(int(count), float(seconds)))
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Invalid rate limit {value!r} in config for guild {guild_id}: {e}")
+    return tuple(limits)
+
+class GuildPolicy:
+    """Typed, precompiled form of a guild config used by the detectors"""
+    __slots__ = (
+        'guild_id', 'enabled',
+        'bot_detection_enabled', 'min_account_age_days', 'check_profile_picture',
+        'check_username_patterns', 'suspicious_patterns', 'suspicious_name_pattern', 'bot_action',
+        'spam_detection_enabled', 'max_messages_per_window', 'time_window_seconds',
+        'user_rate_limits', 'channel_rate_limits', 'guild_rate_limits',
+        'max_duplicate_messages', 'near_duplicate_distance', 'duplicate_per_channel', 'check_mention_spam', 'max_mentions_per_message',
+        'check_link_spam', 'domain_matcher', 'keyword_matcher', 'spam_action',
+        'coordinated_spam_threshold', 'coordinated_spam_window', 'coordinated_spam_distance',
+        'coordinated_spam_min_length',
+        'raid_protection_enabled', 'raid_max_joins', 'raid_time_window', 'raid_action',
+        'raid_cluster_size', 'raid_creation_spread',
+        'verification_enabled', 'logging_enabled', 'log_channel_id', 'log_batch_window', 'log_max_backlog',
+        'whitelist_users', 'whitelist_roles',
+    )
+
+    def __init__(self, guild_id: str, config: Mapping[str, Any]):
+        bot_detection = config.get('bot_detection', {})
+        spam_detection = config.get('spam_detection', {})
+        raid_protection = config.get('raid_protection', {})
+        verification = config.get('verification', {})
+        logging_config = config.get('logging', {})
+        whitelist = config.get('whitelist', {})
+
+        self.guild_id = guild_id
+        self.enabled = bool(config.get('enabled', True))
+
+        self.bot_detection_enabled = bool(bot_detection.get('enabled', True))
+        self.min_account_age_days = _to_int(bot_detection.get('min_account_age_days'), 7)
+        self.check_profile_picture = bool(bot_detection.get('check_profile_picture', True))
+        self.check_username_patterns = bool(bot_detection.get('check_username_patterns', True))
+        self.suspicious_patterns = _compile_patterns(guild_id, bot_detection.get('suspicious_patterns', ()))
+        self.suspicious_name_pattern = _combine_patterns(self.suspicious_patterns)
+        self.bot_action = bot_detection.get('action', 'quarantine')
+
+        self.spam_detection_enabled = bool(spam_detection.get('enabled', True))
+        self.max_messages_per_window = _to_int(spam_detection.get('max_messages_per_window'), 5)
+        self.time_window_seconds = _to_int(spam_detection.get('time_window_seconds'), 10)
+        # Per-user windows (the classic one first), plus optional per-channel / per-guild aggregates
+        # null disables the extra windows; anything but a list of pairs is logged and ignored
+        extra_rate_limits = spam_detection.get('extra_rate_limits', [[30, 300]]) or []
+        if not isinstance(extra_rate_limits, (list, tuple)):
+            logger.warning(f"Invalid extra_rate_limits {extra_rate_limits!r} in config for guild {guild_id}")
+            extra_rate_limits = []
+        self.user_rate_limits = _to_rate_limits(guild_id, [[self.max_messages_per_window, self.time_window_seconds]]
+                                                + list(extra_rate_limits))
+        channel_limit = spam_detection.get('channel_rate_limit')
+        guild_limit = spam_detection.get('guild_rate_limit')
+        self.channel_rate_limits = _to_rate_limits(guild_id, [channel_limit] if channel_limit else ())
+        self.guild_rate_limits = _to_rate_limits(guild_id, [guild_limit] if guild_limit else ())
+        self.max_duplicate_messages = _to_int(spam_detection.get('max_duplicate_messages'), 3)
+        # SimHash bits two messages may differ by and still count as duplicates (0 = exact only)
+        self.near_duplicate_distance = max(0, min(_to_int(spam_detection.get('near_duplicate_distance'), 10), 32))
+        self.duplicate_per_channel = bool(spam_detection.get('duplicate_per_channel', False))
+        self.check_mention_spam = bool(spam_detection.get('check_mention_spam', True))
+        self.max_mentions_per_message = _to_int(spam_detection.get('max_mentions_per_message'), 5)
+        self.check_link_spam = bool(spam_detection.get('check_link_spam', True))
+        self.domain_matcher = MultiPatternMatcher(spam_detection.get('suspicious_domains', DEFAULT_SUSPICIOUS_DOMAINS))
+        self.keyword_matcher = MultiPatternMatcher(spam_detection.get('spam_keywords', DEFAULT_SPAM_KEYWORDS))
+        self.spam_action = spam_detection.get('action', 'timeout')
+        # Distinct accounts posting near-identical content inside the window (0 = disabled)
+        self.coordinated_spam_threshold = _to_int(spam_detection.get('coordinated_spam_threshold'), 5)
+        self.coordinated_spam_window = _to_int(spam_detection.get('coordinated_spam_window'), 60)
+        self.coordinated_spam_distance = max(0, min(_to_int(spam_detection.get('coordinated_spam_distance'), 6), 32))
+        self.coordinated_spam_min_length = _to_int(spam_detection.get('coordinated_spam_min_length'), 30)
+
+        self.raid_protection_enabled = bool(raid_protection.get('enabled', True))
+        self.raid_max_joins = _to_int(raid_protection.get('max_joins'), 10)
+        self.raid_time_window = _to_int(raid_protection.get('time_window'), 60)
+        self.raid_action = raid_protection.get('action', 'lockdown')
+        # Joiners that look alike (name shape, avatar, creation time) forming a wave (0 = disabled)
+        self.raid_cluster_size = _to_int(raid_protection.get('cluster_size'), 5)
+        self.raid_creation_spread = _to_int(raid_protection.get('cluster_creation_spread'), 3600)
+
+        self.verification_enabled = bool(verification.get('enabled', False))
+        self.logging_enabled = bool(logging_config.get('enabled', True))
+        self.log_channel_id = _to_int(logging_config.get('channel_id'))
+        # Log-channel events are batched for this many seconds; at most log_max_backlog wait per guild
+        self.log_batch_window = max(0.0, _to_float(logging_config.get('batch_window'), 2.0))
+        self.log_max_backlog = max(1, _to_int(logging_config.get('max_backlog'), 100))
+
+        self.whitelist_users = _to_id_set(whitelist.get('users', ()))
+        self.whitelist_roles = _to_id_set(whitelist.get('roles', ()))
+
+    def is_whitelisted(self, member) -> bool:
+        """Check a member against the user and role whitelists"""
+        if member.id in self.whitelist_users:
+            return True
+        if self.whitelist_roles:
+            whitelist_roles = self.whitelist_roles
+            return any(role.id in whitelist_roles for role in getattr(member, 'roles', ()))
+        return False
+
+class _CachedConfig:
+    """Merged guild config plus the file state it was built from"""
+    __slots__ = ('view', 'policy', 'mtime', 'checked_at')
+
+    def __init__(self, view: Mapping[str, Any], policy: GuildPolicy, mtime: Optional[int], checked_at: float):
+        self.view = view
+        self.policy = policy
+        self.mtime = mtime
+        self.checked_at = checked_at
+
 class ConfigManager:
-    def __init__(self, config_dir: str = "configs"):
+    def __init__(self, config_dir: str = "configs", mtime_check_interval: float = 2.0):
         self.config_dir = config_dir
         self.default_config_file = "default_config.json"
         
@@ -16,6 +219,11 @@ class ConfigManager:
         # Load default configuration
         self.default_config = self._load_default_config()
         
+        # Per-guild cache of merged, read-only configs. The config file is
+        # only stat()ed once per interval to pick up edits made on disk.
+        self.mtime_check_interval = mtime_check_interval
+        self._cache: Dict[str, _CachedConfig] = {}
+        
     def _load_default_config(self) -> Dict[str, Any]:
         """Load the default configuration"""
         try:
@@ -49,17 +257,30 @@ class ConfigManager:
                 "enabled": True,
                 "max_messages_per_window": 5,
                 "time_window_seconds": 10,
+                "extra_rate_limits": [[30, 300]],
+                "channel_rate_limit": None,
+                "guild_rate_limit": None,
                 "max_duplicate_messages": 3,
+                "near_duplicate_distance": 10,
+                "duplicate_per_channel": False,
                 "check_mention_spam": True,
                 "max_mentions_per_message": 5,
                 "check_link_spam": True,
+                "suspicious_domains": list(DEFAULT_SUSPICIOUS_DOMAINS),
+                "spam_keywords": list(DEFAULT_SPAM_KEYWORDS),
+                "coordinated_spam_threshold": 5,
+                "coordinated_spam_window": 60,
+                "coordinated_spam_distance": 6,
+                "coordinated_spam_min_length": 30,
                 "action": "timeout"  # timeout, kick, ban
             },
             "raid_protection": {
                 "enabled": True,
                 "max_joins": 10,
                 "time_window": 60,  # seconds
-                "action": "lockdown"  # lockdown, alert
+                "action": "lockdown",  # lockdown, alert
+                "cluster_size": 5,  # look-alike joiners that form a raid wave (0 = off)
+                "cluster_creation_spread": 3600  # seconds between their account creations
             },
             "verification": {
                 "enabled": False,
@@ -75,7 +296,9 @@ class ConfigManager:
                 "log_kicks": True,
                 "log_bans": True,
                 "log_timeouts": True,
-                "log_detections": True
+                "log_detections": True,
+                "batch_window": 2.0,
+                "max_backlog": 100
             },
             "whitelist": {
                 "users": [],
@@ -83,8 +306,45 @@ class ConfigManager:
             }
         }
     
-    def get_guild_config(self, guild_id: str) -> Dict[str, Any]:
-        """Get configuration for a specific guild"""
+    def get_guild_config(self, guild_id: str) -> Mapping[str, Any]:
+        """Get configuration for a specific guild (read-only, cached)"""
+        return self._get_cached_config(str(guild_id)).view
+    
+    def get_guild_policy(self, guild_id: str) -> GuildPolicy:
+        """Get the compiled detection policy for a specific guild"""
+        return self._get_cached_config(str(guild_id)).policy
+    
+    def _get_cached_config(self, guild_id: str) -> _CachedConfig:
+        """Return the cache entry for a guild, reloading it if the file changed"""
+        entry = self._cache.get(guild_id)
+        now = time.monotonic()
+        
+        if entry is not None:
+            if now - entry.checked_at < self.mtime_check_interval:
+                return entry
+            entry.checked_at = now
+            if self._get_config_mtime(guild_id) == entry.mtime:
+                return entry
+        
+        return self._load_guild_config(guild_id, now)
+    
+    def get_guild_config_copy(self, guild_id: str) -> Dict[str, Any]:
+        """Get a mutable deep copy of a guild's config, for edit-then-save callers"""
+        return _thaw(self.get_guild_config(guild_id))
+    
+    def invalidate_guild_config(self, guild_id: str):
+        """Drop the cached config for a guild so the next read hits the file"""
+        self._cache.pop(str(guild_id), None)
+    
+    def _get_config_mtime(self, guild_id: str) -> Optional[int]:
+        """Get the modification time of a guild's config file, or None if missing"""
+        try:
+            return os.stat(os.path.join(self.config_dir, f"{guild_id}.json")).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _load_guild_config(self, guild_id: str, now: float) -> _CachedConfig:
+        """Read, merge and cache the config file for a guild"""
         config_file = os.path.join(self.config_dir, f"{guild_id}.json")
         
         try:
@@ -93,15 +353,19 @@ class ConfigManager:
                 
             # Merge with defaults for any missing keys
             merged_config = self._merge_configs(self.default_config, guild_config)
-            return merged_config
             
         except FileNotFoundError:
-            # Return default config and save it
+            # Use default config and save it
             self.save_guild_config(guild_id, self.default_config)
-            return self.default_config.copy()
+            merged_config = self.default_config
         except json.JSONDecodeError as e:
             logger.error(f"Error parsing config for guild {guild_id}: {e}")
-            return self.default_config.copy()
+            merged_config = self.default_config
+        
+        view = _freeze(merged_config)
+        entry = _CachedConfig(view, GuildPolicy(guild_id, view), self._get_config_mtime(guild_id), now)
+        self._cache[guild_id] = entry
+        return entry
     
     def save_guild_config(self, guild_id: str, config: Dict[str, Any]) -> bool:
         """Save configuration for a specific guild"""
@@ -110,6 +374,7 @@ class ConfigManager:
         try:
             with open(config_file, 'w') as f:
                 json.dump(config, f, indent=2)
+            self.invalidate_guild_config(guild_id)
             logger.info(f"Saved config for guild {guild_id}")
             return True
         except Exception as e:
@@ -120,7 +385,7 @@ class ConfigManager:
         """Initialize configuration for a new guild"""
         config_file = os.path.join(self.config_dir, f"{guild_id}.json")
         if not os.path.exists(config_file):
-            return self.save_guild_config(guild_id, self.default_config.copy())
+            return self.save_guild_config(guild_id, copy.deepcopy(self.default_config))
         return True
     
     def _merge_configs(self, default: Dict[str, Any], guild: Dict[str, Any]) -> Dict[str, Any]:
@@ -137,7 +402,7 @@ class ConfigManager:
     
     def update_guild_setting(self, guild_id: str, setting_path: str, value: Any) -> bool:
         """Update a specific setting in guild config"""
-        config = self.get_guild_config(guild_id)
+        config = self.get_guild_config_copy(guild_id)
         
         # Navigate to the setting using dot notation
         keys = setting_path.split('.')
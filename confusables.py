@@ -0,0 +1,81 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Any, Dict
+
+from url_extraction import ZERO_WIDTH
+
+# Look-alikes from other scripts folded onto the Latin letter they imitate
+# (a subset of Unicode's confusables.txt covering what scams use). Capitals
+# are mapped before casefold() because they often imitate a different letter
+# than their lowercase form (Greek H vs eta).
+_CONFUSABLE_CAPITALS = {
+    # Cyrillic
+    'А': 'A', 'В': 'B', 'Е': 'E', 'Ѕ': 'S', 'І': 'I', 'Ј': 'J', 'К': 'K', 'М': 'M',
+    'Н': 'H', 'О': 'O', 'Р': 'P', 'С': 'C', 'Т': 'T', 'Х': 'X', 'Ү': 'Y',
+    # Greek
+    'Α': 'A', 'Β': 'B', 'Ε': 'E', 'Ζ': 'Z', 'Η': 'H', 'Ι': 'I', 'Κ': 'K', 'Μ': 'M',
+    'Ν': 'N', 'Ο': 'O', 'Ρ': 'P', 'Τ': 'T', 'Υ': 'Y', 'Χ': 'X',
+}
+_CONFUSABLE_LETTERS = {
+    # Cyrillic
+    'а': 'a', 'в': 'b', 'е': 'e', 'ё': 'e', 'һ': 'h', 'і': 'i', 'ї': 'i', 'ј': 'j',
+    'к': 'k', 'м': 'm', 'н': 'h', 'о': 'o', 'р': 'p', 'с': 'c', 'т': 't', 'у': 'y',
+    'х': 'x', 'ѕ': 's', 'ԁ': 'd', 'ԛ': 'q', 'ԝ': 'w', 'ү': 'y', 'ɡ': 'g',
+    # Greek
+    'α': 'a', 'β': 'b', 'ε': 'e', 'η': 'n', 'ι': 'i', 'κ': 'k', 'ν': 'v', 'ο': 'o',
+    'μ': 'u', 'ρ': 'p', 'τ': 't', 'υ': 'u', 'χ': 'x', 'ω': 'w', 'ζ': 'z',
+    # Latin look-alikes with no decomposition
+    'ı': 'i', 'ȷ': 'j', 'ł': 'l', 'ø': 'o', 'đ': 'd', 'ħ': 'h', 'ƅ': 'b',
+}
+_CAPITALS_TABLE = {**ZERO_WIDTH, **{ord(char): latin for char, latin in _CONFUSABLE_CAPITALS.items()}}
+_LETTERS_TABLE = {ord(char): latin for char, latin in _CONFUSABLE_LETTERS.items()}
+# The combining diacritical mark blocks; after NFKC only marks with no
+# precomposed letter to join (stacked or underlined obfuscation) are left
+_COMBINING_MARKS = re.compile('[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]+')
+
+def skeleton(text: str) -> str:
+    """
+    Fold text to a matching skeleton: compatibility forms (fullwidth,
+    mathematical letters) normalised, case folded, zero-width characters
+    and stray combining marks removed and cross-script look-alikes mapped
+    to Latin. "ｆｒее nіtrо" and "free nitro" share a skeleton, while
+    accented letters (Vietnamese "tiền") keep their accents.
+    """
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize('NFKC', text).translate(_CAPITALS_TABLE).casefold()
+    text = _COMBINING_MARKS.sub('', text)
+    return text.translate(_LETTERS_TABLE)
+
+class SkeletonCache:
+    """
+    LRU-cached skeleton(). ASCII text is folded directly without touching
+    the cache, so only non-ASCII strings (where the work is) take slots.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.ascii_calls = 0
+        self._cached = lru_cache(maxsize=max_size)(skeleton)
+
+    def __call__(self, text: str) -> str:
+        if text.isascii():
+            self.ascii_calls += 1
+            return text.lower()
+        return self._cached(text)
+
+    def clear(self):
+        self._cached.cache_clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        info = self._cached.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            'entries': info.currsize,
+            'max_entries': self.max_size,
+            'hits': info.hits,
+            'misses': info.misses,
+            'hit_rate': info.hits / lookups if lookups else 0.0,
+            'ascii_fast_path': self.ascii_calls
+        }
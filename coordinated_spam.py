@@ -0,0 +1,178 @@
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Tuple, Union
+
+from near_duplicate import NormalizedText, band_keys
+
+# (user_id, channel_id, message_id) of one sighting in a flagged cluster
+ClusterMember = Tuple[int, int, int]
+
+class _Sighting:
+    """Latest message an author posted into a cluster"""
+    __slots__ = ('last_seen', 'channel_id', 'message_id', 'actioned')
+
+    def __init__(self, last_seen: float, channel_id: int, message_id: int):
+        self.last_seen = last_seen
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.actioned = False
+
+class _Cluster:
+    """Near-identical messages from any number of authors"""
+    __slots__ = ('fingerprint', 'keys', 'words', 'exact_keys', 'authors', 'last_seen', 'flagged')
+
+    def __init__(self, fingerprint: int, keys: List[int], words: FrozenSet[str], exact_key: int, now: float):
+        self.fingerprint = fingerprint
+        self.keys = keys
+        self.words = words
+        # Hashes of normalized texts that resolve to this cluster without a SimHash
+        self.exact_keys = [exact_key]
+        # author_id -> sighting, least recently seen first
+        self.authors: "OrderedDict[int, _Sighting]" = OrderedDict()
+        self.last_seen = now
+        self.flagged = False
+
+class CoordinatedSpamIndex:
+    """
+    Guild-wide, time-windowed index of message fingerprints that counts
+    distinct authors per cluster, so a wave of fresh accounts each posting
+    the same scam once is caught even though no single account repeats.
+
+    A message is first looked up by a hash of its normalized text, so the
+    copies of a verbatim wave never pay for a SimHash. On a miss, candidate
+    clusters come from SimHash bands (dict lookups) whose buckets hold at
+    most MAX_BUCKET clusters, and a candidate within max_distance bits only
+    counts once at least half of the two messages' words are shared:
+    ordinary chatter drawn from the same everyday words lands within a few
+    bits of a lot of unrelated lines. Clusters are kept in LRU order; stale
+    clusters and authors are expired from the front as new messages arrive,
+    so each message costs O(1) amortized. Memory is capped at max_clusters
+    clusters of at most max_authors authors each.
+    """
+
+    # Clusters kept per band bucket; the oldest falls out of that bucket
+    # (but stays reachable through its other bands and exact keys)
+    MAX_BUCKET = 16
+    # Exact keys remembered per cluster
+    MAX_EXACT_KEYS = 8
+
+    def __init__(self, threshold: int = 5, window_seconds: float = 60.0, max_distance: int = 6,
+                 max_clusters: int = 2000, max_authors: int = 100):
+        self.threshold = threshold
+        self.window_seconds = window_seconds
+        self.max_distance = max_distance
+        self.max_clusters = max_clusters
+        self.max_authors = max_authors
+
+        self._bands: List[Dict[int, List[_Cluster]]] = [{} for _ in range(max_distance + 1)]
+        # Hash of normalized text -> cluster
+        self._exact: Dict[int, _Cluster] = {}
+        # id(cluster) -> cluster, least recently active first
+        self._clusters: "OrderedDict[int, _Cluster]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._clusters)
+
+    def observe(self, text: Union[str, NormalizedText], author_id: int, channel_id: int, message_id: int,
+                now: Optional[float] = None) -> List[ClusterMember]:
+        """
+        Record a message. Returns the members to act on: everyone in the
+        cluster when it first crosses the threshold, then each new author
+        while it stays flagged; an empty list otherwise.
+        """
+        now = time.monotonic() if now is None else now
+        cutoff = now - self.window_seconds
+        self._expire(cutoff)
+
+        if isinstance(text, str):
+            text = NormalizedText(text)
+        exact_key = text.exact_key
+        cluster = self._exact.get(exact_key)
+        if cluster is None:
+            fingerprint = text.fingerprint
+            keys = band_keys(fingerprint, len(self._bands))
+            words = frozenset(text.text.split())
+            cluster = self._find(fingerprint, keys, words)
+            if cluster is None:
+                cluster = self._add(fingerprint, keys, words, exact_key, now)
+            elif len(cluster.exact_keys) < self.MAX_EXACT_KEYS:
+                cluster.exact_keys.append(exact_key)
+                self._exact[exact_key] = cluster
+        self._clusters.move_to_end(id(cluster))
+        cluster.last_seen = now
+
+        authors = cluster.authors
+        while authors:
+            oldest = next(iter(authors.values()))
+            if oldest.last_seen >= cutoff:
+                break
+            authors.popitem(last=False)
+
+        sighting = authors.get(author_id)
+        if sighting is None:
+            if len(authors) >= self.max_authors:
+                authors.popitem(last=False)
+            sighting = authors[author_id] = _Sighting(now, channel_id, message_id)
+        else:
+            sighting.last_seen = now
+            sighting.channel_id = channel_id
+            sighting.message_id = message_id
+            authors.move_to_end(author_id)
+
+        if len(authors) < self.threshold and not cluster.flagged:
+            return []
+
+        cluster.flagged = True
+        # The current message is always returned, even if its author was already actioned
+        members = [(author_id, channel_id, message_id)]
+        sighting.actioned = True
+        for member_id, member in authors.items():
+            if not member.actioned:
+                member.actioned = True
+                members.append((member_id, member.channel_id, member.message_id))
+        return members
+
+    def _find(self, fingerprint: int, keys: List[int], words: FrozenSet[str]) -> Optional[_Cluster]:
+        best = None
+        best_distance = self.max_distance + 1
+        for band, key in zip(self._bands, keys):
+            for cluster in band.get(key, ()):
+                distance = (cluster.fingerprint ^ fingerprint).bit_count()
+                if distance < best_distance and 2 * len(cluster.words & words) >= len(cluster.words | words):
+                    best, best_distance = cluster, distance
+        return best
+
+    def _add(self, fingerprint: int, keys: List[int], words: FrozenSet[str], exact_key: int, now: float) -> _Cluster:
+        if len(self._clusters) >= self.max_clusters:
+            self._remove(self._clusters.popitem(last=False)[1])
+
+        cluster = _Cluster(fingerprint, keys, words, exact_key, now)
+        self._clusters[id(cluster)] = cluster
+        self._exact[exact_key] = cluster
+        for band, key in zip(self._bands, keys):
+            bucket = band.setdefault(key, [])
+            if len(bucket) >= self.MAX_BUCKET:
+                del bucket[0]
+            bucket.append(cluster)
+        return cluster
+
+    def _expire(self, cutoff: float):
+        """Drop clusters with no activity inside the window (oldest first)"""
+        clusters = self._clusters
+        while clusters:
+            oldest = next(iter(clusters.values()))
+            if oldest.last_seen >= cutoff:
+                break
+            clusters.popitem(last=False)
+            self._remove(oldest)
+
+    def _remove(self, cluster: _Cluster):
+        for exact_key in cluster.exact_keys:
+            del self._exact[exact_key]
+        for band, key in zip(self._bands, cluster.keys):
+            bucket = band.get(key)
+            if bucket is None or cluster not in bucket:  # Already pushed out of a full bucket
+                continue
+            bucket.remove(cluster)
+            if not bucket:
+                del band[key]
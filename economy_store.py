@@ -0,0 +1,91 @@
+import logging
+from datetime import date
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STARTING_CASH = 1000
+
+class Account:
+    """One user's economy state; cash is a plain int so it stays arbitrary-precision"""
+    __slots__ = ('cash', 'last_daily', 'daily_streak')
+
+    def __init__(self, cash: int = STARTING_CASH, last_daily: Optional[date] = None, daily_streak: int = 0):
+        self.cash = cash
+        self.last_daily = last_daily
+        self.daily_streak = daily_streak
+
+    def __repr__(self):
+        return f"Account(cash={self.cash}, last_daily={self.last_daily}, daily_streak={self.daily_streak})"
+
+def make_key(guild_id, user_id) -> str:
+    """Legacy "guild_user" key used in the snapshot and ledger files"""
+    return f"{guild_id}_{user_id}"
+
+def split_key(key: str) -> Tuple[int, int]:
+    """Parse a legacy "guild_user" key back into integer IDs"""
+    guild_id, user_id = key.split('_', 1)
+    return int(guild_id), int(user_id)
+
+class EconomyStore:
+    """
+    Accounts keyed by (int guild_id, int user_id).
+
+    Stored as guild -> user -> Account so a guild's accounts can be
+    iterated directly instead of prefix-scanning every "guild_user" key.
+    IDs may be passed as str or int; they are normalised to int.
+    """
+
+    def __init__(self):
+        self._guilds: Dict[int, Dict[int, Account]] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get(self, guild_id, user_id) -> Optional[Account]:
+        """Return the account if it exists"""
+        accounts = self._guilds.get(int(guild_id))
+        if accounts is None:
+            return None
+        return accounts.get(int(user_id))
+
+    def get_or_create(self, guild_id, user_id) -> Account:
+        """Return the account, creating it with starting cash if needed"""
+        guild_id, user_id = int(guild_id), int(user_id)
+        accounts = self._guilds.get(guild_id)
+        if accounts is None:
+            accounts = self._guilds[guild_id] = {}
+        account = accounts.get(user_id)
+        if account is None:
+            account = accounts[user_id] = Account()
+            self._count += 1
+        return account
+
+    def add(self, guild_id, user_id, delta: int) -> Account:
+        """Add a cash delta to an account"""
+        account = self.get_or_create(guild_id, user_id)
+        account.cash += delta
+        return account
+
+    def set(self, guild_id, user_id, cash: int, last_daily: Optional[date], daily_streak: int) -> Account:
+        """Set an account's absolute cash and daily streak state"""
+        account = self.get_or_create(guild_id, user_id)
+        account.cash = cash
+        account.last_daily = last_daily
+        account.daily_streak = daily_streak
+        return account
+
+    def guild_accounts(self, guild_id) -> Iterator[Tuple[int, Account]]:
+        """(user_id, account) pairs for one guild"""
+        return iter(self._guilds.get(int(guild_id), {}).items())
+
+    def items(self) -> Iterator[Tuple[int, int, Account]]:
+        """(guild_id, user_id, account) for every account"""
+        for guild_id, accounts in self._guilds.items():
+            for user_id, account in accounts.items():
+                yield guild_id, user_id, account
+
+    def clear(self):
+        self._guilds.clear()
+        self._count = 0
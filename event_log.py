@@ -0,0 +1,282 @@
+"""
+Structured, append-only event log (one JSON object per line) plus a
+streaming query CLI.
+
+    python event_log.py [paths...] [--type bet] [--guild ID] [--user ID]
+                        [--since 24h] [--until 2026-10-01] [--where field=value]
+                        [--count-by field] [--sum field] [--limit N]
+
+Paths may be files (plain or .gz) or directories (default: events/).
+Records are streamed line by line, so memory stays constant however
+large the logs are; only --count-by keeps one counter per group.
+"""
+import argparse
+import glob
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from logging_setup import DailySizeRotatingFileHandler
+
+logger = logging.getLogger(__name__)
+
+# Event type -> field -> type; every record also has ts (UNIX seconds) and type
+EVENT_FIELDS: Dict[str, Dict[str, type]] = {
+    'detection': {'guild_id': int, 'kind': str, 'user_id': int, 'coordinated': bool, 'joins': int,
+                  'cluster': str, 'cluster_size': int},
+    'action': {'guild_id': int, 'action': str, 'user_id': int, 'reason': str},
+    'verification': {'guild_id': int, 'user_id': int, 'success': bool},
+    'bet': {'guild_id': int, 'game_id': str, 'user_id': int, 'side': str, 'amount': int},
+    'settlement': {'guild_id': int, 'game_id': str, 'result': str, 'bets': int, 'winners': int, 'losers': int,
+                   'total_bet_won': int, 'total_paid': int, 'total_lost': int, 'applied': bool},
+}
+# Fields an event of each type must carry
+REQUIRED_FIELDS: Dict[str, Tuple[str, ...]] = {
+    'detection': ('guild_id', 'kind'),
+    'action': ('guild_id', 'action', 'user_id'),
+    'verification': ('guild_id', 'user_id', 'success'),
+    'bet': ('guild_id', 'game_id', 'user_id', 'side', 'amount'),
+    'settlement': ('guild_id', 'game_id', 'result'),
+}
+
+def _coerce(value: Any, field_type: type) -> Any:
+    """
+    value as field_type, refusing lossy conversions: bool fields take only
+    bools, and int fields take ints, digit strings (IDs kept as str) and
+    whole-valued numbers, never bools or fractions
+    """
+    if type(value) is field_type:
+        return value
+    if field_type is bool:
+        raise TypeError(f"expected bool, got {type(value).__name__}")
+    if isinstance(value, bool):
+        raise TypeError(f"expected {field_type.__name__}, got bool")
+    if field_type is int and not isinstance(value, (int, str)):
+        whole = int(value)
+        if whole != value:
+            raise ValueError(f"{value!r} is not a whole number")
+        return whole
+    return field_type(value)
+
+class _EventWriter(logging.handlers.QueueListener):
+    """QueueListener that serialises queued event dicts on its own thread"""
+
+    def prepare(self, event: Dict[str, Any]) -> logging.LogRecord:
+        line = json.dumps(event, ensure_ascii=False, separators=(',', ':'))
+        return logging.makeLogRecord({'msg': line, 'levelno': logging.INFO})
+
+class EventLog:
+    """
+    Writes typed events as JSONL to <log_dir>/events.log.
+
+    emit() only validates the fields and queues the event dict; a writer
+    thread serialises and appends it, rolling the file over daily or at
+    max_bytes into gzipped events_YYYYMMDD.N.log.gz parts. Rolled parts
+    are kept unless backup_count is set.
+    """
+
+    def __init__(self, log_dir: str = "events", max_bytes: int = 100 * 1024 * 1024, backup_count: int = 0):
+        os.makedirs(log_dir, exist_ok=True)
+        handler = DailySizeRotatingFileHandler(log_dir, prefix="events", max_bytes=max_bytes,
+                                               backup_count=backup_count, compress=True)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self.path = handler.baseFilename
+        self._queue = queue.SimpleQueue()
+        self._listener = _EventWriter(self._queue, handler)
+        self._listener.start()
+        self.written = 0
+        self.rejected = 0
+
+    def emit(self, event_type: str, **fields: Any):
+        """Record one event; None fields are left out and values are converted to their schema type"""
+        schema = EVENT_FIELDS.get(event_type)
+        if schema is None:
+            raise ValueError(f"Unknown event type: {event_type}")
+        record: Dict[str, Any] = {'ts': round(time.time(), 3), 'type': event_type}
+        try:
+            for name, value in fields.items():
+                if value is None:
+                    continue
+                field_type = schema.get(name)
+                if field_type is None:
+                    raise ValueError(f"Unknown field {name!r} for {event_type} events")
+                record[name] = _coerce(value, field_type)
+            missing = [name for name in REQUIRED_FIELDS[event_type] if name not in record]
+            if missing:
+                raise ValueError(f"{event_type} event is missing {', '.join(missing)}")
+        except (TypeError, ValueError, OverflowError) as e:
+            self.rejected += 1
+            logger.error(f"Dropped malformed {event_type} event: {e}")
+            return
+
+        self._queue.put_nowait(record)
+        self.written += 1
+
+    def close(self):
+        """Write every queued event and stop the writer thread"""
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'path': self.path, 'written': self.written, 'rejected': self.rejected}
+
+_PART_NAME = re.compile(r'_(\d{8})\.(\d+)\.log(?:\.gz)?$')
+_RELATIVE_TIME = re.compile(r'^(\d+(?:\.\d+)?)([smhd])$')
+_UNIT_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+def parse_time(value: str, now: Optional[float] = None) -> float:
+    """UNIX seconds from a timestamp, an ISO date/time (UTC) or a relative age like 90m, 24h, 7d"""
+    match = _RELATIVE_TIME.match(value)
+    if match:
+        now = time.time() if now is None else now
+        return now - float(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        return (parsed - datetime(1970, 1, 1)).total_seconds()
+    return parsed.timestamp()
+
+def iter_files(paths: Iterable[str], since: Optional[float] = None, until: Optional[float] = None) -> Iterator[str]:
+    """Event files under paths in write order (rolled parts, then the active file), skipping days outside the range"""
+    # Parts are named for the writer's local day, so allow a day either side of the UTC range
+    since_day = (datetime.fromtimestamp(since, timezone.utc) - timedelta(days=1)).strftime('%Y%m%d') if since is not None else None
+    until_day = (datetime.fromtimestamp(until, timezone.utc) + timedelta(days=1)).strftime('%Y%m%d') if until is not None else None
+
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        parts = []
+        for part in glob.glob(os.path.join(glob.escape(path), "events_*.log*")):
+            match = _PART_NAME.search(part)
+            if match is None:
+                continue
+            day = match.group(1)
+            if since_day is not None and day < since_day:
+                continue
+            if until_day is not None and day > until_day:
+                continue
+            parts.append((day, int(match.group(2)), part))
+        for _, _, part in sorted(parts):
+            yield part
+        active = os.path.join(path, "events.log")
+        if os.path.exists(active):
+            yield active
+
+def iter_events(files: Iterable[str], event_type: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Stream decoded events, skipping lines of other types before decoding them"""
+    # Lines are written compactly, so the type can be matched as a substring first
+    marker = f'"type":"{event_type}"' if event_type else None
+    for path in files:
+        opener = gzip.open if path.endswith('.gz') else open
+        try:
+            with opener(path, 'rt', encoding='utf-8') as handle:
+                for line in handle:
+                    if marker is not None and marker not in line:
+                        continue
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash; skip it
+                        continue
+                    if event_type is None or event.get('type') == event_type:
+                        yield event
+        except (OSError, EOFError) as e:
+            print(f"warning: stopped reading {path}: {e}", file=sys.stderr)
+
+def _parse_where(clauses: List[str]) -> List[Tuple[str, str]]:
+    conditions = []
+    for clause in clauses:
+        name, sep, value = clause.partition('=')
+        if not sep:
+            raise SystemExit(f"--where expects field=value, got {clause!r}")
+        conditions.append((name, value))
+    return conditions
+
+def _matches(event: Dict[str, Any], conditions: List[Tuple[str, str]]) -> bool:
+    for name, value in conditions:
+        actual = event.get(name)
+        if isinstance(actual, bool):
+            actual = 'true' if actual else 'false'
+        if actual is None or str(actual) != value:
+            return False
+    return True
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', default=['events'], help="event files or directories")
+    parser.add_argument('--type', choices=sorted(EVENT_FIELDS), help="only this event type")
+    parser.add_argument('--guild', help="only this guild id")
+    parser.add_argument('--user', help="only this user id")
+    parser.add_argument('--since', help="from this time (UNIX, ISO UTC, or age like 24h)")
+    parser.add_argument('--until', help="up to this time (UNIX, ISO UTC, or age like 1h)")
+    parser.add_argument('--where', action='append', default=[], metavar='FIELD=VALUE', help="exact field match")
+    parser.add_argument('--count-by', metavar='FIELD', help="count matches per value of FIELD")
+    parser.add_argument('--sum', metavar='FIELD', help="also total FIELD (with --count-by), or total it overall")
+    parser.add_argument('--limit', type=int, help="stop after this many matching events")
+    args = parser.parse_args(argv)
+
+    since = parse_time(args.since) if args.since else None
+    until = parse_time(args.until) if args.until else None
+    conditions = _parse_where(args.where)
+    if args.guild:
+        conditions.append(('guild_id', args.guild))
+    if args.user:
+        conditions.append(('user_id', args.user))
+
+    counts: Dict[Any, int] = defaultdict(int)
+    sums: Dict[Any, Union[int, float]] = defaultdict(int)
+    matched = 0
+    out = sys.stdout
+    try:
+        for event in iter_events(iter_files(args.paths, since, until), args.type):
+            ts = event.get('ts', 0)
+            if since is not None and ts < since:
+                continue
+            if until is not None and ts > until:
+                continue
+            if conditions and not _matches(event, conditions):
+                continue
+            matched += 1
+            if args.count_by or args.sum:
+                key = event.get(args.count_by) if args.count_by else None
+                counts[key] += 1
+                if args.sum:
+                    value = event.get(args.sum)
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        sums[key] += value
+            else:
+                out.write(json.dumps(event, ensure_ascii=False, separators=(',', ':')) + '\n')
+            if args.limit is not None and matched >= args.limit:
+                break
+    except BrokenPipeError:
+        # Output piped into head and closed early
+        sys.stderr.close()
+        return
+
+    if args.count_by or args.sum:
+        for key, count in sorted(counts.items(), key=lambda item: -item[1]):
+            label = key if args.count_by else 'total'
+            line = f"{label}\t{count}"
+            if args.sum:
+                # Integer totals (cash) print in full; :g would turn large ones into 1.2e+07
+                line += f"\t{sums[key]}"
+            out.write(line + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from confusables import skeleton
+
+_DIGIT_RUNS = re.compile(r'\d+')
+
+def name_shape(name: str) -> str:
+    """Homoglyph skeleton of a name with digit runs collapsed, so Raider_0042 and rаider_7 share a shape"""
+    return _DIGIT_RUNS.sub('#', skeleton(name))
+
+class _Join:
+    __slots__ = ('time', 'member_id', 'keys', 'flagged')
+
+    def __init__(self, time: float, member_id: int, keys: Tuple[tuple, ...]):
+        self.time = time
+        self.member_id = member_id
+        self.keys = keys
+        self.flagged = False
+
+class JoinWave:
+    """What one join triggered: a volume raid, a cluster, and the members to act on"""
+    __slots__ = ('volume', 'cluster', 'new_cluster', 'member_ids')
+
+    def __init__(self, volume: bool, cluster: Optional[str], new_cluster: bool, member_ids: List[int]):
+        # The window crossed max_joins with this join
+        self.volume = volume
+        # Description of the cluster this join belongs to, if it is flagged
+        self.cluster = cluster
+        # The cluster reached cluster_size with this join
+        self.new_cluster = new_cluster
+        self.member_ids = member_ids
+
+class JoinWaveDetector:
+    """
+    Per-guild sliding window of recent joins that also clusters joiners
+    online, so a bot wave is told apart from organic growth.
+
+    Joins live in a ring buffer (a bounded deque expired from the left)
+    instead of a list rebuilt on every join. Each join is indexed under a
+    few cluster keys, each key holding its joins in arrival order:
+
+    - same name shape (skeleton with digits collapsed) and accounts
+      created within creation_spread of each other
+    - same custom avatar
+
+    Creation time alone is never a key: unrelated new accounts without an
+    avatar routinely join within the same hour.
+
+    Creation times are bucketed on two grids offset by half a spread, so
+    two accounts created less than spread/2 apart always share a bucket.
+    A key holding cluster_size joins is a raid cluster; all of its members
+    are returned once, then every later join that lands in it.
+    """
+
+    def __init__(self, max_joins: int = 10, window_seconds: float = 60.0, cluster_size: int = 5,
+                 creation_spread: float = 3600.0, capacity: int = 5000):
+        self.max_joins = max_joins
+        self.window_seconds = window_seconds
+        self.cluster_size = cluster_size
+        self.creation_spread = creation_spread
+
+        self._joins: Deque[_Join] = deque(maxlen=capacity)
+        self._clusters: Dict[tuple, Deque[_Join]] = {}
+        self._flagged_keys = set()
+        # Members returned as part of a cluster and still inside the window
+        self._flagged_members = set()
+        self._volume_flagged = False
+
+    def __len__(self) -> int:
+        return len(self._joins)
+
+    @property
+    def settings(self) -> tuple:
+        return (self.max_joins, self.window_seconds, self.cluster_size, self.creation_spread)
+
+    def add(self, member_id: int, created_at: Optional[float], name: str, avatar_key: Optional[str],
+            now: Optional[float] = None) -> Optional[JoinWave]:
+        """Record a join (created_at as a UNIX timestamp); returns what it triggered, or None"""
+        now = time.monotonic() if now is None else now
+        self._expire(now - self.window_seconds)
+
+        joins = self._joins
+        if len(joins) == joins.maxlen:
+            self._drop(joins[0])
+        join = _Join(now, member_id, self._cluster_keys(created_at, name, avatar_key))
+        joins.append(join)
+
+        volume = False
+        if len(joins) >= self.max_joins:
+            volume = not self._volume_flagged
+            self._volume_flagged = True
+
+        cluster = None
+        new_cluster = False
+        member_ids = []
+        for key in join.keys:
+            members = self._clusters.setdefault(key, deque())
+            members.append(join)
+            if cluster is not None:
+                continue
+            if key in self._flagged_keys:
+                cluster = self._describe(key, len(members))
+                join.flagged = True
+                self._flagged_members.add(member_id)
+                member_ids.append(member_id)
+            elif self.cluster_size > 0 and len(members) >= self.cluster_size:
+                self._flagged_keys.add(key)
+                cluster = self._describe(key, len(members))
+                new_cluster = True
+                for member in members:
+                    if not member.flagged:
+                        member.flagged = True
+                        self._flagged_members.add(member.member_id)
+                        member_ids.append(member.member_id)
+
+        if not volume and cluster is None:
+            return None
+        return JoinWave(volume, cluster, new_cluster, member_ids)
+
+    def is_flagged(self, member_id: int) -> bool:
+        """Whether a member still in the window was returned as part of a cluster"""
+        return member_id in self._flagged_members
+
+    def _cluster_keys(self, created_at: Optional[float], name: str, avatar_key: Optional[str]) -> Tuple[tuple, ...]:
+        keys = []
+        if avatar_key:
+            keys.append(('avatar', avatar_key))
+        if created_at is not None and self.creation_spread > 0:
+            shape = name_shape(name)
+            for grid in (0, 1):
+                bucket = int((created_at + grid * self.creation_spread / 2) // self.creation_spread)
+                keys.append(('shape', shape, grid, bucket))
+        return tuple(keys)
+
+    def _describe(self, key: tuple, size: int) -> str:
+        if key[0] == 'avatar':
+            return f"{size} accounts with the same avatar"
+        return f"{size} accounts named like '{key[1]}' created within {self.creation_spread:g}s"
+
+    def _expire(self, cutoff: float):
+        joins = self._joins
+        while joins and joins[0].time < cutoff:
+            self._drop(joins[0])
+        if len(joins) < self.max_joins:
+            self._volume_flagged = False
+
+    def _drop(self, join: _Join):
+        """Remove the oldest join from the window and from each of its clusters"""
+        self._joins.popleft()
+        if join.flagged:
+            self._flagged_members.discard(join.member_id)
+        for key in join.keys:
+            members = self._clusters.get(key)
+            if not members:
+                continue
+            # Clusters fill in arrival order, so the oldest join is at the front of each
+            members.popleft()
+            if not members:
+                del self._clusters[key]
+                self._flagged_keys.discard(key)
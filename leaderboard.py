@@ -0,0 +1,63 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+logger = logging.getLogger(__name__)
+
+class LeaderboardIndex:
+    """
+    Per-guild cash ranking kept up to date on every cash mutation.
+
+    Each guild has a SortedList of (-cash, user_id) so the richest user is
+    first; updates are O(log n) and a page is O(log n + page_size).
+    Users with no positive cash are not ranked (same as ?cashboard).
+    """
+
+    def __init__(self):
+        self._guilds: Dict[str, SortedList] = {}
+        # (guild_id, user_id) -> entry currently stored in the guild's list
+        self._entries: Dict[Tuple[str, str], Tuple[int, str]] = {}
+
+    def update(self, guild_id: str, user_id: str, cash: int):
+        """Move a user to the position for their new cash balance"""
+        guild_id, user_id = str(guild_id), str(user_id)
+        ranking = self._guilds.get(guild_id)
+        old_entry = self._entries.pop((guild_id, user_id), None)
+
+        if old_entry is not None:
+            ranking.remove(old_entry)
+
+        if cash > 0:
+            if ranking is None:
+                ranking = self._guilds[guild_id] = SortedList()
+            entry = (-cash, user_id)
+            ranking.add(entry)
+            self._entries[(guild_id, user_id)] = entry
+        elif ranking is not None and not ranking:
+            del self._guilds[guild_id]
+
+    def count(self, guild_id: str) -> int:
+        """Number of ranked users in a guild"""
+        ranking = self._guilds.get(str(guild_id))
+        return len(ranking) if ranking else 0
+
+    def page(self, guild_id: str, page: int, per_page: int = 10) -> List[Tuple[str, int]]:
+        """(user_id, cash) rows for a 1-based page, richest first"""
+        ranking = self._guilds.get(str(guild_id))
+        if not ranking or page < 1:
+            return []
+        start = (page - 1) * per_page
+        return [(user_id, -neg_cash) for neg_cash, user_id in ranking[start:start + per_page]]
+
+    def rank(self, guild_id: str, user_id: str) -> Optional[int]:
+        """1-based rank of a user, or None if they are not ranked"""
+        guild_id, user_id = str(guild_id), str(user_id)
+        entry = self._entries.get((guild_id, user_id))
+        if entry is None:
+            return None
+        return self._guilds[guild_id].index(entry) + 1
+
+    def clear(self):
+        self._guilds.clear()
+        self._entries.clear()
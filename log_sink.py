@@ -0,0 +1,219 @@
+import asyncio
+import itertools
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# Entry priorities; the lowest priority is dropped first when a backlog is full
+PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW = 0, 1, 2
+
+# Discord limits: embeds per message and total embed characters per message
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_MESSAGE_EMBED_CHARS = 5500
+# Subjects listed in a collapsed entry before "and N more"
+MAX_LISTED_SUBJECTS = 10
+
+# (channel, batch window seconds, max buffered entries) for a guild, or None when logging is off
+LogTarget = Tuple[discord.abc.Messageable, float, int]
+Color = Union[int, discord.Colour]
+
+class _Entry:
+    """One embed-to-be; repeated events with the same collapse key are counted into it"""
+    __slots__ = ('title', 'description', 'color', 'priority', 'fields', 'summary', 'subjects', 'count', 'timestamp')
+
+    def __init__(self, title: str, description: Optional[str], color: Color, priority: int,
+                 fields: Sequence[Tuple[str, str, bool]], summary: Optional[str], subject: Optional[str]):
+        self.title = title
+        self.description = description
+        self.color = color
+        self.priority = priority
+        self.fields = fields
+        self.summary = summary
+        self.subjects = [subject] if subject else []
+        self.count = 1
+        self.timestamp = datetime.utcnow()
+
+    def render(self, footer: Optional[str], footer_icon: Optional[str]) -> discord.Embed:
+        if self.count == 1:
+            embed = discord.Embed(title=self.title, description=self.description, color=self.color, timestamp=self.timestamp)
+            for name, value, inline in self.fields:
+                embed.add_field(name=name, value=value, inline=inline)
+        else:
+            lines = [self.summary.replace('{count}', str(self.count)) if self.summary else f"{self.count} events"]
+            lines.extend(f"• {subject}" for subject in self.subjects[:MAX_LISTED_SUBJECTS])
+            if self.count > MAX_LISTED_SUBJECTS:
+                lines.append(f"…and {self.count - MAX_LISTED_SUBJECTS} more")
+            embed = discord.Embed(title=f"{self.title} ×{self.count}", description="\n".join(lines)[:4096],
+                                  color=self.color, timestamp=self.timestamp)
+        if footer:
+            embed.set_footer(text=footer, icon_url=footer_icon)
+        return embed
+
+class _GuildBuffer:
+    __slots__ = ('guild', 'entries', 'wakeup', 'task', 'dropped', 'footer_icon', 'window', 'max_backlog')
+
+    def __init__(self, guild: discord.Guild):
+        self.guild = guild
+        # collapse key -> entry, in arrival order
+        self.entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.footer_icon: Optional[str] = None
+        self.window = 2.0
+        self.max_backlog = 100
+
+class LogSink:
+    """
+    Per-guild buffered log-channel writer.
+
+    resolve(guild) returns the guild's LogTarget: the log channel, the
+    batch window and the backlog cap. Events are held for the window (or
+    until MAX_EMBEDS_PER_MESSAGE distinct entries are waiting) and sent
+    as up to ten embeds per message. Events sharing a collapse key are
+    counted into one entry ("37 members quarantined"). Past the backlog
+    cap the oldest lowest-priority entry is dropped, and the drop is
+    reported with the next flush.
+    """
+
+    def __init__(self, resolve: Callable[[discord.Guild], Optional[LogTarget]], footer: Optional[str] = None):
+        self.resolve = resolve
+        self.footer = footer
+        self._buffers: Dict[int, _GuildBuffer] = {}
+        self._unique = itertools.count()
+        # Set by close(): flush loops stop waiting out their windows
+        self._closing = False
+
+        self.posted = 0
+        self.collapsed = 0
+        self.dropped = 0
+        self.messages_sent = 0
+        self.embeds_sent = 0
+
+    def post(self, guild: discord.Guild, title: str, description: Optional[str], color: Color, *,
+             priority: int = PRIORITY_NORMAL, fields: Sequence[Tuple[str, str, bool]] = (),
+             collapse: Optional[Hashable] = None, summary: Optional[str] = None, subject: Optional[str] = None):
+        """
+        Buffer one log event. Events with the same collapse key inside a
+        window merge into one embed described by summary ("{count} members
+        quarantined") followed by their subjects.
+        """
+        target = self.resolve(guild)
+        if target is None:
+            return
+        self.posted += 1
+
+        buffer = self._buffers.get(guild.id)
+        if buffer is None:
+            buffer = self._buffers[guild.id] = _GuildBuffer(guild)
+        buffer.guild = guild
+        _, buffer.window, buffer.max_backlog = target
+        if buffer.footer_icon is None and guild.me:
+            buffer.footer_icon = guild.me.display_avatar.url
+
+        key = collapse if collapse is not None else next(self._unique)
+        entry = buffer.entries.get(key)
+        if entry is not None:
+            entry.count += 1
+            if subject and len(entry.subjects) < MAX_LISTED_SUBJECTS:
+                entry.subjects.append(subject)
+            self.collapsed += 1
+        else:
+            buffer.entries[key] = _Entry(title, description, color, priority, fields, summary, subject)
+            if len(buffer.entries) > buffer.max_backlog:
+                self._drop_one(buffer)
+
+        if len(buffer.entries) >= MAX_EMBEDS_PER_MESSAGE:
+            buffer.wakeup.set()
+        if buffer.task is None or buffer.task.done():
+            buffer.task = asyncio.create_task(self._run(buffer))
+
+    def _drop_one(self, buffer: _GuildBuffer):
+        """Drop the oldest entry of the lowest priority present"""
+        lowest = max(entry.priority for entry in buffer.entries.values())
+        for key, entry in buffer.entries.items():
+            if entry.priority == lowest:
+                del buffer.entries[key]
+                buffer.dropped += entry.count
+                self.dropped += entry.count
+                return
+
+    async def _run(self, buffer: _GuildBuffer):
+        """Flush a guild's buffer every window (or as soon as a message's worth is waiting) until it stays empty"""
+        while buffer.entries:
+            if not buffer.wakeup.is_set() and not self._closing:
+                try:
+                    await asyncio.wait_for(buffer.wakeup.wait(), buffer.window)
+                except asyncio.TimeoutError:
+                    pass
+            buffer.wakeup.clear()
+            await self._flush(buffer)
+
+    async def _flush(self, buffer: _GuildBuffer):
+        entries = list(buffer.entries.values())
+        buffer.entries.clear()
+        dropped, buffer.dropped = buffer.dropped, 0
+        # Re-resolved so a channel changed or removed during the window is respected
+        target = self.resolve(buffer.guild)
+        if target is None or not entries:
+            return
+        channel = target[0]
+
+        embeds = [entry.render(self.footer, buffer.footer_icon) for entry in entries]
+        if dropped:
+            embeds.append(discord.Embed(
+                title="⚠️ Log backlog full",
+                description=f"{dropped} low-priority log event(s) were dropped",
+                color=0x95a5a6
+            ))
+
+        for batch in self._pack(embeds):
+            try:
+                await channel.send(embeds=batch)
+                self.messages_sent += 1
+                self.embeds_sent += len(batch)
+            except Exception as e:
+                logger.error(f"Failed to send {len(batch)} log embed(s) in {buffer.guild.name}: {e}")
+
+    @staticmethod
+    def _pack(embeds: List[discord.Embed]) -> List[List[discord.Embed]]:
+        """Split embeds into messages within the per-message count and size limits"""
+        batches: List[List[discord.Embed]] = []
+        batch: List[discord.Embed] = []
+        size = 0
+        for embed in embeds:
+            embed_size = len(embed)
+            if batch and (len(batch) >= MAX_EMBEDS_PER_MESSAGE or size + embed_size > MAX_MESSAGE_EMBED_CHARS):
+                batches.append(batch)
+                batch, size = [], 0
+            batch.append(embed)
+            size += embed_size
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def close(self):
+        """Send whatever is still buffered"""
+        self._closing = True
+        for buffer in list(self._buffers.values()):
+            # Let a running flush loop finish its send rather than cancel it with the batch
+            # already taken out of the buffer; it flushes the rest without waiting
+            if buffer.task is not None and not buffer.task.done():
+                buffer.wakeup.set()
+                await buffer.task
+            await self._flush(buffer)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'posted': self.posted,
+            'collapsed': self.collapsed,
+            'dropped': self.dropped,
+            'messages_sent': self.messages_sent,
+            'embeds_sent': self.embeds_sent,
+            'buffered': sum(len(buffer.entries) for buffer in self._buffers.values())
+        }
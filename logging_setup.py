@@ -1,54 +1,169 @@
+import atexit
+import glob
+import gzip
 import logging
+import logging.handlers
 import os
-from datetime import datetime
+import queue
+import re
+import shutil
+from datetime import date
+from typing import Optional
+
+# The listener draining the current setup's queue, stopped (and flushed) on re-setup or exit
+_listener: Optional[logging.handlers.QueueListener] = None
+
+_PART_INDEX = re.compile(r'\.(\d+)\.log(?:\.gz)?$')
+
+class DailySizeRotatingFileHandler(logging.handlers.BaseRotatingHandler):
+    """
+    Writes to <log_dir>/<prefix>.log and rolls it over at the first record
+    of a new day or once it has reached max_bytes (so a file can run one
+    record past the limit). Rolled files are named <prefix>_YYYYMMDD.N.log
+    (gzipped when compress is set) and only the newest backup_count are
+    kept.
+
+    Meant to run on the QueueListener thread, so rollover and compression
+    never block the event loop.
+    """
+
+    def __init__(self, log_dir: str, prefix: str = "antibot", max_bytes: int = 50 * 1024 * 1024,
+                 backup_count: int = 30, compress: bool = True, encoding: str = 'utf-8'):
+        self.log_dir = log_dir
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        filename = os.path.join(log_dir, f"{prefix}.log")
+        super().__init__(filename, 'a', encoding=encoding, delay=False)
+        # Day the active file belongs to (its mtime's day when resuming an existing file)
+        self.current_day = date.fromtimestamp(os.path.getmtime(filename)) if os.path.exists(filename) else date.today()
+        # Size of the active file, counted as records are formatted instead of asking the stream
+        self.size = os.path.getsize(filename)
+
+    def format(self, record: logging.LogRecord) -> str:
+        # emit() formats each record exactly once, right before writing it.
+        # Byte length is approximated by characters, which is close for mostly-ASCII logs
+        message = super().format(record)
+        self.size += len(message) + 1
+        return message
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if date.today() != self.current_day:
+            return True
+        return 0 < self.max_bytes <= self.size
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename):
+            stem = os.path.join(self.log_dir, f"{self.prefix}_{self.current_day.strftime('%Y%m%d')}")
+            # Number after the highest existing part, so pruned parts are never reused
+            parts = (_PART_INDEX.search(path) for path in glob.glob(glob.escape(stem) + ".*"))
+            index = 1 + max((int(match.group(1)) for match in parts if match), default=0)
+            self.rotate(self.baseFilename, f"{stem}.{index}{'.log.gz' if self.compress else '.log'}")
+
+        self.current_day = date.today()
+        self._prune()
+        self.stream = self._open()
+        self.size = 0
+
+    def rotate(self, source: str, dest: str):
+        if not self.compress:
+            os.replace(source, dest)
+            return
+        with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+    def _prune(self):
+        """Delete the oldest rolled files beyond backup_count"""
+        if self.backup_count <= 0:
+            return
+        rolled = glob.glob(os.path.join(glob.escape(self.log_dir), f"{glob.escape(self.prefix)}_*.log*"))
+        rolled.sort(key=os.path.getmtime)
+        for path in rolled[:-self.backup_count]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def setup_logging(log_level: str = "INFO", log_to_file: bool = True, log_dir: str = "logs",
+                  max_bytes: int = 50 * 1024 * 1024, backup_count: int = 30, compress: bool = True):
+    """
+    Setup logging configuration for the bot.
+
+    The root logger only gets a QueueHandler: callers (the event loop)
+    format the message and enqueue the record, while a QueueListener
+    thread does the console and file I/O. The log file rolls over daily
+    or at max_bytes, old files are gzipped and backup_count are kept.
+    Returns the listener.
+    """
+    global _listener
 
-def setup_logging(log_level: str = "INFO", log_to_file: bool = True, log_dir: str = "logs"):
-    """Setup logging configuration for the bot"""
-    
     # Create logs directory if it doesn't exist
     if log_to_file:
         os.makedirs(log_dir, exist_ok=True)
-    
+
     # Configure logging level
     numeric_level = getattr(logging, log_level.upper(), logging.INFO)
-    
+
     # Create formatter
     formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
-    
+
     # Configure root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(numeric_level)
-    
-    # Clear existing handlers
+
+    # Clear existing handlers, draining the previous listener first
+    shutdown_logging()
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
-    
+
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setLevel(numeric_level)
     console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
-    
+    handlers = [console_handler]
+
     # File handler
     if log_to_file:
-        log_filename = f"antibot_{datetime.now().strftime('%Y%m%d')}.log"
-        log_filepath = os.path.join(log_dir, log_filename)
-        
-        file_handler = logging.FileHandler(log_filepath, encoding='utf-8')
+        file_handler = DailySizeRotatingFileHandler(log_dir, max_bytes=max_bytes, backup_count=backup_count,
+                                                    compress=compress)
         file_handler.setLevel(numeric_level)
         file_handler.setFormatter(formatter)
-        root_logger.addHandler(file_handler)
-    
+        handlers.append(file_handler)
+
+    # Records are queued on the calling thread and written by the listener thread
+    log_queue = queue.SimpleQueue()
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
     # Configure discord.py logging to be less verbose
     discord_logger = logging.getLogger('discord')
     discord_logger.setLevel(logging.WARNING)
-    
+
     # Log startup message
     startup_logger = logging.getLogger('startup')
     startup_logger.info("Logging system initialized")
     startup_logger.info(f"Log level: {log_level}")
     if log_to_file:
-        startup_logger.info(f"Log file: {log_filepath}")
+        startup_logger.info(f"Log file: {file_handler.baseFilename}")
+    return _listener
+
+def shutdown_logging():
+    """Stop the listener thread after it has written every queued record"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+atexit.register(shutdown_logging)
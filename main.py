@@ -23,8 +23,6 @@ import string
 from datetime import datetime, timedelta
 from typing import Optional
 from openai import OpenAI
-import psycopg2
-from psycopg2.extras import RealDictCursor
 
 from config import ConfigManager
 from bot_detection import BotDetector
@@ -32,11 +30,22 @@ from spam_detection import SpamDetector
 from moderation import ModerationTools
 from logging_setup import setup_logging
 from monitor import BotMonitor
+from storage import create_storage
+from settlement import compute_settlement, apply_settlement
+from user_resolver import UserResolver
+from join_waves import JoinWaveDetector
+from log_sink import LogSink, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from event_log import EventLog
 
 # Setup logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
+# Joins arriving within this many seconds are scored by BotDetector as one batch
+JOIN_BATCH_WINDOW = 0.2
+# Tries at crediting a round's payouts (backing off 1s, 2s, ...) before reporting it unpaid
+SETTLEMENT_ATTEMPTS = 3
+
 def _parse_duration(duration_str):
     """Parse duration string like '30s', '5m', '2h', '1d' into seconds"""
     if not duration_str:
@@ -101,6 +110,9 @@ class AntiSpamBot(commands.Bot):
         self.config_manager = ConfigManager()
         self.bot_detector = BotDetector(self.config_manager)
         self.spam_detector = SpamDetector(self.config_manager)
+        self.log_sink = LogSink(self._get_log_target, footer="AntiBot Protection System")
+        # Structured JSONL record of detections, actions, verifications, bets and settlements
+        self.event_log = EventLog()
         self.moderation = ModerationTools(self)
         self.monitor = BotMonitor(self)
 
@@ -109,16 +121,20 @@ class AntiSpamBot(commands.Bot):
         # do not change this unless explicitly requested by the user
         self.openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
-        # Database handling with environment awareness
-        self.database_url = None # Force disabled as per user request
-        # If running in Colab or no DB URL, ensure we use memory + JSON backup
-        if not self.database_url or os.environ.get('COLAB_ENVIRONMENT') == 'true':
-            logger.info("📱 Using file-based storage (JSON backup) for data persistence")
-        
-        self._create_initial_tables()
+        # Storage backend for cash, trivia history and game records.
+        # JSON snapshot + ledger by default; STORAGE_BACKEND=postgres opts into PostgreSQL.
+        self.backup_file_path = "user_cash_backup.json"
+        self.storage = create_storage(self.backup_file_path)
+
+        # Display-name lookups for leaderboard embeds (member cache -> name cache -> REST)
+        self.user_resolver = UserResolver(self)
 
-        # Track member joins for raid detection
-        self.recent_joins = {}
+        # Per-guild join windows with look-alike clustering for raid detection
+        self.join_waves = {}
+
+        # Members waiting for batched bot detection
+        self.pending_joins = []
+        self.join_batch_task = None
 
         # Track pending verifications
         self.pending_verifications = {}
@@ -127,245 +143,75 @@ class AntiSpamBot(commands.Bot):
         self.active_games = {}
         self.leaderboard = {}
 
-        # In-memory cash storage when database isn't available
-        self.user_cash_memory = {}
-
-        # Per-user locks for preventing race conditions in daily rewards
-        self._daily_locks = {}
+        # Tai/Xiu rounds per guild and channels with auto-cycle enabled
+        self.overunder_games = {}
+        self.overunder_autocycle = {}
 
         self.backup_task = None
-        self.backup_file_path = "user_cash_backup.json"
-        self._load_backup_data()
-
-    async def setup_hook(self):
-        # Start backup task
-        self.backup_task = self.loop.create_task(self._backup_data_loop())
-
-    def _load_backup_data(self):
-        """Load user cash data from backup file on startup"""
-        try:
-            if os.path.exists(self.backup_file_path):
-                with open(self.backup_file_path, 'r', encoding='utf-8') as f:
-                    backup_data = json.load(f)
-                    raw_user_data = backup_data.get('user_cash_memory', {})
-
-                    # Load into memory
-                    loaded_count = 0
-                    for key, data in raw_user_data.items():
-                        processed_data = data.copy()
-
-                        # Convert last_daily string back to date object
-                        if 'last_daily' in processed_data and processed_data['last_daily']:
-                            try:
-                                if isinstance(processed_data['last_daily'], str):
-                                    processed_data['last_daily'] = datetime.strptime(processed_data['last_daily'], '%Y-%m-%d').date()
-                            except (ValueError, TypeError):
-                                processed_data['last_daily'] = None
-
-                        self.user_cash_memory[key] = processed_data
-                        loaded_count += 1
-
-                    logger.info(f"Loaded backup data for {loaded_count} users from {self.backup_file_path}")
-            else:
-                logger.info("No backup file found, starting with empty memory")
-        except Exception as e:
-            logger.error(f"Error loading backup data: {e}")
-
-    def _save_backup_data(self):
-        """Save current user cash data to backup file"""
-        try:
-            # Don't save if memory is completely empty
-            if not self.user_cash_memory:
-                return
-
-            # Prepare data for saving
-            save_memory = {}
-            for key, data in self.user_cash_memory.items():
-                processed_data = data.copy()
-                
-                # Convert date objects to strings for JSON serialization
-                if 'last_daily' in processed_data and processed_data['last_daily']:
-                    if hasattr(processed_data['last_daily'], 'isoformat'):
-                        processed_data['last_daily'] = processed_data['last_daily'].isoformat()
-                
-                save_memory[key] = processed_data
-
-            backup_data = {
-                'user_cash_memory': save_memory,
-                'last_backup': datetime.utcnow().isoformat()
-            }
-
-            # Atomic write using temporary file
-            temp_file = f"{self.backup_file_path}.tmp"
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(backup_data, f, indent=2, ensure_ascii=False)
-
-            os.replace(temp_file, self.backup_file_path)
-            logger.debug(f"Saved backup data for {len(save_memory)} users")
-
-        except Exception as e:
-            logger.error(f"Error saving backup data: {e}")
+        self.state_sweep_task = None
 
     async def _backup_data_loop(self):
-        """Background task that saves data every 5 seconds"""
+        """Background task that flushes the storage backend when its debounce window closes"""
         # Wait a bit on first run to ensure system is ready
         await asyncio.sleep(10)  # Initial delay to let system stabilize
 
         while True:
             try:
-                await asyncio.sleep(5)  # Save every 5 seconds
-                self._save_backup_data()
-                logger.debug("Auto-saved user cash data to backup file")
+                # Sleep until pending records are due (at most 1s, at least a short tick)
+                await asyncio.sleep(max(0.05, self.storage.next_flush_delay()))
+                await self.storage.flush()
             except Exception as e:
                 logger.error(f"Error in backup loop: {e}")
                 await asyncio.sleep(30)  # Wait longer if there's an error
 
-    def _get_db_connection(self):
-        """Get a fresh database connection for operations"""
-        if not self.database_url:
-            return None
+    async def _state_sweep_loop(self):
+        """Background task that evicts idle per-user spam tracking state"""
+        while True:
+            try:
+                await asyncio.sleep(60)
+                evicted = self.spam_detector.sweep()
+                if evicted:
+                    logger.debug(f"Evicted {evicted} idle spam-tracking entries")
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in state sweep loop: {e}")
+
+    async def close(self):
+        """Flush and close the storage backend before shutting down"""
         try:
-            return psycopg2.connect(self.database_url)
+            await self.moderation.stop()
         except Exception as e:
-            logger.error(f"Failed to create database connection: {e}")
-            return None
-
-    def _create_initial_tables(self):
-        """Create necessary database tables if they don't exist"""
-        if not self.database_url:
-            logger.warning("DATABASE_URL not set, database features disabled")
-            return
-
-        connection = self._get_db_connection()
-        if not connection:
-            return
-
+            logger.error(f"Error stopping moderation queue: {e}")
         try:
-            with connection.cursor() as cursor:
-                # Create user_cash table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS user_cash (
-                        guild_id VARCHAR(50) NOT NULL,
-                        user_id VARCHAR(50) NOT NULL,
-                        cash BIGINT DEFAULT 0,
-                        last_daily DATE,
-                        daily_streak INTEGER DEFAULT 0,
-                        PRIMARY KEY (guild_id, user_id)
-                    )
-                """)
-
-                # Create shown_questions table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS shown_questions (
-                        guild_id VARCHAR(50) NOT NULL,
-                        question_text TEXT NOT NULL,
-                        PRIMARY KEY (guild_id, question_text)
-                    )
-                """)
-
-                # Create overunder_games table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS overunder_games (
-                        game_id VARCHAR(50) PRIMARY KEY,
-                        guild_id VARCHAR(50) NOT NULL,
-                        channel_id VARCHAR(50) NOT NULL,
-                        status VARCHAR(20) DEFAULT 'active',
-                        result VARCHAR(10),
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-
-                connection.commit()
-                logger.info("Database tables created/verified successfully")
-
+            await self.log_sink.close()
         except Exception as e:
-            logger.error(f"Error creating database tables: {e}")
-        finally:
-            connection.close()
-
-    def _get_shown_questions(self, guild_id):
-        """Get all questions that have been shown to this guild"""
-        connection = self._get_db_connection()
-        if not connection:
-            return set()
-
+            logger.error(f"Error flushing log channel buffers: {e}")
         try:
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "SELECT question_text FROM shown_questions WHERE guild_id = %s",
-                    (guild_id,)
-                )
-                results = cursor.fetchall()
-                return {row[0] for row in results}
+            await self.storage.close()
         except Exception as e:
-            logger.error(f"Error getting shown questions: {e}")
-            return set()
-        finally:
-            connection.close()
+            logger.error(f"Error closing storage: {e}")
+        self.event_log.close()
+        await super().close()
 
-    def _mark_question_shown(self, guild_id, question_text):
-        """Mark a question as shown for this guild"""
-        connection = self._get_db_connection()
-        if not connection:
-            return
+    async def _get_shown_questions(self, guild_id):
+        """Get all questions that have been shown to this guild"""
+        return await self.storage.get_shown_questions(guild_id)
 
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "INSERT INTO shown_questions (guild_id, question_text) VALUES (%s, %s) ON CONFLICT (guild_id, question_text) DO NOTHING",
-                    (guild_id, question_text)
-                )
-                connection.commit()
-        except Exception as e:
-            logger.error(f"Error marking question as shown: {e}")
-        finally:
-            connection.close()
+    async def _mark_question_shown(self, guild_id, question_text):
+        """Mark a question as shown for this guild"""
+        await self.storage.mark_questions_shown(guild_id, [question_text])
 
-    def _batch_mark_questions_shown(self, guild_id, questions):
+    async def _batch_mark_questions_shown(self, guild_id, questions):
         """Mark multiple questions as shown for this guild (batch operation)"""
         if not questions:
             return
+        await self.storage.mark_questions_shown(guild_id, questions)
+        logger.info(f"Batch marked {len(questions)} questions as shown for guild {guild_id}")
 
-        connection = self._get_db_connection()
-        if not connection:
-            return
-
-        try:
-            with connection.cursor() as cursor:
-                # Use executemany for batch insert
-                values = [(guild_id, question) for question in questions]
-                cursor.executemany(
-                    "INSERT INTO shown_questions (guild_id, question_text) VALUES (%s, %s) ON CONFLICT (guild_id, question_text) DO NOTHING",
-                    values
-                )
-                connection.commit()
-                logger.info(f"Batch marked {len(questions)} questions as shown for guild {guild_id}")
-        except Exception as e:
-            logger.error(f"Error batch marking questions as shown: {e}")
-            # Fallback to individual inserts
-            for question in questions:
-                self._mark_question_shown(guild_id, question)
-        finally:
-            connection.close()
-
-    def _reset_question_history(self, guild_id):
+    async def _reset_question_history(self, guild_id):
         """Reset question history for a guild (admin command)"""
-        connection = self._get_db_connection()
-        if not connection:
-            return
-
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "DELETE FROM shown_questions WHERE guild_id = %s",
-                    (guild_id,)
-                )
-                connection.commit()
-                logger.info(f"Reset question history for guild {guild_id}")
-        except Exception as e:
-            logger.error(f"Error resetting question history: {e}")
-        finally:
-            connection.close()
+        await self.storage.reset_question_history(guild_id)
 
     async def translate_to_vietnamese(self, text):
         """Translate English text to Vietnamese"""
@@ -416,91 +262,17 @@ class AntiSpamBot(commands.Bot):
             return vietnamese_text.lower()  # Return original text if translation fails
 
     # === CASH SYSTEM HELPER METHODS ===
-    def _get_user_cash(self, guild_id, user_id):
+    async def _get_user_cash(self, guild_id, user_id):
         """Get user's cash amount and daily streak info"""
-        connection = self._get_db_connection()
-        if not connection:
-            # Use in-memory storage when database isn't available
-            key = f"{guild_id}_{user_id}"
-            if key in self.user_cash_memory:
-                data = self.user_cash_memory[key]
-                return data.get('cash', 1000), data.get('last_daily'), data.get('daily_streak', 0)
-            else:
-                # Give new users some starting cash
-                return 1000, None, 0
-
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "SELECT cash, last_daily, daily_streak FROM user_cash WHERE guild_id = %s AND user_id = %s",
-                    (str(guild_id), str(user_id))
-                )
-                result = cursor.fetchone()
-                if result:
-                    return result[0], result[1], result[2]
-                else:
-                    # Create new user with starting cash instead of returning 0
-                    cursor.execute(
-                        "INSERT INTO user_cash (guild_id, user_id, cash) VALUES (%s, %s, %s)",
-                        (str(guild_id), str(user_id), 1000)
-                    )
-                    connection.commit()
-                    return 1000, None, 0
-        except Exception as e:
-            logger.error(f"Error getting user cash: {e}")
-            return 0, None, 0
-        finally:
-            connection.close()
+        return await self.storage.get_user_cash(guild_id, user_id)
 
-    def _update_user_cash(self, guild_id, user_id, cash_amount, last_daily=None, daily_streak=None):
+    async def _update_user_cash(self, guild_id, user_id, cash_amount, last_daily=None, daily_streak=None):
         """Update user's cash amount and daily streak"""
-        connection = self._get_db_connection()
-        if not connection:
-            # Use in-memory storage when database isn't available
-            key = f"{guild_id}_{user_id}"
-            if key not in self.user_cash_memory:
-                self.user_cash_memory[key] = {'cash': 1000, 'last_daily': None, 'daily_streak': 0}
-
-            if last_daily is not None and daily_streak is not None:
-                # Set absolute values (for daily rewards)
-                self.user_cash_memory[key].update({
-                    'cash': cash_amount,
-                    'last_daily': last_daily,
-                    'daily_streak': daily_streak
-                })
-            else:
-                # Add to existing cash (for bets/winnings)
-                self.user_cash_memory[key]['cash'] += cash_amount
-
-            # Save backup immediately when cash is updated
-            self._save_backup_data()
-            return True
-
-        try:
-            with connection.cursor() as cursor:
-                if last_daily is not None and daily_streak is not None:
-                    cursor.execute(
-                        """INSERT INTO user_cash (guild_id, user_id, cash, last_daily, daily_streak)         VALUES (%s, %s, %s, %s, %s) 
-                           ON CONFLICT (guild_id, user_id) 
-                           DO UPDATE SET cash = %s, last_daily = %s, daily_streak = %s""",
-                        (str(guild_id), str(user_id), cash_amount, last_daily, daily_streak,
-                         cash_amount, last_daily, daily_streak)
-                    )
-                else:
-                    cursor.execute(
-                        """INSERT INTO user_cash (guild_id, user_id, cash) 
-                           VALUES (%s, %s, %s) 
-                           ON CONFLICT (guild_id, user_id) 
-                           DO UPDATE SET cash = user_cash.cash + %s""",
-                        (str(guild_id), str(user_id), cash_amount, cash_amount)
-                    )
-                connection.commit()
-                return True
-        except Exception as e:
-            logger.error(f"Error updating user cash: {e}")
-            return False
-        finally:
-            connection.close()
+        if last_daily is not None and daily_streak is not None:
+            # Set absolute values (for daily rewards)
+            return await self.storage.set_cash(guild_id, user_id, cash_amount, last_daily, daily_streak)
+        # Add to existing cash (for bets/winnings)
+        return await self.storage.add_cash(guild_id, user_id, cash_amount)
 
     def _calculate_daily_reward(self, streak):
         """Calculate daily reward based on custom schedule and month reset"""
@@ -547,123 +319,30 @@ class AntiSpamBot(commands.Bot):
                 today = datetime.strptime(today, '%Y-%m-%d').date()
             except (ValueError, TypeError):
                 today = datetime.utcnow().date()
-        
-        connection = self._get_db_connection()
-        if not connection:
-            key = f"{guild_id}_{user_id}"
-            if key not in self._daily_locks:
-                self._daily_locks[key] = asyncio.Lock()
-            
-            async with self._daily_locks[key]:
-                if key not in self.user_cash_memory:
-                    self.user_cash_memory[key] = {'cash': 1000, 'last_daily': None, 'daily_streak': 0}
-                
-                current_data = self.user_cash_memory[key]
-                last_daily = current_data.get('last_daily')
-                
-                if isinstance(last_daily, datetime):
-                    last_daily = last_daily.date()
-                elif isinstance(last_daily, str):
-                    try:
-                        last_daily = datetime.strptime(last_daily, '%Y-%m-%d').date()
-                    except (ValueError, TypeError):
-                        last_daily = None
-                
-                # Check if already claimed today
-                if last_daily == today:
-                    return None
-                
-                # Monthly reset check: if today's month/year is different from last_daily
-                new_streak = 1
-                if last_daily:
-                    if today.month == last_daily.month and today.year == last_daily.year:
-                        yesterday = today - timedelta(days=1)
-                        if last_daily == yesterday:
-                            new_streak = current_data.get('daily_streak', 0) + 1
-                        elif last_daily == today:
-                            # Already claimed today, return current data to keep streak consistent in display
-                            return (0, current_data.get('cash'), current_data.get('daily_streak'), current_data.get('daily_streak'))
-                    # If month/year is different, streak stays 1 (reset)
-                
-                reward = self._calculate_daily_reward(new_streak)
-                current_cash = current_data.get('cash', 1000)
-                new_cash = current_cash + reward
-                
-                self.user_cash_memory[key].update({
-                    'cash': new_cash,
-                    'last_daily': today,
-                    'daily_streak': new_streak
-                })
-                
-                self._save_backup_data()
-                return (reward, new_cash, new_streak, current_data.get('daily_streak', 0))
 
-        try:
-            with connection.cursor() as cursor:
-                # First, get current user data with row locking to prevent race conditions
-                cursor.execute(
-                    "SELECT cash, last_daily, daily_streak FROM user_cash WHERE guild_id = %s AND user_id = %s FOR UPDATE",
-                    (str(guild_id), str(user_id))
-                )
-                result = cursor.fetchone()
-                
-                if not result:
-                    # Create new user
-                    cursor.execute(
-                        "INSERT INTO user_cash (guild_id, user_id, cash, last_daily, daily_streak) VALUES (%s, %s, %s, %s, %s)",
-                        (str(guild_id), str(user_id), 1000, None, 0)
-                    )
-                    current_cash, last_daily, current_streak = 1000, None, 0
-                else:
-                    current_cash, last_daily, current_streak = result
-                
-                # Normalize last_daily from database
-                if isinstance(last_daily, datetime):
-                    last_daily = last_daily.date()
-                elif isinstance(last_daily, str):
-                    try:
-                        last_daily = datetime.strptime(last_daily, '%Y-%m-%d').date()
-                    except (ValueError, TypeError):
-                        last_daily = None
-                
-                # Log the comparison for debugging
-                logger.debug(f"Daily claim DB check: user {guild_id}_{user_id}, today={today} (type={type(today)}), last_daily={last_daily} (type={type(last_daily)})")
-                
-                # Check if already claimed today
-                if last_daily == today:
-                    connection.rollback()
-                    logger.info(f"User {guild_id}_{user_id} already claimed daily reward today ({today}) - DB path")
-                    return None  # Already claimed
-                
-                # Calculate streak and reward
-                yesterday = today - timedelta(days=1)
-                if last_daily == yesterday:
-                    new_streak = current_streak + 1
-                elif last_daily is None:
-                    new_streak = 1  # First daily claim = 1 day streak
-                else:
-                    new_streak = 1  # Reset streak to 1 when claiming after missing days
-                
-                reward = self._calculate_daily_reward(new_streak)
-                new_cash = current_cash + reward
-                
-                # Update user data atomically
-                cursor.execute(
-                    "UPDATE user_cash SET cash = %s, last_daily = %s, daily_streak = %s WHERE guild_id = %s AND user_id = %s",
-                    (new_cash, today, new_streak, str(guild_id), str(user_id))
-                )
-                
-                connection.commit()
-                return (reward, new_cash, new_streak, current_streak)
-                
-        except Exception as e:
-            logger.error(f"Error claiming daily reward: {e}")
-            if connection:
-                connection.rollback()
-            return False  # Database error
-        finally:
-            if connection:
-                connection.close()
+        def compute_claim(current_cash, last_daily, current_streak):
+            if isinstance(last_daily, datetime):
+                last_daily = last_daily.date()
+            elif isinstance(last_daily, str):
+                try:
+                    last_daily = datetime.strptime(last_daily, '%Y-%m-%d').date()
+                except (ValueError, TypeError):
+                    last_daily = None
+
+            # Check if already claimed today
+            if last_daily == today:
+                return None
+
+            # Monthly reset check: streak only continues from yesterday within the same month
+            new_streak = 1
+            if last_daily and today.month == last_daily.month and today.year == last_daily.year:
+                if last_daily == today - timedelta(days=1):
+                    new_streak = (current_streak or 0) + 1
+
+            reward = self._calculate_daily_reward(new_streak)
+            return reward, current_cash + reward, new_streak
+
+        return await self.storage.claim_daily(guild_id, user_id, today, compute_claim)
 
     async def _end_overunder_game(self, guild_id, game_id, instant_stop=False):
         """End the Over/Under game and distribute winnings"""
@@ -701,39 +380,12 @@ class AntiSpamBot(commands.Bot):
         game_data['result'] = result
 
         # Update database
-        try:
-            connection = self._get_db_connection()
-            if connection:
-                with connection.cursor() as cursor:
-                    cursor.execute(
-                        "UPDATE overunder_games SET result = %s, status = 'ended' WHERE game_id = %s",
-                        (result, game_id)
-                    )
-                    connection.commit()
-                connection.close()
-        except Exception as e:
-            logger.error(f"Error updating game result: {e}")
+        await self.storage.finish_game(game_id, result)
 
-        # Process winnings
-        winners = []
-        losers = []
-
-        for bet in game_data['bets']:
-            if bet['side'] == result:
-                # Winner - give back double the bet
-                winnings = bet['amount'] * 2
-                self._update_user_cash(guild_id, bet['user_id'], winnings, None, None)
-                winners.append({
-                    'username': bet['username'],
-                    'amount': bet['amount'],
-                    'winnings': winnings
-                })
-            else:
-                # Loser - they already lost their bet when placing it
-                losers.append({
-                    'username': bet['username'],
-                    'amount': bet['amount']
-                })
+        # Process winnings as one atomic batch
+        settlement = await self._settle_overunder_round(guild_id, game_id, game_data['bets'], result)
+        winners = settlement.winners
+        losers = settlement.losers
 
         # Create result embed
         embed = discord.Embed(
@@ -743,12 +395,20 @@ class AntiSpamBot(commands.Bot):
         )
 
         if winners:
-            winners_text = "\n".join([f"🏆 **{w['username']}** - Cược {w['amount']:,} → Nhận **{w['winnings']:,} cash**" for w in winners])
+            # Only claim the payout was made once the batch is actually in storage
+            paid = "Nhận" if settlement.applied else "Chờ nhận"
+            winners_text = "\n".join([f"🏆 **{w['username']}** - Cược {w['amount']:,} → {paid} **{w['winnings']:,} cash**" for w in winners])
             embed.add_field(
                 name=f"✅ Người thắng ({len(winners)})",
                 value=winners_text,
                 inline=False
             )
+            if not settlement.applied:
+                embed.add_field(
+                    name="⚠️ Chưa trả thưởng",
+                    value="Lỗi cơ sở dữ liệu: tiền thưởng chưa được cộng sau nhiều lần thử. Admin cần cộng lại thủ công (xem log).",
+                    inline=False
+                )
 
         if losers:
             losers_text = "\n".join([f"💸 **{l['username']}** - Mất {l['amount']:,} cash" for l in losers])
@@ -799,18 +459,7 @@ class AntiSpamBot(commands.Bot):
             }
 
             # Store new game in database
-            try:
-                connection = self._get_db_connection()
-                if connection:
-                    with connection.cursor() as cursor:
-                        cursor.execute(
-                            "INSERT INTO overunder_games (game_id, guild_id, channel_id) VALUES (%s, %s, %s)",
-                            (new_game_id, guild_id, game_data['channel_id'])
-                        )
-                        connection.commit()
-                    connection.close()
-            except Exception as e:
-                logger.error(f"Error storing auto-cycle game: {e}")
+            await self.storage.record_game(new_game_id, guild_id, game_data['channel_id'])
 
             # Start the background task to end the new game (this creates the continuous cycle)
             task = asyncio.create_task(self._end_overunder_game(guild_id, new_game_id))
@@ -846,11 +495,37 @@ class AntiSpamBot(commands.Bot):
         if not self.overunder_games[guild_id]:  # Remove guild if no games left
             del self.overunder_games[guild_id]
 
+    async def _settle_overunder_round(self, guild_id, game_id, bets, result):
+        """Compute every payout for a round and credit them in a single storage batch"""
+        settlement = compute_settlement(game_id, bets, result)
+        for attempt in range(SETTLEMENT_ATTEMPTS):
+            if await apply_settlement(self.storage, guild_id, settlement):
+                break
+            if attempt + 1 < SETTLEMENT_ATTEMPTS:
+                await asyncio.sleep(2 ** attempt)
+        else:
+            # Left for an admin to credit by hand; the result embed says so instead of announcing payouts
+            logger.error(f"Round {game_id} in guild {guild_id} was not paid out after {SETTLEMENT_ATTEMPTS} attempts, "
+                         f"owed: {settlement.deltas()}")
+        self.monitor.record_response_time('overunder_settlement', settlement.total_ms)
+        self.event_log.emit('settlement', guild_id=guild_id, game_id=game_id, result=result, bets=len(bets),
+                            winners=len(settlement.winners), losers=len(settlement.losers),
+                            total_bet_won=settlement.total_bet_won, total_paid=settlement.total_paid,
+                            total_lost=settlement.total_lost, applied=settlement.applied)
+        return settlement
+
     async def setup_hook(self):
         """Called when the bot is starting up"""
         logger.info("Bot is starting up...")
+        # Load cash data / open the database pool before any command can run
+        await self.storage.start()
         # Start monitoring
         self.monitor.start_monitoring()
+        # Moderation actions run from a background queue
+        self.moderation.start()
+        # Keep per-user spam tracking bounded
+        if self.state_sweep_task is None or self.state_sweep_task.done():
+            self.state_sweep_task = asyncio.create_task(self._state_sweep_loop())
 
     async def on_ready(self):
         """Called when the bot is ready"""
@@ -862,7 +537,7 @@ class AntiSpamBot(commands.Bot):
             # Add a delay before starting the backup loop to ensure system is fully ready
             await asyncio.sleep(2)  # Wait 2 seconds before starting backup loop
             self.backup_task = asyncio.create_task(self._backup_data_loop())
-            logger.info("Started backup data loop - saving user data every 5 seconds")
+            logger.info("Started backup data loop - syncing cash ledger every second")
 
         # Set bot status
         await self.change_presence(
@@ -895,13 +570,32 @@ class AntiSpamBot(commands.Bot):
         # Record member join event
         self.monitor.record_member_event('join', guild_id, str(member.id))
 
-        # Run bot detection
-        is_suspicious = await self.bot_detector.analyze_member(member)
+        # Run bot detection; joins are collected briefly so a flood is scored in one batch
+        self.pending_joins.append(member)
+        if self.join_batch_task is None or self.join_batch_task.done():
+            self.join_batch_task = asyncio.create_task(self._process_join_batches())
+
+    async def _process_join_batches(self):
+        """Score pending joins in batches until none are left"""
+        while self.pending_joins:
+            await asyncio.sleep(JOIN_BATCH_WINDOW)
+            members, self.pending_joins = self.pending_joins, []
+            try:
+                verdicts = await self.bot_detector.analyze_members(members)
+            except Exception as e:
+                logger.error(f"Error in batch bot detection for {len(members)} members: {e}")
+                continue
 
-        if is_suspicious:
-            await self._handle_suspicious_member(member)
-        elif config['verification']['enabled']:
-            await self._start_verification(member)
+            for member, is_suspicious in zip(members, verdicts):
+                if self._in_raid_cluster(member):
+                    continue
+                try:
+                    if is_suspicious:
+                        await self._handle_suspicious_member(member)
+                    elif self.config_manager.get_guild_policy(str(member.guild.id)).verification_enabled:
+                        await self._start_verification(member)
+                except Exception as e:
+                    logger.error(f"Error handling join of {member} ({member.id}): {e}")
 
     async def on_message(self, message):
         """Handle message events for spam detection and verification"""
@@ -919,13 +613,13 @@ class AntiSpamBot(commands.Bot):
             await self.process_commands(message)
             return
 
-        config = self.config_manager.get_guild_config(guild_id)
-        if not config['enabled']:
+        if not self.config_manager.get_guild_policy(guild_id).enabled:
             await self.process_commands(message)
             return
 
         # Check for trivia game answers
-        await self._check_trivia_answer(message)
+        if guild_id in self.active_games:
+            await self._check_trivia_answer(message)
 
         # Check for spam
         is_spam = await self.spam_detector.check_message(message)
@@ -940,8 +634,19 @@ class AntiSpamBot(commands.Bot):
         """Handle member leaving the server"""
         guild_id = str(member.guild.id)
         self.monitor.record_member_event('leave', guild_id, str(member.id))
+        self.spam_detector.clear_user_data(member.id, guild_id)
         logger.info(f"Member left {member.guild.name}: {member} ({member.id})")
 
+    async def on_guild_role_delete(self, role):
+        """Drop the cached quarantine role when it is deleted"""
+        self.moderation.invalidate_quarantine_role(role)
+
+    async def on_guild_role_update(self, before, after):
+        """Drop the cached quarantine role when it (or another role) is renamed to/from the quarantine name"""
+        if before.name != after.name:
+            self.moderation.invalidate_quarantine_role(before)
+            self.moderation.invalidate_quarantine_role(after)
+
     async def _check_trivia_answer(self, message):
         """Check if message is a QNA game answer"""
         guild_id = str(message.guild.id)
@@ -1080,17 +785,18 @@ class AntiSpamBot(commands.Bot):
                 color=0x00ff88
             )
 
-            for i, (user_id, score) in enumerate(sorted_players[:5]):
-                try:
-                    user = await self.fetch_user(int(user_id))
-                    rank_emoji = ["🥇", "🥈", "🥉"][i] if i < 3 else f"{i+1}."
-                    embed.add_field(
-                        name=f"{rank_emoji} {user.display_name}",
-                        value=f"🎯 {score} điểm",
-                        inline=True
-                    )
-                except:
+            top_players = sorted_players[:5]
+            names = await self.user_resolver.resolve_names(message.guild, [user_id for user_id, _ in top_players])
+
+            for i, (user_id, score) in enumerate(top_players):
+                if user_id not in names:
                     continue
+                rank_emoji = ["🥇", "🥈", "🥉"][i] if i < 3 else f"{i+1}."
+                embed.add_field(
+                    name=f"{rank_emoji} {names[user_id]}",
+                    value=f"🎯 {score} điểm",
+                    inline=True
+                )
 
             embed.set_footer(text="Trò chơi tuyệt vời! Dùng ?leaderboard để xem điểm tổng")
             await message.channel.send(embed=embed)
@@ -1177,7 +883,7 @@ class AntiSpamBot(commands.Bot):
                 # Track that this question was shown in memory and database (skip for placeholders)
                 if not current_question.get('is_placeholder', False):
                     game['shown_questions'].add(current_question['question'])
-                    self._mark_question_shown(guild_id, current_question['question'])
+                    await self._mark_question_shown(guild_id, current_question['question'])
                     if current_question in game['questions']:
                         game['questions'].remove(current_question)
 
@@ -1351,7 +1057,7 @@ class AntiSpamBot(commands.Bot):
 
                     # Batch database operations for better performance
                     if questions_added:
-                        self._batch_mark_questions_shown(guild_id, questions_added)
+                        await self._batch_mark_questions_shown(guild_id, questions_added)
 
                     game['last_generation_time'] = datetime.utcnow()
 
@@ -1367,39 +1073,58 @@ class AntiSpamBot(commands.Bot):
                 break
 
     async def _check_raid_protection(self, member):
-        """Check for mass join attacks"""
+        """Check for mass join attacks and waves of look-alike accounts"""
         guild_id = str(member.guild.id)
-        config = self.config_manager.get_guild_config(guild_id)
+        policy = self.config_manager.get_guild_policy(guild_id)
 
-        if not config['raid_protection']['enabled']:
+        if not policy.raid_protection_enabled:
             return
 
-        now = datetime.utcnow()
-        if guild_id not in self.recent_joins:
-            self.recent_joins[guild_id] = []
+        detector = self.join_waves.get(guild_id)
+        settings = (policy.raid_max_joins, policy.raid_time_window, policy.raid_cluster_size, policy.raid_creation_spread)
+        if detector is None or detector.settings != settings:
+            detector = self.join_waves[guild_id] = JoinWaveDetector(*settings)
 
-        # Clean old joins
-        cutoff = now - timedelta(seconds=config['raid_protection']['time_window'])
-        self.recent_joins[guild_id] = [
-            join_time for join_time in self.recent_joins[guild_id]
-            if join_time > cutoff
-        ]
-
-        # Add current join
-        self.recent_joins[guild_id].append(now)
+        created_at = member.created_at.timestamp() if member.created_at else None
+        wave = detector.add(member.id, created_at, member.name, member.avatar.key if member.avatar else None)
+        if wave is None:
+            return
 
-        # Check if threshold exceeded
-        if len(self.recent_joins[guild_id]) >= config['raid_protection']['max_joins']:
+        if wave.volume or wave.new_cluster:
             # Record raid detection
-            self.monitor.record_detection('raid', guild_id, {'joins_count': len(self.recent_joins[guild_id])})
-            await self._handle_raid_detected(member.guild)
+            self.monitor.record_detection('raid', guild_id, {
+                'joins_count': len(detector),
+                'cluster': wave.cluster,
+                'cluster_size': len(wave.member_ids)
+            })
+            self.event_log.emit('detection', guild_id=member.guild.id, kind='raid', joins=len(detector),
+                                cluster=wave.cluster, cluster_size=len(wave.member_ids))
+            # A look-alike cluster is handled through its members; only a join flood locks the guild down
+            await self._handle_raid_detected(member.guild, wave.cluster, lockdown=wave.volume)
+
+        # Act on the clustered accounts together; batch bot detection skips them
+        if not policy.bot_detection_enabled:
+            return
+        for member_id in wave.member_ids:
+            target = member.guild.get_member(member_id)
+            if target is None or policy.is_whitelisted(target):
+                continue
+            try:
+                await self._handle_suspicious_member(target)
+            except Exception as e:
+                logger.error(f"Error acting on raid cluster member {member_id}: {e}")
+
+    def _in_raid_cluster(self, member) -> bool:
+        """Whether a member was already handled as part of a join-wave cluster"""
+        detector = self.join_waves.get(str(member.guild.id))
+        return detector is not None and detector.is_flagged(member.id)
 
-    async def _handle_raid_detected(self, guild):
-        """Handle detected raid"""
-        logger.warning(f"Raid detected in {guild.name}")
+    async def _handle_raid_detected(self, guild, cluster=None, lockdown=True):
+        """Handle detected raid; lockdown=False only alerts, whatever the configured action"""
+        logger.warning(f"Raid detected in {guild.name}" + (f": {cluster}" if cluster else ""))
 
-        config = self.config_manager.get_guild_config(str(guild.id))
-        action = config['raid_protection']['action']
+        config = self.config_manager.get_guild_config_copy(str(guild.id))
+        action = config['raid_protection']['action'] if lockdown else 'alert'
 
         if action == 'lockdown':
             # Enable verification for all new members temporarily
@@ -1407,7 +1132,10 @@ class AntiSpamBot(commands.Bot):
             self.config_manager.save_guild_config(str(guild.id), config)
 
         # Log the event
-        await self._log_action(guild, "Raid Protection", f"Raid detected - {action} activated")
+        details = f"Raid detected - {action} activated"
+        if cluster:
+            details += f"\nJoin wave: {cluster}"
+        self._log_action(guild, "Raid Protection", details, priority=PRIORITY_HIGH)
 
     async def _handle_suspicious_member(self, member):
         """Handle members flagged as suspicious"""
@@ -1419,21 +1147,21 @@ class AntiSpamBot(commands.Bot):
 
         # Record detection event
         self.monitor.record_detection('bot', guild_id, {'member_id': str(member.id), 'member_name': str(member)})
+        self.event_log.emit('detection', guild_id=member.guild.id, kind='bot', user_id=member.id)
 
-        if action == 'kick':
-            await self.moderation.kick_member(member, "Suspicious bot-like behavior")
-            self.monitor.record_action('kick', guild_id, str(member), "Suspicious bot-like behavior")
-        elif action == 'ban':
-            await self.moderation.ban_member(member, "Suspicious bot-like behavior")
-            self.monitor.record_action('ban', guild_id, str(member), "Suspicious bot-like behavior")
-        elif action == 'quarantine':
-            await self.moderation.quarantine_member(member)
-            self.monitor.record_action('quarantine', guild_id, str(member), "Suspicious bot-like behavior")
+        # Queued: the handler returns at once and repeated flags for the same member are dropped
+        if action in ('kick', 'ban', 'quarantine'):
+            if self.moderation.enqueue(action, member, "Suspicious bot-like behavior"):
+                self.monitor.record_action(action, guild_id, str(member), "Suspicious bot-like behavior")
 
-        await self._log_action(
+        self._log_action(
             member.guild,
             "Bot Detection",
-            f"Suspicious member {member} - Action: {action}"
+            f"Suspicious member {member} - Action: {action}",
+            priority=PRIORITY_LOW,
+            collapse=("Bot Detection", action),
+            summary=f"{{count}} suspicious members - Action: {action}",
+            subject=str(member)
         )
 
     async def _start_verification(self, member):
@@ -1499,33 +1227,69 @@ class AntiSpamBot(commands.Bot):
 
         # Record spam detection
         self.monitor.record_detection('spam', str(message.guild.id), {'user_id': str(message.author.id), 'content': message.content[:100]})
+        self.event_log.emit('detection', guild_id=message.guild.id, kind='spam', user_id=message.author.id)
+
+        # Accounts that posted the same content earlier in a coordinated wave. Taken
+        # before anything can fail so the entry never outlives this message
+        others = self.spam_detector.take_coordinated_members(message)
 
         # Delete the message
         try:
             await message.delete()
         except discord.NotFound:
             pass
+        except discord.HTTPException as e:
+            logger.warning(f"Could not delete spam message from {message.author}: {e}")
 
         # Apply action to user
         config = self.config_manager.get_guild_config(str(message.guild.id))
         action = config['spam_detection']['action']
+        await self._apply_spam_action(message.guild, message.author, action)
 
-        if action == 'timeout':
-            await self.moderation.timeout_member(message.author, duration=300)  # 5 minutes
-            self.monitor.record_action('timeout', str(message.guild.id), str(message.author), "Spamming")
-        elif action == 'kick':
-            await self.moderation.kick_member(message.author, "Spamming")
-            self.monitor.record_action('kick', str(message.guild.id), str(message.author), "Spamming")
-        elif action == 'ban':
-            await self.moderation.ban_member(message.author, "Spamming")
-            self.monitor.record_action('ban', str(message.guild.id), str(message.author), "Spamming")
-
-        await self._log_action(
+        for user_id, channel_id, message_id in others:
+            await self._handle_coordinated_member(message.guild, user_id, channel_id, message_id, action)
+
+        details = f" (coordinated with {len(others)} other account(s))" if others else ""
+        self._log_action(
             message.guild,
             "Spam Detection",
-            f"Spam from {message.author} - Action: {action}"
+            f"Spam from {message.author} - Action: {action}{details}",
+            priority=PRIORITY_LOW,
+            collapse=("Spam Detection", action),
+            summary=f"{{count}} spam detections - Action: {action}",
+            subject=f"{message.author}{details}"
         )
 
+    async def _apply_spam_action(self, guild, member, action):
+        """Queue the configured spam action against a member"""
+        if action == 'timeout':
+            accepted = self.moderation.enqueue('timeout', member, duration=300)  # 5 minutes
+        elif action in ('kick', 'ban'):
+            accepted = self.moderation.enqueue(action, member, "Spamming")
+        else:
+            return
+        if accepted:
+            self.monitor.record_action(action, str(guild.id), str(member), "Spamming")
+
+    async def _handle_coordinated_member(self, guild, user_id, channel_id, message_id, action):
+        """Delete an earlier message from a coordinated spam wave and act on its author"""
+        channel = guild.get_channel(channel_id)
+        if channel is not None:
+            try:
+                await channel.get_partial_message(message_id).delete()
+            except discord.NotFound:
+                pass
+            except discord.HTTPException as e:
+                logger.warning(f"Could not delete coordinated spam message {message_id}: {e}")
+
+        member = guild.get_member(user_id)
+        policy = self.config_manager.get_guild_policy(str(guild.id))
+        if member is None or policy.is_whitelisted(member):
+            return
+        self.monitor.record_detection('spam', str(guild.id), {'user_id': str(user_id), 'coordinated': True})
+        self.event_log.emit('detection', guild_id=guild.id, kind='spam', user_id=user_id, coordinated=True)
+        await self._apply_spam_action(guild, member, action)
+
     async def _handle_verification_response(self, message):
         """Handle verification responses in DMs"""
         user_id = message.author.id
@@ -1563,14 +1327,19 @@ class AntiSpamBot(commands.Bot):
                     await message.channel.send(embed=success_embed)
 
                     # Log successful verification
-                    await self._log_action(
+                    self._log_action(
                         member.guild,
                         "Verification",
-                        f"✅ {member} successfully completed captcha verification"
+                        f"✅ {member} successfully completed captcha verification",
+                        priority=PRIORITY_LOW,
+                        collapse=("Verification", True),
+                        summary="✅ {count} members completed captcha verification",
+                        subject=str(member)
                     )
 
                     # Record successful verification
                     self.monitor.record_verification(str(member.guild.id), True, str(member.id))
+                    self.event_log.emit('verification', guild_id=member.guild.id, user_id=member.id, success=True)
                     logger.info(f"User {member} successfully verified")
             else:
                 # Wrong answer
@@ -1591,13 +1360,17 @@ class AntiSpamBot(commands.Bot):
                     for guild in self.guilds:
                         member = guild.get_member(user_id)
                         if member:
-                            await self.moderation.kick_member(member, "Failed captcha verification (3 attempts)")
+                            self.moderation.enqueue('kick', member, "Failed captcha verification (3 attempts)")
                             # Record failed verification
                             self.monitor.record_verification(str(guild.id), False, str(member.id))
-                            await self._log_action(
+                            self.event_log.emit('verification', guild_id=guild.id, user_id=member.id, success=False)
+                            self._log_action(
                                 guild,
                                 "Verification",
-                                f"❌ {member} failed captcha verification (3 attempts)"
+                                f"❌ {member} failed captcha verification (3 attempts)",
+                                collapse=("Verification", False),
+                                summary="❌ {count} members failed captcha verification (3 attempts)",
+                                subject=str(member)
                             )
                             break
                 else:
@@ -1633,52 +1406,51 @@ class AntiSpamBot(commands.Bot):
                     color=0xff4444
                 )
                 await dm_channel.send(embed=fail_embed)
-                await self.moderation.kick_member(member, "Failed to complete verification within time limit")
+                self.moderation.enqueue('kick', member, "Failed to complete verification within time limit")
             except Exception as e:
                 logger.error(f"Error handling verification timeout: {e}")
 
-    async def _log_action(self, guild, action_type, description):
-        """Log moderation actions"""
-        guild_id = str(guild.id)
-        config = self.config_manager.get_guild_config(guild_id)
-
-        if not config['logging']['enabled']:
-            return
+    def _get_log_target(self, guild):
+        """Log channel, batch window and backlog cap for a guild, or None when logging is off"""
+        policy = self.config_manager.get_guild_policy(str(guild.id))
+        if not policy.logging_enabled or not policy.log_channel_id:
+            return None
+        log_channel = guild.get_channel(policy.log_channel_id)
+        if log_channel is None:
+            return None
+        return log_channel, policy.log_batch_window, policy.log_max_backlog
+
+    def _log_action(self, guild, action_type, description, priority=PRIORITY_NORMAL, collapse=None, summary=None,
+                    subject=None):
+        """Log a security event to the guild's log channel (batched by the log sink)"""
+        action_colors = {
+            "Bot Detection": 0xff6b6b,
+            "Spam Detection": 0xffa726,
+            "Raid Protection": 0xff5722,
+            "Verification": 0x5865f2
+        }
+        action_icons = {
+            "Bot Detection": "🤖",
+            "Spam Detection": "🚫",
+            "Raid Protection": "⚡",
+            "Verification": "🔐"
+        }
 
-        log_channel_id = config['logging']['channel_id']
-        if not log_channel_id:
-            return
+        color = action_colors.get(action_type, 0xff9500)
+        if action_type == "Verification":
+            color = 0x00ff88 if "✅" in description else 0xff4444
 
         try:
-            log_channel = guild.get_channel(int(log_channel_id))
-            if log_channel:
-                action_colors = {
-                    "Bot Detection": 0xff6b6b,
-                    "Spam Detection": 0xffa726,
-                    "Raid Protection": 0xff5722,
-                    "Verification": 0x5865f2
-                }
-                action_icons = {
-                    "Bot Detection": "🤖",
-                    "Spam Detection": "🚫",
-                    "Raid Protection": "⚡",
-                    "Verification": "🔐"
-                }
-
-                embed = discord.Embed(
-                    title=f"{action_icons.get(action_type, '🛡️')} {action_type}",
-                    description=f"**Security Alert**\n{description}",
-                    color=action_colors.get(action_type, 0xff9500),
-                    timestamp=datetime.utcnow()
-                )
-                embed.set_footer(text="AntiBot Protection System", icon_url=guild.me.display_avatar.url if guild.me else None)
-
-                # Add verification to action colors/icons
-                if action_type == "Verification":
-                    embed.color = 0x00ff88 if "✅" in description else 0xff4444
-                    embed.title = f"🔐 {action_type}"
-
-                await log_channel.send(embed=embed)
+            self.log_sink.post(
+                guild,
+                f"{action_icons.get(action_type, '🛡️')} {action_type}",
+                f"**Security Alert**\n{description}",
+                color,
+                priority=priority,
+                collapse=collapse,
+                summary=summary,
+                subject=subject
+            )
         except Exception as e:
             logger.error(f"Failed to log action: {e}")
 
@@ -1755,7 +1527,7 @@ async def main():
     @antispam.command(name='enable')
     async def enable_bot(ctx):
         """Enable anti-spam protection"""
-        config = bot.config_manager.get_guild_config(str(ctx.guild.id))
+        config = bot.config_manager.get_guild_config_copy(str(ctx.guild.id))
         config['enabled'] = True
         bot.config_manager.save_guild_config(str(ctx.guild.id), config)
 
@@ -1769,7 +1541,7 @@ async def main():
     @antispam.command(name='disable')
     async def disable_bot(ctx):
         """Disable anti-spam protection"""
-        config = bot.config_manager.get_guild_config(str(ctx.guild.id))
+        config = bot.config_manager.get_guild_config_copy(str(ctx.guild.id))
         config['enabled'] = False
         bot.config_manager.save_guild_config(str(ctx.guild.id), config)
 
@@ -1786,7 +1558,7 @@ async def main():
         if channel is None:
             channel = ctx.channel
 
-        config = bot.config_manager.get_guild_config(str(ctx.guild.id))
+        config = bot.config_manager.get_guild_config_copy(str(ctx.guild.id))
         config['logging']['channel_id'] = str(channel.id) if channel else None
         config['logging']['enabled'] = True
         bot.config_manager.save_guild_config(str(ctx.guild.id), config)
@@ -1815,7 +1587,7 @@ async def main():
     @antispam.command(name='verification')
     async def toggle_verification(ctx, enabled: Optional[bool] = None):
         """Enable or disable captcha verification for new members"""
-        config = bot.config_manager.get_guild_config(str(ctx.guild.id))
+        config = bot.config_manager.get_guild_config_copy(str(ctx.guild.id))
 
         if enabled is None:
             # Show current status
@@ -2155,86 +1927,6 @@ async def main():
         """Test if bot is online"""
         await ctx.send("Tôi ở đây:)")
 
-    # === CASH SYSTEM HELPER METHODS ===
-    def _get_user_cash(self, guild_id, user_id):
-        """Get user's cash amount and daily streak info"""
-        connection = self._get_db_connection()
-        if not connection:
-            # Use in-memory storage when database isn't available
-            key = f"{guild_id}_{user_id}"
-            if key in self.user_cash_memory:
-                data = self.user_cash_memory[key]
-                return data.get('cash', 1000), data.get('last_daily'), data.get('daily_streak', 0)
-            else:
-                # Give new users some starting cash
-                return 1000, None, 0
-
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "SELECT cash, last_daily, daily_streak FROM user_cash WHERE guild_id = %s AND user_id = %s",
-                    (str(guild_id), str(user_id))
-                )
-                result = cursor.fetchone()
-                if result:
-                    return result[0], result[1], result[2]
-                else:
-                    # Create new user with starting cash instead of returning 0
-                    cursor.execute(
-                        "INSERT INTO user_cash (guild_id, user_id, cash) VALUES (%s, %s, %s)",
-                        (str(guild_id), str(user_id), 1000)
-                    )
-                    connection.commit()
-                    return 1000, None, 0
-        except Exception as e:
-            logger.error(f"Error getting user cash: {e}")
-            return 0, None, 0
-        finally:
-            connection.close()
-
-    def _update_user_cash(self, guild_id, user_id, cash_amount, last_daily=None, daily_streak=None):
-        """Update user's cash amount and daily streak"""
-        if not self.db_connection:
-            return False
-
-        try:
-            with self.db_connection.cursor() as cursor:
-                if last_daily is not None and daily_streak is not None:
-                    cursor.execute(
-                        """INSERT INTO user_cash (guild_id, user_id, cash, last_daily, daily_streak) 
-                           VALUES (%s, %s, %s, %s, %s) 
-                           ON CONFLICT (guild_id, user_id) 
-                           DO UPDATE SET cash = %s, last_daily = %s, daily_streak = %s""",
-                        (str(guild_id), str(user_id), cash_amount, last_daily, daily_streak,
-                         cash_amount, last_daily, daily_streak)
-                    )
-                else:
-                    cursor.execute(
-                        """INSERT INTO user_cash (guild_id, user_id, cash) 
-                           VALUES (%s, %s, %s) 
-                           ON CONFLICT (guild_id, user_id) 
-                           DO UPDATE SET cash = user_cash.cash + %s""",
-                        (str(guild_id), str(user_id), cash_amount, cash_amount)
-                    )
-                self.db_connection.commit()
-                return True
-        except Exception as e:
-            logger.error(f"Error updating user cash: {e}")
-            return False
-
-    def _calculate_daily_reward(self, streak):
-        """Calculate daily reward based on streak (streak=1 is first day)"""
-        base_reward = 1000
-        if streak <= 1:
-            return base_reward  # First day = 1000 cash
-        elif streak == 2:
-            return 1200  # Second consecutive day
-        elif streak == 3:
-            return 1500  # Third consecutive day
-        else:
-            # Continue increasing by 400 per day after day 3
-            return 1500 + (400 * (streak - 3))
-
     # === CASH SYSTEM COMMANDS ===
     @bot.command(name='money')
     async def show_money(ctx):
@@ -2242,7 +1934,7 @@ async def main():
         guild_id = str(ctx.guild.id)
         user_id = str(ctx.author.id)
 
-        current_cash, last_daily, streak = bot._get_user_cash(guild_id, user_id)
+        current_cash, last_daily, streak = await bot._get_user_cash(guild_id, user_id)
 
         embed = discord.Embed(
             title="💰 Thông tin tài khoản",
@@ -2265,6 +1957,13 @@ async def main():
                 value=f"**{last_daily}**",
                 inline=True
             )
+        rank = await bot.storage.get_user_rank(guild_id, user_id)
+        if rank:
+            embed.add_field(
+                name="🏆 Xếp hạng",
+                value=f"**#{rank}**",
+                inline=True
+            )
         embed.set_footer(text="Sử dụng ?daily để check-in và nhận thưởng hàng ngày! 🎁")
         await ctx.send(embed=embed)
 
@@ -2280,7 +1979,7 @@ async def main():
         
         # Check if already claimed today
         if result is None:
-            current_cash, last_daily, streak = bot._get_user_cash(guild_id, user_id)
+            current_cash, last_daily, streak = await bot._get_user_cash(guild_id, user_id)
             embed = discord.Embed(
                 title="⏰ Hôm nay đã check-in rồi!",
                 description=f"Bạn đã hoàn thành check-in hàng ngày rồi!\n\n💎 **Tài sản hiện tại:** {current_cash:,} VND\n🔥 **Chuỗi ngày:** {streak} ngày",
@@ -2351,36 +2050,9 @@ async def main():
         guild_id = str(ctx.guild.id)
 
         try:
-            # Try database first, fall back to memory if database unavailable
-            connection = bot._get_db_connection()
-            users_data = []
-
-            if connection:
-                # Use database data
-                with connection.cursor() as cursor:
-                    cursor.execute(
-                        """SELECT user_id, cash, daily_streak 
-                           FROM user_cash 
-                           WHERE guild_id = %s AND cash > 0 
-                           ORDER BY cash DESC""",
-                        (guild_id,)
-                    )
-                    results = cursor.fetchall()
-                    users_data = [(user_id, cash, streak) for user_id, cash, streak in results]
-                connection.close()
-            else:
-                # Use in-memory data when database is unavailable
-                for key, data in bot.user_cash_memory.items():
-                    if key.startswith(f"{guild_id}_") and data.get('cash', 0) > 0:
-                        user_id = key.split('_', 1)[1]  # Extract user_id from "guild_id_user_id"
-                        cash = data.get('cash', 0)
-                        streak = data.get('daily_streak', 0)
-                        users_data.append((user_id, cash, streak))
-
-                # Sort by cash (descending)
-                users_data.sort(key=lambda x: x[1], reverse=True)
-
-            total_users = len(users_data)
+            # Only the requested page is read from the backend's ranking
+            per_page = 10
+            page_data, total_users = await bot.storage.get_leaderboard_page(guild_id, page, per_page)
 
             if total_users == 0:
                 embed = discord.Embed(
@@ -2392,7 +2064,6 @@ async def main():
                 return
 
             # Calculate pagination
-            per_page = 10
             total_pages = (total_users + per_page - 1) // per_page
 
             if page < 1 or page > total_pages:
@@ -2404,10 +2075,7 @@ async def main():
                 await ctx.send(embed=embed)
                 return
 
-            # Get data for this page
             start_idx = (page - 1) * per_page
-            end_idx = start_idx + per_page
-            page_data = users_data[start_idx:end_idx]
 
             embed = discord.Embed(
                 title="🏆 Bảng xếp hạng Cash",
@@ -2415,28 +2083,29 @@ async def main():
                 color=0xffd700
             )
 
-            for i, (user_id, cash, streak) in enumerate(page_data):
-                try:
-                    user = await bot.fetch_user(int(user_id))
-                    rank = start_idx + i + 1
-
-                    if rank == 1:
-                        rank_emoji = "🥇"
-                    elif rank == 2:
-                        rank_emoji = "🥈" 
-                    elif rank == 3:
-                        rank_emoji = "🥉"
-                    else:
-                        rank_emoji = f"{rank}."
+            # Resolve the whole page at once; at most one concurrent REST batch for misses
+            names = await bot.user_resolver.resolve_names(ctx.guild, [user_id for user_id, _, _ in page_data])
 
-                    embed.add_field(
-                        name=f"{rank_emoji} {user.display_name}",
-                        value=f"💰 **{cash:,} cash**\n🔥 {streak} ngày streak",
-                        inline=True
-                    )
-                except:
+            for i, (user_id, cash, streak) in enumerate(page_data):
+                if user_id not in names:
                     # Skip if user can't be fetched
                     continue
+                rank = start_idx + i + 1
+
+                if rank == 1:
+                    rank_emoji = "🥇"
+                elif rank == 2:
+                    rank_emoji = "🥈" 
+                elif rank == 3:
+                    rank_emoji = "🥉"
+                else:
+                    rank_emoji = f"{rank}."
+
+                embed.add_field(
+                    name=f"{rank_emoji} {names[user_id]}",
+                    value=f"💰 **{cash:,} cash**\n🔥 {streak} ngày streak",
+                    inline=True
+                )
 
             if total_pages > 1:
                 embed.set_footer(text=f"Dùng ?cashboard <số trang> để xem trang khác • Trang {page}/{total_pages}")
@@ -2444,7 +2113,7 @@ async def main():
                 embed.set_footer(text="Dùng ?daily để kiếm cash!")
 
             # Add note about data source
-            if not connection:
+            if bot.storage.backend_name != 'postgres':
                 embed.add_field(
                     name="ℹ️ Thông tin",
                     value="Dữ liệu từ bộ nhớ tạm (database không khả dụng)",
@@ -2498,18 +2167,7 @@ async def main():
         }
 
         # Store in database
-        try:
-            connection = bot._get_db_connection()
-            if connection:
-                with connection.cursor() as cursor:
-                    cursor.execute(
-                        "INSERT INTO overunder_games (game_id, guild_id, channel_id) VALUES (%s, %s, %s)",
-                        (game_id, guild_id, channel_id)
-                    )
-                    connection.commit()
-                connection.close()
-        except Exception as e:
-            logger.error(f"Error storing game in database: {e}")
+        await bot.storage.record_game(game_id, guild_id, channel_id)
 
         embed = discord.Embed(
             title="🎲 Game Đoán Số Bắt Đầu!",
@@ -2625,7 +2283,7 @@ async def main():
 
         # Handle 'all' - get user's current cash and bet all of it
         if bet_amount == -1:
-            current_cash, _, _ = bot._get_user_cash(guild_id, user_id)
+            current_cash, _, _ = await bot._get_user_cash(guild_id, user_id)
             if current_cash <= 0:
                 embed = discord.Embed(
                     title="💸 Tài sản không đủ!",
@@ -2665,32 +2323,55 @@ async def main():
             await ctx.send(embed=embed)
             return
 
-        # Check user's cash
-        current_cash, _, _ = bot._get_user_cash(guild_id, user_id)
-        if current_cash < bet_amount:
+        # Check if user already has a bet in this game (or one being placed)
+        pending_bettors = game_data.setdefault('pending_bettors', set())
+        for bet in game_data['bets']:
+            if bet['user_id'] == user_id:
+                embed = discord.Embed(
+                    title="⚠️ Bạn đã tham gia rồi!",
+                    description=f"Bạn đã đặt cược **{bet['amount']:,} VND** vào **{bet['side'].upper()}** cho game này rồi.",
+                    color=0xffa500
+                )
+                await ctx.send(embed=embed)
+                return
+        if user_id in pending_bettors:
             embed = discord.Embed(
-                title="💸 Tài sản không đủ!",
-                description=f"Tài sản của bạn: **{current_cash:,} VND**\nSố tiền muốn cược: **{bet_amount:,} VND**\n\nSử dụng `?daily` để check-in và nhận thưởng!",
-                color=0xff4444
+                title="⚠️ Bạn đã tham gia rồi!",
+                description="Cược của bạn cho game này đang được xử lý.",
+                color=0xffa500
             )
             await ctx.send(embed=embed)
             return
 
-        # Check if user already has a bet in this game
-        for bet in game_data['bets']:
-            if bet['user_id'] == user_id:
+        # Reserve the slot before the first await so a second command cannot also bet
+        pending_bettors.add(user_id)
+        try:
+            # Deduct cash only if the balance covers it, in one storage operation
+            remaining_cash = await bot.storage.spend_cash(guild_id, user_id, bet_amount)
+            if remaining_cash is not False and remaining_cash is not None and game_data['status'] != 'active':
+                # The round closed while the deduction was in flight
+                await bot._update_user_cash(guild_id, user_id, bet_amount)
                 embed = discord.Embed(
-                    title="⚠️ Bạn đã tham gia rồi!",
-                    description=f"Bạn đã đặt cược **{bet['amount']:,} VND** vào **{bet['side'].upper()}** cho game này rồi.",
+                    title="⏰ Vòng cược đã kết thúc!",
+                    description="Hết thời gian đặt cược rồi. Tiền cược đã được hoàn lại.",
                     color=0xffa500
                 )
                 await ctx.send(embed=embed)
                 return
+        finally:
+            pending_bettors.discard(user_id)
 
-        # Deduct cash from user
-        success = bot._update_user_cash(guild_id, user_id, -bet_amount, None, None)
+        if remaining_cash is None:
+            current_cash, _, _ = await bot._get_user_cash(guild_id, user_id)
+            embed = discord.Embed(
+                title="💸 Tài sản không đủ!",
+                description=f"Tài sản của bạn: **{current_cash:,} VND**\nSố tiền muốn cược: **{bet_amount:,} VND**\n\nSử dụng `?daily` để check-in và nhận thưởng!",
+                color=0xff4444
+            )
+            await ctx.send(embed=embed)
+            return
 
-        if not success:
+        if remaining_cash is False:
             embed = discord.Embed(
                 title="❌ Xảy ra lỗi!",
                 description="Không thể xử lý giao dịch cược của bạn. Vui lòng thử lại sau ít giây.",
@@ -2699,9 +2380,6 @@ async def main():
             await ctx.send(embed=embed)
             return
 
-        # Calculate remaining cash
-        remaining_cash = current_cash - bet_amount
-
         # Add bet to game
         bet_data = {
             'user_id': user_id,
@@ -2710,6 +2388,7 @@ async def main():
             'amount': bet_amount
         }
         game_data['bets'].append(bet_data)
+        bot.event_log.emit('bet', guild_id=guild_id, game_id=game_id, user_id=user_id, side=side, amount=bet_amount)
 
         # Note: Bets are stored in memory during the game
         # Final results are saved to database when game ends
@@ -2839,7 +2518,7 @@ async def main():
     async def reset_questions(ctx):
         """Reset question history for the server (Admin only)"""
         guild_id = str(ctx.guild.id)
-        bot._reset_question_history(guild_id)
+        await bot._reset_question_history(guild_id)
 
         embed = discord.Embed(
             title="🔄 Lịch sử câu hỏi đã được reset",
@@ -2882,14 +2561,11 @@ async def main():
             await ctx.send(embed=embed)
             return
 
-        # Get current cash
-        current_cash, last_daily, streak = bot._get_user_cash(guild_id, user_id)
-        new_cash = current_cash + amount
-
-        # Update user's cash
-        success = bot._update_user_cash(guild_id, user_id, new_cash, last_daily, streak)
+        # Relative update, so a concurrent bet or transfer is not overwritten
+        success = await bot._update_user_cash(guild_id, user_id, amount)
 
         if success:
+            new_cash, _, _ = await bot._get_user_cash(guild_id, user_id)
             embed = discord.Embed(
                 title="💰 Money Hack Thành Công!",
                 description=f"**Admin {ctx.author.mention}** đã tặng tiền cho **{user.mention}**",
@@ -2998,7 +2674,7 @@ async def main():
             return
 
         # Get giver's current cash
-        giver_cash, giver_daily, giver_streak = bot._get_user_cash(guild_id, giver_id)
+        giver_cash, _, _ = await bot._get_user_cash(guild_id, giver_id)
 
         # Handle 'all' - give all of giver's money
         if give_amount == -1:
@@ -3012,8 +2688,12 @@ async def main():
                 return
             give_amount = giver_cash
 
+        # Move the money in one storage transaction; it fails if the giver's balance no longer covers it
+        transfer = await bot.storage.transfer_cash(guild_id, giver_id, receiver_id, give_amount)
+
         # Check if giver has enough money
-        if giver_cash < give_amount:
+        if transfer is None:
+            giver_cash, _, _ = await bot._get_user_cash(guild_id, giver_id)
             embed = discord.Embed(
                 title="💸 Không đủ tiền!",
                 description=f"Bạn chỉ có **{giver_cash:,} cash** nhưng muốn tặng **{give_amount:,} cash**.\n\nDùng `?money` để kiểm tra số dư.",
@@ -3022,19 +2702,8 @@ async def main():
             await ctx.send(embed=embed)
             return
 
-        # Get receiver's current cash
-        receiver_cash, receiver_daily, receiver_streak = bot._get_user_cash(guild_id, receiver_id)
-
-        # Update both users' cash
-        new_giver_cash = giver_cash - give_amount
-        new_receiver_cash = receiver_cash + give_amount
-
-        # Update giver's cash (subtract)
-        success1 = bot._update_user_cash(guild_id, giver_id, new_giver_cash, giver_daily, giver_streak)
-        # Update receiver's cash (add)
-        success2 = bot._update_user_cash(guild_id, receiver_id, new_receiver_cash, receiver_daily, receiver_streak)
-
-        if success1 and success2:
+        if transfer:
+            new_giver_cash, new_receiver_cash = transfer
             embed = discord.Embed(
                 title="💝 Chuyển tiền thành công!",
                 description=f"**{ctx.author.mention}** đã tặng tiền cho **{user.mention}**",
@@ -3082,10 +2751,10 @@ async def main():
         user_id = str(user.id)
 
         # Get user's current cash
-        current_cash, last_daily, streak = bot._get_user_cash(guild_id, user_id)
+        current_cash, last_daily, streak = await bot._get_user_cash(guild_id, user_id)
 
         # Reset user's cash to 0
-        success = bot._update_user_cash(guild_id, user_id, 0, last_daily, streak)
+        success = await bot._update_user_cash(guild_id, user_id, 0, last_daily, streak)
 
         if success:
             embed = discord.Embed(
@@ -3164,18 +2833,7 @@ async def main():
         game_data['status'] = 'ended'
 
         # Update database
-        try:
-            connection = bot._get_db_connection()
-            if connection:
-                with connection.cursor() as cursor:
-                    cursor.execute(
-                        "UPDATE overunder_games SET result = %s, status = 'ended' WHERE game_id = %s",
-                        (result, game_id)
-                    )
-                    connection.commit()
-                connection.close()
-        except Exception as e:
-            logger.error(f"Error updating game result: {e}")
+        await bot.storage.finish_game(game_id, result)
 
         # Show admin action first
         embed = discord.Embed(
@@ -3186,27 +2844,11 @@ async def main():
         embed.set_footer(text="Game sẽ kết thúc ngay lập tức...")
         await ctx.send(embed=embed)
 
-        # Process the game ending with the set result
-        winners = []
-        losers = []
-        total_winners = 0
-        total_losers = 0
-        total_winnings = 0
-
-        for bet in game_data['bets']:
-            if bet['side'] == result:
-                winners.append(bet)
-                total_winners += 1
-                total_winnings += bet['amount']
-            else:
-                losers.append(bet)
-                total_losers += 1
-
-        # Distribute winnings (2x payout)
-        for bet in winners:
-            user_id = bet['user_id']
-            winnings = bet['amount'] * 2  # 2x payout for winning bets
-            bot._update_user_cash(guild_id, user_id, winnings)
+        # Process the game ending with the set result, distributing winnings (2x payout) in one batch
+        settlement = await bot._settle_overunder_round(guild_id, game_id, game_data['bets'], result)
+        total_winners = len(settlement.winners)
+        total_losers = len(settlement.losers)
+        total_winnings = settlement.total_bet_won
 
         # Create result embed
         result_embed = discord.Embed(
@@ -3223,10 +2865,17 @@ async def main():
 
         result_embed.add_field(
             name="💸 Người thua",
-            value=f"**{total_losers}** người thua\n💔 Mất: **{sum(bet['amount'] for bet in losers):,} cash**",
+            value=f"**{total_losers}** người thua\n💔 Mất: **{settlement.total_lost:,} cash**",
             inline=True
         )
 
+        if not settlement.applied:
+            result_embed.add_field(
+                name="⚠️ Chưa trả thưởng",
+                value="Lỗi cơ sở dữ liệu: tiền thưởng chưa được cộng sau nhiều lần thử. Admin cần cộng lại thủ công (xem log).",
+                inline=False
+            )
+
         result_embed.add_field(
             name="💡 Lưu ý",
             value="Người thắng nhận lại 2x số tiền đã cược!\nDùng `?tx` để bắt đầu game mới.",
@@ -1,13 +1,130 @@
+import asyncio
 import discord
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import Optional, Union
+from typing import Any, Dict, Hashable, List, Optional, Tuple, Union
+from action_queue import ActionQueue
+from log_sink import PRIORITY_HIGH, PRIORITY_NORMAL
 
 logger = logging.getLogger(__name__)
 
+QUARANTINE_ROLE_NAME = "Quarantined"
+# Channel overwrite requests in flight per guild while provisioning the quarantine role
+PROVISION_CONCURRENCY = 8
+# Log-channel wording and backlog priority for collapsed moderation entries
+ACTION_PAST_TENSE = {'Kick': 'kicked', 'Ban': 'banned', 'Timeout': 'timed out',
+                     'Quarantine': 'quarantined', 'Unquarantine': 'released from quarantine'}
+LOG_PRIORITY = {'Ban': PRIORITY_HIGH, 'Kick': PRIORITY_HIGH}
+
+class _ProvisionState:
+    """Progress of applying quarantine overwrites across a guild's channels"""
+    __slots__ = ('total', 'done', 'skipped', 'failed', 'started_at', 'finished_at')
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.monotonic()
+        return {
+            'total': self.total,
+            'done': self.done,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'finished': self.finished_at is not None,
+            'elapsed_seconds': round(end - self.started_at, 2)
+        }
+
 class ModerationTools:
     def __init__(self, bot):
         self.bot = bot
+        # Automatic actions, DMs and log embeds run through this queue so
+        # event handlers never wait on REST calls
+        self.actions = ActionQueue()
+        self.actions.register_coalescer('ban', self._bulk_ban)
+        # guild_id -> quarantine role id; dropped on role delete/rename events
+        self.quarantine_role_ids: Dict[int, int] = {}
+        # guild_id -> overwrite provisioning task / progress
+        self._provision_tasks: Dict[int, asyncio.Task] = {}
+        self.provisioning: Dict[int, _ProvisionState] = {}
+        
+    def start(self):
+        """Start the action queue workers"""
+        self.actions.start()
+        
+    async def stop(self):
+        """Drain queued actions (briefly) and stop the workers"""
+        await self.actions.stop()
+        
+    def enqueue(self, action: str, member: discord.Member, reason: str = "No reason provided", duration: int = 300) -> bool:
+        """
+        Queue kick/ban/timeout/quarantine against a member and return at once.
+        Returns False if an equal or stronger action is already pending for them.
+        Queued bans in the same guild with the same reason go out as one bulk ban.
+        """
+        guild = member.guild
+        target = (guild.id, member.id)
+        if action == 'ban':
+            return self.actions.submit('ban', ('ban', guild.id), target=target, group_key=(guild.id, reason), item=member)
+        if action == 'kick':
+            run = lambda: self.kick_member(member, reason)
+        elif action == 'timeout':
+            run = lambda: self.timeout_member(member, duration, reason)
+        elif action == 'quarantine':
+            run = lambda: self.quarantine_member(member)
+        else:
+            raise ValueError(f"Unknown moderation action: {action}")
+        return self.actions.submit(action, ('member', guild.id), run, target=target)
+    
+    async def _bulk_ban(self, group_key: Tuple[Hashable, str], members: List[discord.Member]):
+        """Ban a coalesced group of queued members with as few requests as possible"""
+        _, reason = group_key
+        guild = members[0].guild
+        if len(members) == 1 or not hasattr(guild, 'bulk_ban'):
+            await self._ban_each(members, reason)
+            return
+        
+        # Raid accounts are not DMed: the bulk ban lands first and they could not receive it anyway
+        try:
+            result = await guild.bulk_ban(members, reason=reason, delete_message_seconds=86400)
+        except discord.Forbidden:
+            logger.error(f"No permission to bulk ban {len(members)} members in {guild.name}")
+            raise
+        except discord.HTTPException as e:
+            logger.warning(f"Bulk ban of {len(members)} members in {guild.name} failed, banning one by one: {e}")
+            await self._ban_each(members, reason)
+            return
+        
+        banned = {user.id for user in result.banned}
+        logger.info(f"Bulk banned {len(banned)}/{len(members)} members from {guild.name}: {reason}")
+        missing = []
+        for member in members:
+            if member.id in banned:
+                self._queue_log(guild, "Ban", member, reason)
+            else:
+                missing.append(member)
+        if missing:
+            logger.warning(f"Bulk ban in {guild.name} did not ban {len(missing)} member(s): "
+                           f"{', '.join(str(member) for member in missing)}")
+    
+    async def _ban_each(self, members: List[discord.Member], reason: str):
+        """Ban members one request at a time; raises if any ban failed so the queue counts it"""
+        failed = [member for member in members if not await self.ban_member(member, reason)]
+        if failed:
+            raise RuntimeError(f"{len(failed)}/{len(members)} bans failed in {members[0].guild.name}")
+    
+    def _queue_log(self, guild: discord.Guild, action: str, target: Union[discord.Member, discord.User], reason: str):
+        self.bot.event_log.emit('action', guild_id=guild.id, action=action.lower(), user_id=target.id, reason=reason)
+        self._log_moderation_action(guild, action, target, reason, self.bot.user)
+    
+    def _queue_dm(self, member: discord.Member, action: str, reason: str, guild_name: str):
+        self.actions.submit('dm', ('dm',), lambda: self._send_moderation_dm(member, action, reason, guild_name),
+                            dedupe_key=('dm', member.guild.id, member.id, action))
         
     async def kick_member(self, member: discord.Member, reason: str = "No reason provided") -> bool:
         """Kick a member from the guild"""
@@ -15,17 +132,9 @@ class ModerationTools:
             await member.kick(reason=reason)
             logger.info(f"Kicked {member} from {member.guild.name}: {reason}")
             
-            # Log the action
-            await self._log_moderation_action(
-                member.guild,
-                "Kick",
-                member,
-                reason,
-                self.bot.user
-            )
-            
-            # Send DM to user if possible
-            await self._send_moderation_dm(member, "kicked", reason, member.guild.name)
+            # Log the action and DM the user in the background
+            self._queue_log(member.guild, "Kick", member, reason)
+            self._queue_dm(member, "kicked", reason, member.guild.name)
             
             return True
             
@@ -41,9 +150,9 @@ class ModerationTools:
         try:
             if isinstance(member, discord.Member):
                 guild = member.guild
-                # Send DM before banning
-                await self._send_moderation_dm(member, "banned", reason, guild.name)
                 await guild.ban(member, reason=reason, delete_message_days=delete_message_days)
+                # DM in the background so the ban route slot is not held for it
+                self._queue_dm(member, "banned", reason, guild.name)
             else:
                 # User object (for ban by ID)
                 guild = self.bot.guilds[0] if self.bot.guilds else None
@@ -55,13 +164,7 @@ class ModerationTools:
             logger.info(f"Banned {member} from {guild.name}: {reason}")
             
             # Log the action
-            await self._log_moderation_action(
-                guild,
-                "Ban",
-                member,
-                reason,
-                self.bot.user
-            )
+            self._queue_log(guild, "Ban", member, reason)
             
             return True
             
@@ -81,17 +184,9 @@ class ModerationTools:
             await member.timeout(timeout_until, reason=reason)
             logger.info(f"Timed out {member} for {duration} seconds: {reason}")
             
-            # Log the action
-            await self._log_moderation_action(
-                member.guild,
-                "Timeout",
-                member,
-                f"{reason} (Duration: {duration} seconds)",
-                self.bot.user
-            )
-            
-            # Send DM to user
-            await self._send_moderation_dm(member, "timed out", f"{reason} (Duration: {duration} seconds)", member.guild.name)
+            # Log the action and DM the user in the background
+            self._queue_log(member.guild, "Timeout", member, f"{reason} (Duration: {duration} seconds)")
+            self._queue_dm(member, "timed out", f"{reason} (Duration: {duration} seconds)", member.guild.name)
             
             return True
             
@@ -105,9 +200,6 @@ class ModerationTools:
     async def quarantine_member(self, member: discord.Member) -> bool:
         """Quarantine a member by removing roles and restricting access"""
         try:
-            guild_id = str(member.guild.id)
-            config = self.bot.config_manager.get_guild_config(guild_id)
-            
             # Create or get quarantine role
             quarantine_role = await self._get_or_create_quarantine_role(member.guild)
             if not quarantine_role:
@@ -129,17 +221,9 @@ class ModerationTools:
             
             logger.info(f"Quarantined {member} in {member.guild.name}")
             
-            # Log the action
-            await self._log_moderation_action(
-                member.guild,
-                "Quarantine",
-                member,
-                "Suspicious activity detected",
-                self.bot.user
-            )
-            
-            # Send DM to user
-            await self._send_moderation_dm(
+            # Log the action and DM the user in the background
+            self._queue_log(member.guild, "Quarantine", member, "Suspicious activity detected")
+            self._queue_dm(
                 member, 
                 "quarantined", 
                 "Suspicious activity detected. Please contact server administrators.", 
@@ -158,10 +242,8 @@ class ModerationTools:
     async def remove_quarantine(self, member: discord.Member) -> bool:
         """Remove quarantine from a member and restore their roles"""
         try:
-            guild_id = str(member.guild.id)
-            
             # Find quarantine role
-            quarantine_role = discord.utils.get(member.guild.roles, name="Quarantined")
+            quarantine_role = self._get_quarantine_role(member.guild)
             if not quarantine_role:
                 logger.warning(f"No quarantine role found in {member.guild.name}")
                 return True  # Consider it successful if no quarantine role exists
@@ -172,13 +254,7 @@ class ModerationTools:
                 logger.info(f"Removed quarantine from {member} in {member.guild.name}")
                 
                 # Log the action
-                await self._log_moderation_action(
-                    member.guild,
-                    "Unquarantine",
-                    member,
-                    "Verification completed successfully",
-                    self.bot.user
-                )
+                self._queue_log(member.guild, "Unquarantine", member, "Verification completed successfully")
                 
                 return True
             else:
@@ -192,46 +268,117 @@ class ModerationTools:
             logger.error(f"Failed to remove quarantine from {member}: {e}")
             return False
     
+    def _get_quarantine_role(self, guild: discord.Guild) -> Optional[discord.Role]:
+        """Cached quarantine role lookup; scans guild.roles by name only on a miss"""
+        role_id = self.quarantine_role_ids.get(guild.id)
+        if role_id is not None:
+            role = guild.get_role(role_id)
+            if role is not None:
+                return role
+            del self.quarantine_role_ids[guild.id]
+        
+        role = discord.utils.get(guild.roles, name=QUARANTINE_ROLE_NAME)
+        if role is not None:
+            self.quarantine_role_ids[guild.id] = role.id
+        return role
+    
+    def invalidate_quarantine_role(self, role: discord.Role):
+        """Forget the cached quarantine role if role is (or was renamed to/from) it"""
+        guild_id = role.guild.id
+        if self.quarantine_role_ids.get(guild_id) == role.id or role.name == QUARANTINE_ROLE_NAME:
+            self.quarantine_role_ids.pop(guild_id, None)
+    
     async def _get_or_create_quarantine_role(self, guild: discord.Guild) -> Optional[discord.Role]:
         """Get or create quarantine role"""
         # Look for existing quarantine role
-        quarantine_role = discord.utils.get(guild.roles, name="Quarantined")
+        quarantine_role = self._get_quarantine_role(guild)
         
         if not quarantine_role:
             try:
                 # Create quarantine role with restricted permissions
                 quarantine_role = await guild.create_role(
-                    name="Quarantined",
+                    name=QUARANTINE_ROLE_NAME,
                     permissions=discord.Permissions(read_messages=True, send_messages=False, speak=False),
                     reason="Anti-bot quarantine role"
                 )
-                
-                # Set channel permissions for quarantine role
-                for channel in guild.channels:
-                    try:
-                        if isinstance(channel, discord.TextChannel):
-                            await channel.set_permissions(
-                                quarantine_role,
-                                send_messages=False,
-                                add_reactions=False,
-                                create_public_threads=False,
-                                create_private_threads=False
-                            )
-                        elif isinstance(channel, discord.VoiceChannel):
-                            await channel.set_permissions(
-                                quarantine_role,
-                                speak=False,
-                                connect=False
-                            )
-                    except discord.Forbidden:
-                        continue
+                self.quarantine_role_ids[guild.id] = quarantine_role.id
                         
             except discord.Forbidden:
                 logger.error(f"No permission to create quarantine role in {guild.name}")
                 return None
         
+        # Channel overwrites are applied in the background; an interrupted run
+        # (restart, error) is resumed the next time the role is used
+        self._ensure_provisioned(guild, quarantine_role)
         return quarantine_role
     
+    def _ensure_provisioned(self, guild: discord.Guild, role: discord.Role):
+        """Start overwrite provisioning for a guild unless it is running or has completed this session"""
+        task = self._provision_tasks.get(guild.id)
+        if task is not None and (not task.done() or self.provisioning[guild.id].failed == 0):
+            return
+        self._provision_tasks[guild.id] = asyncio.create_task(self.provision_quarantine_overwrites(guild, role))
+    
+    async def provision_quarantine_overwrites(self, guild: discord.Guild, role: discord.Role) -> Dict[str, Any]:
+        """
+        Deny the quarantine role speech in every text and voice channel,
+        PROVISION_CONCURRENCY requests at a time. Channels that already
+        carry an overwrite for the role are skipped, so this is safe to
+        re-run and picks up where an interrupted run stopped.
+        """
+        channels = [channel for channel in guild.channels
+                    if isinstance(channel, (discord.TextChannel, discord.VoiceChannel))]
+        state = self.provisioning[guild.id] = _ProvisionState(len(channels))
+        semaphore = asyncio.Semaphore(PROVISION_CONCURRENCY)
+        
+        async def provision(channel):
+            if role in channel.overwrites:
+                state.skipped += 1
+                return
+            async with semaphore:
+                try:
+                    if isinstance(channel, discord.TextChannel):
+                        await channel.set_permissions(
+                            role,
+                            send_messages=False,
+                            add_reactions=False,
+                            create_public_threads=False,
+                            create_private_threads=False
+                        )
+                    else:
+                        await channel.set_permissions(
+                            role,
+                            speak=False,
+                            connect=False
+                        )
+                    state.done += 1
+                except discord.Forbidden:
+                    state.skipped += 1
+                except discord.HTTPException as e:
+                    state.failed += 1
+                    logger.warning(f"Failed to set quarantine overwrite in #{channel} ({guild.name}): {e}")
+        
+        await asyncio.gather(*(provision(channel) for channel in channels))
+        state.finished_at = time.monotonic()
+        progress = state.as_dict()
+        logger.info(
+            f"Quarantine overwrites in {guild.name}: {state.done} set, {state.skipped} skipped, "
+            f"{state.failed} failed of {state.total} channels in {progress['elapsed_seconds']}s"
+        )
+        return progress
+    
+    def get_provisioning_status(self, guild_id: int) -> Optional[Dict[str, Any]]:
+        state = self.provisioning.get(guild_id)
+        return state.as_dict() if state else None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Action queue and quarantine provisioning counters for BotMonitor"""
+        return {
+            'queue': self.actions.get_stats(),
+            'cached_quarantine_roles': len(self.quarantine_role_ids),
+            'provisioning': {str(guild_id): state.as_dict() for guild_id, state in self.provisioning.items()}
+        }
+    
     async def _send_moderation_dm(self, member: discord.Member, action: str, reason: str, guild_name: str):
         """Send a DM to inform user about moderation action"""
         try:
@@ -271,40 +418,30 @@ class ModerationTools:
         except Exception as e:
             logger.error(f"Error sending DM to {member}: {e}")
     
-    async def _log_moderation_action(self, guild: discord.Guild, action: str, target: Union[discord.Member, discord.User], reason: str, moderator: discord.User):
-        """Log moderation action to configured log channel"""
+    def _log_moderation_action(self, guild: discord.Guild, action: str, target: Union[discord.Member, discord.User], reason: str, moderator: discord.User):
+        """Log moderation action to the configured log channel (batched; repeats collapse into one embed)"""
         try:
-            guild_id = str(guild.id)
-            config = self.bot.config_manager.get_guild_config(guild_id)
-            
-            if not config['logging']['enabled']:
-                return
-                
-            log_channel_id = config['logging']['channel_id']
-            if not log_channel_id:
-                return
-                
-            log_channel = guild.get_channel(int(log_channel_id))
-            if not log_channel or not isinstance(log_channel, discord.TextChannel):
-                return
-            
-            # Create embed
-            embed = discord.Embed(
-                title=f"🔨 {action}",
-                color=self._get_action_color(action),
-                timestamp=datetime.utcnow()
-            )
-            
-            embed.add_field(name="Target", value=f"{target} (`{target.id}`)", inline=True)
-            embed.add_field(name="Moderator", value=f"{moderator} (`{moderator.id}`)", inline=True)
-            embed.add_field(name="Reason", value=f"**{reason}**", inline=False)
-            
+            fields = [
+                ("Target", f"{target} (`{target.id}`)", True),
+                ("Moderator", f"{moderator} (`{moderator.id}`)", True),
+                ("Reason", f"**{reason}**", False)
+            ]
             if isinstance(target, discord.Member):
-                embed.add_field(name="Account Created", value=target.created_at.strftime("%Y-%m-%d %H:%M:%S UTC"), inline=True)
+                fields.append(("Account Created", target.created_at.strftime("%Y-%m-%d %H:%M:%S UTC"), True))
                 if target.joined_at:
-                    embed.add_field(name="Joined Server", value=target.joined_at.strftime("%Y-%m-%d %H:%M:%S UTC"), inline=True)
-            await log_channel.send(embed=embed)
-            
+                    fields.append(("Joined Server", target.joined_at.strftime("%Y-%m-%d %H:%M:%S UTC"), True))
+
+            self.bot.log_sink.post(
+                guild,
+                f"🔨 {action}",
+                None,
+                self._get_action_color(action),
+                priority=LOG_PRIORITY.get(action, PRIORITY_NORMAL),
+                fields=fields,
+                collapse=(action, reason),
+                summary=f"{{count}} members {ACTION_PAST_TENSE.get(action, action.lower())}\nReason: **{reason}**",
+                subject=f"{target} (`{target.id}`)"
+            )
         except Exception as e:
             logger.error(f"Failed to log moderation action: {e}")
     
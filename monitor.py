@@ -84,6 +84,17 @@ class BotMonitor:
         guild_count = len(self.bot.guilds)
         self.stats['hourly_stats'][hour_key]['guild_count'] = guild_count
         self.stats['daily_stats'][day_key]['guild_count'] = guild_count
+        
+        # Size of the spam detector's per-user state (bounded by TTL/LRU eviction)
+        spam_detector = getattr(self.bot, 'spam_detector', None)
+        if spam_detector is not None:
+            state = spam_detector.get_state_stats()
+            # One message history per user; the rate limiter also keys channels and guilds
+            self.stats['hourly_stats'][hour_key]['tracked_users'] = state['user_messages']['entries']
+            self.stats['hourly_stats'][hour_key]['state_evictions'] = sum(
+                state[name]['evicted_lru'] + state[name]['evicted_ttl']
+                for name in ('user_messages', 'rate_limiter', 'duplicate_indexes')
+            )
     
     async def _check_bot_health(self):
         """Check bot health and restart if necessary"""
@@ -286,7 +297,14 @@ class BotMonitor:
             'total_members': sum(guild.member_count for guild in self.bot.guilds if guild.member_count),
             'bot_latency_ms': round(self.bot.latency * 1000, 2),
             'uptime_hours': self._get_uptime_hours(),
-            'api_calls': dict(self.api_calls)
+            'api_calls': dict(self.api_calls),
+            'storage': self.bot.storage.get_stats() if getattr(self.bot, 'storage', None) else {},
+            'spam_state': self.bot.spam_detector.get_state_stats() if getattr(self.bot, 'spam_detector', None) else {},
+            'spam_pipeline': self.bot.spam_detector.get_pipeline_stats() if getattr(self.bot, 'spam_detector', None) else {},
+            'bot_detection': self.bot.bot_detector.get_stats() if getattr(self.bot, 'bot_detector', None) else {},
+            'moderation': self.bot.moderation.get_stats() if getattr(self.bot, 'moderation', None) else {},
+            'log_sink': self.bot.log_sink.get_stats() if getattr(self.bot, 'log_sink', None) else {},
+            'event_log': self.bot.event_log.get_stats() if getattr(self.bot, 'event_log', None) else {}
         }
     
     def get_recent_activity(self, limit: int = 50, activity_type: Optional[str] = None) -> List[Dict]:
@@ -0,0 +1,193 @@
+import time
+import struct
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+
+FINGERPRINT_BITS = 64
+# Normalized texts shorter than this only match exactly: a handful of
+# shingles is too few votes per bit, so "yes!" and "yes." can land within
+# the near-duplicate distance of each other
+MIN_NEAR_DUPLICATE_LENGTH = 16
+
+# _BIT_TABLES[j] maps every byte to its bit j (0 or 1), for bytes.translate
+_BIT_TABLES = [bytes(byte >> j & 1 for byte in range(256)) for j in range(8)]
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse whitespace so formatting tricks do not change the fingerprint"""
+    return ' '.join(text.lower().split())
+
+def simhash(text: str, shingle_size: int = 2) -> int:
+    """64-bit SimHash of a text's character shingles; similar texts differ in few bits"""
+    return _simhash_normalized(normalize(text), shingle_size)
+
+def _simhash_normalized(text: str, shingle_size: int = 2) -> int:
+    if len(text) <= shingle_size:
+        hashes = [hash(text)]
+    else:
+        hashes = [hash(text[i:i + shingle_size]) for i in range(len(text) - shingle_size + 1)]
+    count = len(hashes)
+
+    # Pack the hashes as little-endian u64s and, for each bit j, turn every
+    # byte into its bit j. Summing the resulting words then adds up all 64
+    # bit columns at once, one column per byte lane, entirely in C.
+    packed = struct.pack(f'<{count}q', *hashes)
+    half = count / 2
+    fingerprint = 0
+    for j, table in enumerate(_BIT_TABLES):
+        words = memoryview(packed.translate(table)).cast('Q')
+        lanes = [0] * 8
+        # Each byte is 0 or 1, so 255 words can be summed before a lane overflows
+        for start in range(0, count, 255):
+            chunk = sum(words[start:start + 255])
+            for k in range(8):
+                lanes[k] += chunk >> (8 * k) & 0xFF
+        # A bit is set when more than half of the shingles have it set
+        for k, lane in enumerate(lanes):
+            if lane > half:
+                fingerprint |= 1 << (8 * k + j)
+    return fingerprint
+
+class NormalizedText:
+    """
+    A message's normalized text with its exact-match key and its SimHash,
+    each computed at most once so several indexes can share them. The
+    fingerprint is only computed when an index actually needs it.
+    """
+    __slots__ = ('text', 'exact_key', '_fingerprint')
+
+    def __init__(self, text: str):
+        self.text = normalize(text)
+        self.exact_key = hash(self.text)
+        self._fingerprint: Optional[int] = None
+
+    @property
+    def fingerprint(self) -> int:
+        if self._fingerprint is None:
+            self._fingerprint = _simhash_normalized(self.text)
+        return self._fingerprint
+
+def band_keys(fingerprint: int, band_count: int) -> List[int]:
+    """
+    Split a fingerprint into band_count bands. Two fingerprints that differ
+    in fewer than band_count bits share at least one band exactly.
+    """
+    width = -(-FINGERPRINT_BITS // band_count)
+    mask = (1 << width) - 1
+    return [fingerprint >> (band * width) & mask for band in range(band_count)]
+
+class _Entry:
+    """One cluster of near-identical messages (or of identical ones, for exact entries)"""
+    __slots__ = ('fingerprint', 'scope', 'exact_keys', 'count', 'last_seen')
+
+    def __init__(self, fingerprint: Optional[int], scope: Any, exact_key: Any, now: float):
+        # None for short texts, which only ever match exactly
+        self.fingerprint = fingerprint
+        self.scope = scope
+        # Exact-text keys that resolve to this cluster without a SimHash
+        self.exact_keys = [exact_key]
+        self.count = 1
+        self.last_seen = now
+
+class NearDuplicateIndex:
+    """
+    Bounded SimHash index of one user's recent messages.
+
+    Every message is first looked up by a hash of its normalized text, so
+    verbatim repeats never pay for a fingerprint. Only a miss on a text of
+    at least MIN_NEAR_DUPLICATE_LENGTH characters is SimHashed; its
+    fingerprint is split into max_distance + 1 bands, and by pigeonhole any
+    two fingerprints within max_distance bits share at least one band
+    exactly, so candidates come from dict lookups instead of comparing
+    against every stored message. The least recently seen cluster is
+    evicted in O(1) once max_entries is reached.
+    """
+    __slots__ = ('max_entries', 'max_distance', '_bands', '_exact', '_entries')
+
+    # Exact keys remembered per cluster; a burst of mutated copies would
+    # otherwise grow one cluster's key list without bound
+    MAX_EXACT_KEYS = 8
+
+    def __init__(self, max_entries: int = 20, max_distance: int = 10):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        # One dict per band: band value -> clusters having that value
+        self._bands: List[Dict[int, List[_Entry]]] = [{} for _ in range(max_distance + 1)]
+        # (scope, hash of normalized text) -> cluster
+        self._exact: Dict[Any, _Entry] = {}
+        # id(entry) -> entry, least recently seen first
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, text: Union[str, NormalizedText], scope: Any = None, now: Optional[float] = None) -> int:
+        """
+        Record a message and return how many near-duplicates it now has
+        (including itself). Texts shorter than MIN_NEAR_DUPLICATE_LENGTH once
+        normalized only count identical repeats.
+        """
+        now = time.monotonic() if now is None else now
+        if isinstance(text, str):
+            text = NormalizedText(text)
+        exact_key = (scope, text.exact_key)
+
+        entry = self._exact.get(exact_key)
+        if entry is None and len(text.text) >= MIN_NEAR_DUPLICATE_LENGTH:
+            fingerprint = text.fingerprint
+            keys = band_keys(fingerprint, len(self._bands))
+            entry = self._find(fingerprint, keys, scope)
+            if entry is None:
+                entry = self._add(fingerprint, keys, scope, exact_key, now)
+                return entry.count
+            if len(entry.exact_keys) < self.MAX_EXACT_KEYS:
+                entry.exact_keys.append(exact_key)
+                self._exact[exact_key] = entry
+        elif entry is None:
+            return self._add(None, (), scope, exact_key, now).count
+
+        entry.count += 1
+        entry.last_seen = now
+        self._entries.move_to_end(id(entry))
+        return entry.count
+
+    def _find(self, fingerprint: int, keys: List[int], scope: Any) -> Optional[_Entry]:
+        best: Optional[_Entry] = None
+        best_distance = self.max_distance + 1
+        for band, key in zip(self._bands, keys):
+            for entry in band.get(key, ()):
+                if entry.scope != scope:
+                    continue
+                distance = (entry.fingerprint ^ fingerprint).bit_count()
+                if distance < best_distance:
+                    best, best_distance = entry, distance
+        return best
+
+    def _add(self, fingerprint: Optional[int], keys: List[int], scope: Any, exact_key: Any, now: float) -> _Entry:
+        if len(self._entries) >= self.max_entries:
+            self._evict(self._entries.popitem(last=False)[1])
+
+        entry = _Entry(fingerprint, scope, exact_key, now)
+        self._entries[id(entry)] = entry
+        self._exact[exact_key] = entry
+        for band, key in zip(self._bands, keys):
+            band.setdefault(key, []).append(entry)
+        return entry
+
+    def _evict(self, entry: _Entry):
+        for exact_key in entry.exact_keys:
+            del self._exact[exact_key]
+        if entry.fingerprint is None:
+            return
+        for band, key in zip(self._bands, band_keys(entry.fingerprint, len(self._bands))):
+            bucket = band.get(key)
+            if bucket is None:
+                continue
+            bucket.remove(entry)
+            if not bucket:
+                del band[key]
+
+    def clear(self):
+        for band in self._bands:
+            band.clear()
+        self._exact.clear()
+        self._entries.clear()
@@ -0,0 +1,91 @@
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+class MultiPatternMatcher:
+    """
+    Aho-Corasick automaton over a fixed set of case-insensitive substrings.
+
+    Built once (per GuildPolicy) and then scans a text in a single pass
+    whose cost depends on the text length, not on how many patterns are
+    loaded, so guilds can carry thousands of scam domains and phrases.
+    """
+    __slots__ = ('patterns', '_goto', '_fail', '_out')
+
+    def __init__(self, patterns: Iterable[str]):
+        # Lowercased and de-duplicated, keeping the configured order for reporting
+        self.patterns: Tuple[str, ...] = tuple(dict.fromkeys(
+            str(pattern).lower() for pattern in patterns or () if pattern
+        ))
+
+        goto: List[Dict[str, int]] = [{}]
+        out: List[Tuple[int, ...]] = [()]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    out.append(())
+                state = next_state
+            out[state] += (index,)
+
+        # Breadth-first so every state's failure link is ready before its children's
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                out[next_state] += out[fail[next_state]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+    def find_all(self, text: str) -> List[str]:
+        """Every distinct pattern found in text, in order of first occurrence"""
+        if not self.patterns or not text:
+            return []
+
+        goto, fail, out = self._goto, self._fail, self._out
+        patterns = self.patterns
+        hits: List[str] = []
+        seen = set()
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                for index in out[state]:
+                    if index not in seen:
+                        seen.add(index)
+                        hits.append(patterns[index])
+        return hits
+
+    def search(self, text: str) -> bool:
+        """True as soon as any pattern occurs in text"""
+        if not self.patterns or not text:
+            return False
+
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                return True
+        return False
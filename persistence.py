@@ -0,0 +1,109 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+class PersistenceWorker:
+    """
+    Single background thread for blocking disk I/O (fsync, snapshot writes).
+
+    Jobs run one at a time in submission order, so a job can rely on every
+    earlier job having finished. A job submitted with a key replaces a
+    still-queued job with the same key, which coalesces repeated requests
+    such as "fsync this file" into one write.
+    """
+
+    def __init__(self, name: str = "persistence-worker"):
+        self.name = name
+        self._jobs: "OrderedDict[Hashable, Callable[[], Any]]" = OrderedDict()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._busy = False
+        self._next_id = 0
+
+        self.jobs_run = 0
+        self.jobs_coalesced = 0
+        self.jobs_failed = 0
+        self.busy_ms = 0.0
+
+    def start(self):
+        """Start the worker thread"""
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def submit(self, job: Callable[[], Any], key: Optional[Hashable] = None):
+        """Queue a job; never blocks on I/O"""
+        with self._condition:
+            if key is None:
+                self._next_id += 1
+                key = ('job', self._next_id)
+            elif key in self._jobs:
+                self.jobs_coalesced += 1
+            # Re-queue at the back: the newer request must run after everything before it
+            self._jobs.pop(key, None)
+            self._jobs[key] = job
+            self._condition.notify()
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Block until the queue is empty and no job is running"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._jobs or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def stop(self, timeout: Optional[float] = 30.0):
+        """Finish every queued job, then stop the thread"""
+        if self._thread is None:
+            return
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"{self.name} did not finish its queue within {timeout}s")
+        self._thread = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._jobs and self._running:
+                    self._condition.wait()
+                if not self._jobs:
+                    return
+                _, job = self._jobs.popitem(last=False)
+                self._busy = True
+
+            started = time.perf_counter()
+            try:
+                job()
+            except Exception as e:
+                self.jobs_failed += 1
+                logger.error(f"Persistence job failed: {e}")
+            finally:
+                self.busy_ms += (time.perf_counter() - started) * 1000
+                self.jobs_run += 1
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            queued = len(self._jobs)
+        return {
+            'queued': queued,
+            'jobs_run': self.jobs_run,
+            'jobs_coalesced': self.jobs_coalesced,
+            'jobs_failed': self.jobs_failed,
+            'busy_ms': round(self.busy_ms, 2)
+        }
@@ -0,0 +1,79 @@
+import time
+import logging
+from typing import Any, Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Winners get back double their bet
+PAYOUT_MULTIPLIER = 2
+
+class RoundSettlement:
+    """Computed outcome of one Tai/Xiu round, ready to be applied as a single batch"""
+    __slots__ = ('game_id', 'result', 'winners', 'losers', 'payouts', 'total_bet_won', 'total_paid',
+                 'total_lost', 'compute_ms', 'apply_ms', 'applied')
+
+    def __init__(self, game_id: str, result: str):
+        self.game_id = game_id
+        self.result = result
+        self.winners: List[Dict[str, Any]] = []
+        self.losers: List[Dict[str, Any]] = []
+        # user_id -> total cash credited this round
+        self.payouts: Dict[str, int] = {}
+        self.total_bet_won = 0
+        self.total_paid = 0
+        self.total_lost = 0
+        self.compute_ms = 0.0
+        self.apply_ms = 0.0
+        self.applied = False
+
+    @property
+    def total_ms(self) -> float:
+        return self.compute_ms + self.apply_ms
+
+    def deltas(self) -> List[Tuple[str, int]]:
+        """(user_id, amount) pairs to credit"""
+        return list(self.payouts.items())
+
+def compute_settlement(game_id: str, bets: Iterable[Dict[str, Any]], result: str) -> RoundSettlement:
+    """Work out every payout for a round without touching storage"""
+    started = time.perf_counter()
+    settlement = RoundSettlement(game_id, result)
+
+    for bet in bets:
+        if bet['side'] == result:
+            # Winner - give back double the bet
+            winnings = bet['amount'] * PAYOUT_MULTIPLIER
+            settlement.payouts[bet['user_id']] = settlement.payouts.get(bet['user_id'], 0) + winnings
+            settlement.total_bet_won += bet['amount']
+            settlement.total_paid += winnings
+            settlement.winners.append({
+                'username': bet['username'],
+                'amount': bet['amount'],
+                'winnings': winnings
+            })
+        else:
+            # Loser - they already lost their bet when placing it
+            settlement.total_lost += bet['amount']
+            settlement.losers.append({
+                'username': bet['username'],
+                'amount': bet['amount']
+            })
+
+    settlement.compute_ms = (time.perf_counter() - started) * 1000
+    return settlement
+
+async def apply_settlement(storage, guild_id: str, settlement: RoundSettlement) -> bool:
+    """Credit all payouts of a round in one atomic storage batch"""
+    started = time.perf_counter()
+    deltas = settlement.deltas()
+    settlement.applied = await storage.add_cash_batch(guild_id, deltas) if deltas else True
+    settlement.apply_ms = (time.perf_counter() - started) * 1000
+
+    if settlement.applied:
+        logger.info(
+            f"Settled round {settlement.game_id}: {len(settlement.winners)} winners, {len(settlement.losers)} losers "
+            f"in {settlement.total_ms:.2f}ms (compute {settlement.compute_ms:.2f}ms, apply {settlement.apply_ms:.2f}ms)"
+        )
+    else:
+        logger.error(f"Failed to apply settlement for round {settlement.game_id} ({len(deltas)} payouts)")
+    return settlement.applied
@@ -1,22 +1,106 @@
 import discord
-import re
 import time
 import logging
-from collections import defaultdict, deque
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Set
-from config import ConfigManager
+from typing import Dict, Any, List, Optional, Set
+from config import ConfigManager, GuildPolicy
+from near_duplicate import NearDuplicateIndex, NormalizedText
+from coordinated_spam import ClusterMember, CoordinatedSpamIndex
+from bounded_state import TTLCache
+from rate_limiter import RateLimiter
+from confusables import SkeletonCache
+from url_extraction import ExtractedURL, extract_urls, get_cache_stats as get_url_cache_stats
 
 logger = logging.getLogger(__name__)
 
+# Score at or above this share of the maximum marks a message as spam
+SPAM_THRESHOLD = 0.7
+
+class _Scan:
+    """Per-message values shared by the pipeline stages so each is computed once"""
+    __slots__ = ('message', 'policy', 'content', 'lowered', '_normalized', '_urls')
+
+    def __init__(self, message: discord.Message, policy: GuildPolicy, content: str):
+        self.message = message
+        self.policy = policy
+        self.content = content
+        self.lowered = content.lower()
+        self._normalized = None
+        self._urls = None
+
+    @property
+    def normalized(self) -> NormalizedText:
+        """Normalized text for the duplicate indexes; its SimHash is computed on first use and shared"""
+        if self._normalized is None:
+            self._normalized = NormalizedText(self.content)
+        return self._normalized
+
+    @property
+    def urls(self) -> List[ExtractedURL]:
+        """Links in the message, extracted on first use and shared by later stages"""
+        if self._urls is None:
+            self._urls = extract_urls(self.content)
+        return self._urls
+
+class _StageTiming:
+    __slots__ = ('runs', 'skipped', 'total_ns', 'max_ns')
+
+    def __init__(self):
+        self.runs = 0
+        self.skipped = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
 class SpamDetector:
-    def __init__(self, config_manager: ConfigManager):
+    # (stage, max points, policy toggle) in run order, cheapest first. The
+    # rate limiter always runs so its counters see every message; the
+    # SimHash-backed checks (coordinated, then duplicate) only run once the
+    # rate and mention checks have had their chance to settle the message,
+    # and the regex/URL work runs last.
+    STAGES = (
+        ('rate_limit', 3, None),
+        ('mentions', 2, 'check_mention_spam'),
+        ('duplicate', 3, None),
+        ('content', 2, None),
+        ('links', 2, 'check_link_spam'),
+    )
+    STATEFUL_STAGES = frozenset(('rate_limit',))
+    # The guild-wide coordinated check runs just before this stage
+    COORDINATED_STAGE = 'duplicate'
+
+    def __init__(self, config_manager: ConfigManager, max_tracked_users: int = 50000, state_ttl: float = 3600.0,
+                 short_circuit: bool = True):
         self.config_manager = config_manager
-        
-        # Track user message history
-        self.user_messages = defaultdict(lambda: deque(maxlen=50))
-        self.user_message_times = defaultdict(lambda: deque(maxlen=50))
-        self.duplicate_messages = defaultdict(lambda: defaultdict(int))
+        # Skip stateless stages once the verdict can no longer change
+        self.short_circuit = short_circuit
+        
+        # Track user message history; users idle for state_ttl seconds (or the
+        # least recently active beyond max_tracked_users) are forgotten
+        self.user_messages = TTLCache(lambda: deque(maxlen=50), max_tracked_users, state_ttl)
+        # Sliding-window counts for per-user limits and per-channel / per-guild aggregates
+        self.rate_limiter = RateLimiter(max_tracked_users, state_ttl)
+        # user_id -> bounded SimHash index of that user's recent messages
+        self.duplicate_indexes = TTLCache(None, max_tracked_users, state_ttl)
+        # guild_id -> guild-wide index of content posted by many accounts
+        self.coordination_indexes: Dict[str, CoordinatedSpamIndex] = {}
+        # message_id -> other cluster members to act on along with that message
+        self.coordinated_members: Dict[int, List[ClusterMember]] = {}
+        # Homoglyph-folded message text and link hosts; repeated spam strings hit the cache
+        self.skeletons = SkeletonCache(max_size=10000)
+        
+        self._stage_checks = {
+            'rate_limit': self._check_rate_limit,
+            'duplicate': self._check_duplicate_content,
+            'mentions': self._check_mention_spam,
+            'content': self._check_content_patterns,
+            'links': self._check_link_spam,
+        }
+        self.stage_timings: Dict[str, _StageTiming] = {name: _StageTiming() for name in ('coordinated',) + tuple(
+            stage[0] for stage in self.STAGES)}
+        self.early_exits = 0
+        # Wall time of recent full scans, for the median/p95 in get_pipeline_stats
+        self.scan_times_ns = deque(maxlen=1024)
         
     async def check_message(self, message: discord.Message) -> bool:
         """
@@ -26,56 +110,63 @@ class SpamDetector:
         if not message.guild:
             return False
             
-        guild_id = str(message.guild.id)
-        config = self.config_manager.get_guild_config(guild_id)
+        policy = self.config_manager.get_guild_policy(str(message.guild.id))
         
-        if not config['spam_detection']['enabled']:
+        if not policy.spam_detection_enabled:
             return False
             
         # Check if user is whitelisted
-        if self._is_whitelisted(message.author, config):
+        if self._is_whitelisted(message.author, policy):
             return False
-            
+        
+        started = time.perf_counter_ns()
+        try:
+            return self._run_pipeline(_Scan(message, policy, message.content.strip()))
+        finally:
+            self.scan_times_ns.append(time.perf_counter_ns() - started)
+    
+    def _run_pipeline(self, scan: _Scan) -> bool:
+        message = scan.message
+        policy = scan.policy
+        timings = self.stage_timings
+        clock = time.perf_counter_ns
+        
+        stages = [stage for stage in self.STAGES if stage[2] is None or getattr(policy, stage[2])]
+        max_score = sum(stage[1] for stage in stages)
+        needed = SPAM_THRESHOLD * max_score
+        remaining = max_score
         spam_score = 0
-        max_score = 0
         reasons = []
-        
-        # Check message rate limiting
-        rate_score, rate_reason = self._check_rate_limit(message, config)
-        spam_score += rate_score
-        max_score += 3
-        if rate_reason:
-            reasons.append(rate_reason)
-        
-        # Check for duplicate messages
-        dup_score, dup_reason = self._check_duplicate_content(message, config)
-        spam_score += dup_score
-        max_score += 3
-        if dup_reason:
-            reasons.append(dup_reason)
-        
-        # Check mention spam
-        if config['spam_detection']['check_mention_spam']:
-            mention_score, mention_reason = self._check_mention_spam(message, config)
-            spam_score += mention_score
-            max_score += 2
-            if mention_reason:
-                reasons.append(mention_reason)
-        
-        # Check link spam
-        if config['spam_detection']['check_link_spam']:
-            link_score, link_reason = self._check_link_spam(message)
-            spam_score += link_score
-            max_score += 2
-            if link_reason:
-                reasons.append(link_reason)
-        
-        # Check message content patterns
-        content_score, content_reason = self._check_content_patterns(message)
-        spam_score += content_score
-        max_score += 2
-        if content_reason:
-            reasons.append(content_reason)
+        exited_early = False
+        
+        for name, points, _ in stages:
+            remaining -= points
+            if name == self.COORDINATED_STAGE and scan.content:
+                # Check for the same content coming from many accounts at once. This is a
+                # verdict on its own, so it is only skipped once the message is spam anyway
+                if self.short_circuit and spam_score >= needed:
+                    timings['coordinated'].skipped += 1
+                else:
+                    started = clock()
+                    coordinated = self._check_coordinated_spam(scan)
+                    self._record_stage(timings['coordinated'], clock() - started)
+                    if coordinated:
+                        self._update_message_history(message)
+                        return True
+            if self.short_circuit and name not in self.STATEFUL_STAGES and (
+                    spam_score >= needed or spam_score + points + remaining < needed):
+                timings[name].skipped += 1
+                exited_early = True
+                continue
+            started = clock()
+            score, reason = self._stage_checks[name](scan)
+            self._record_stage(timings[name], clock() - started)
+            spam_score += score
+            if reason:
+                reasons.append(reason)
+        
+        if exited_early:
+            self.early_exits += 1
         
         # Update message history
         self._update_message_history(message)
@@ -84,7 +175,7 @@ class SpamDetector:
         spam_percentage = (spam_score / max_score) * 100 if max_score > 0 else 0
         
         # Log analysis if spam detected
-        if spam_percentage >= 70:  # Threshold for spam detection
+        if spam_percentage >= SPAM_THRESHOLD * 100:
             logger.warning(f"Spam detected from {message.author} in {message.guild.name}: {spam_percentage:.1f}% ({spam_score}/{max_score})")
             if reasons:
                 logger.warning(f"Reasons: {', '.join(reasons)}")
@@ -92,68 +183,67 @@ class SpamDetector:
             
         return False
     
-    def _is_whitelisted(self, member: discord.Member, config: Dict[str, Any]) -> bool:
+    @staticmethod
+    def _record_stage(timing: _StageTiming, elapsed_ns: int):
+        timing.runs += 1
+        timing.total_ns += elapsed_ns
+        if elapsed_ns > timing.max_ns:
+            timing.max_ns = elapsed_ns
+    
+    def _is_whitelisted(self, member: discord.Member, policy: GuildPolicy) -> bool:
         """Check if member is whitelisted"""
-        whitelist = config.get('whitelist', {})
-        
-        # Check user whitelist
-        if str(member.id) in whitelist.get('users', []):
-            return True
-            
-        # Check role whitelist
-        member_role_ids = [str(role.id) for role in member.roles]
-        whitelisted_roles = whitelist.get('roles', [])
-        
-        return any(role_id in member_role_ids for role_id in whitelisted_roles)
+        return policy.is_whitelisted(member)
     
-    def _check_rate_limit(self, message: discord.Message, config: Dict[str, Any]) -> tuple:
-        """Check if user is sending messages too quickly"""
-        user_id = str(message.author.id)
-        current_time = time.time()
-        
-        max_messages = config['spam_detection']['max_messages_per_window']
-        time_window = config['spam_detection']['time_window_seconds']
-        
-        # Clean old timestamps
-        cutoff_time = current_time - time_window
-        while self.user_message_times[user_id] and self.user_message_times[user_id][0] < cutoff_time:
-            self.user_message_times[user_id].popleft()
-        
-        # Add current message time
-        self.user_message_times[user_id].append(current_time)
-        
-        message_count = len(self.user_message_times[user_id])
-        
-        if message_count > max_messages:
-            excess = message_count - max_messages
+    def _check_rate_limit(self, scan: _Scan) -> tuple:
+        """Check if user (or the channel/server as a whole) is sending messages too quickly"""
+        message = scan.message
+        policy = scan.policy
+        now = self.rate_limiter.clock()
+        guild_id = message.guild.id
+        
+        score = 0
+        reason = None
+        excess, message_count, rate = self.rate_limiter.excess(('u', guild_id, message.author.id), policy.user_rate_limits, now)
+        if excess > 0:
+            time_window = f"{rate.period:g}"
             if excess >= 5:
-                return 3, f"Severe rate limit exceeded ({message_count} messages in {time_window}s)"
+                score, reason = 3, f"Severe rate limit exceeded ({message_count} messages in {time_window}s)"
             elif excess >= 3:
-                return 2, f"Rate limit exceeded ({message_count} messages in {time_window}s)"
+                score, reason = 2, f"Rate limit exceeded ({message_count} messages in {time_window}s)"
             else:
-                return 1, f"High message rate ({message_count} messages in {time_window}s)"
+                score, reason = 1, f"High message rate ({message_count} messages in {time_window}s)"
+        
+        # Aggregate floods count for at least a point even when each user stays under their own limit
+        for key, limits, label in ((('c', message.channel.id), policy.channel_rate_limits, "Channel"),
+                                   (('g', guild_id), policy.guild_rate_limits, "Server")):
+            if not limits:
+                continue
+            excess, message_count, rate = self.rate_limiter.excess(key, limits, now)
+            if excess > 0:
+                flood = f"{label} flood ({message_count} messages in {rate.period:g}s)"
+                reason = f"{reason}; {flood}" if reason else flood
+                score = max(score, 1)
                 
-        return 0, None
+        return score, reason
     
-    def _check_duplicate_content(self, message: discord.Message, config: Dict[str, Any]) -> tuple:
-        """Check for duplicate message content"""
-        user_id = str(message.author.id)
-        content = message.content.strip().lower()
-        
-        if not content:  # Skip empty messages
+    def _check_duplicate_content(self, scan: _Scan) -> tuple:
+        """Check for duplicate and near-duplicate message content"""
+        if not scan.content:  # Skip empty messages
             return 0, None
-            
-        max_duplicates = config['spam_detection']['max_duplicate_messages']
         
-        # Count this message
-        self.duplicate_messages[user_id][content] += 1
-        duplicate_count = self.duplicate_messages[user_id][content]
+        message = scan.message
+        policy = scan.policy
+        user_id = str(message.author.id)
+            
+        max_duplicates = policy.max_duplicate_messages
         
-        # Clean old duplicate tracking
-        if len(self.duplicate_messages[user_id]) > 20:
-            oldest_content = min(self.duplicate_messages[user_id].keys(), 
-                               key=lambda k: self.duplicate_messages[user_id][k])
-            del self.duplicate_messages[user_id][oldest_content]
+        # Count this message against the user's recent messages (one-character edits still match,
+        # except in short messages like "yes!"/"yes." which only count when identical)
+        index = self.duplicate_indexes.get(user_id)
+        if index is None or index.max_distance != policy.near_duplicate_distance:
+            index = self.duplicate_indexes[user_id] = NearDuplicateIndex(max_distance=policy.near_duplicate_distance)
+        scope = message.channel.id if policy.duplicate_per_channel else None
+        duplicate_count = index.add(scan.normalized, scope)
         
         if duplicate_count > max_duplicates:
             if duplicate_count >= max_duplicates + 3:
@@ -165,9 +255,51 @@ class SpamDetector:
                 
         return 0, None
     
-    def _check_mention_spam(self, message: discord.Message, config: Dict[str, Any]) -> tuple:
+    def _check_coordinated_spam(self, scan: _Scan) -> bool:
+        """Check whether this content is part of a wave posted by many distinct accounts"""
+        policy = scan.policy
+        if policy.coordinated_spam_threshold <= 0:
+            return False
+        
+        # Short link-less chatter ("gm", "lol") is legitimately repeated by many people.
+        # Links are only looked for once length and @everyone have not already decided it
+        message = scan.message
+        if (len(message.content) < policy.coordinated_spam_min_length and not message.mention_everyone
+                and 'discord.gg/' not in scan.lowered and not scan.urls):
+            return False
+        
+        guild_id = str(message.guild.id)
+        index = self.coordination_indexes.get(guild_id)
+        if (index is None or index.threshold != policy.coordinated_spam_threshold
+                or index.window_seconds != policy.coordinated_spam_window
+                or index.max_distance != policy.coordinated_spam_distance):
+            index = self.coordination_indexes[guild_id] = CoordinatedSpamIndex(
+                threshold=policy.coordinated_spam_threshold,
+                window_seconds=policy.coordinated_spam_window,
+                max_distance=policy.coordinated_spam_distance
+            )
+        
+        members = index.observe(scan.normalized, message.author.id, message.channel.id, message.id)
+        if not members:
+            return False
+        
+        others = [member for member in members if member[2] != message.id]
+        if others:
+            self.coordinated_members[message.id] = others
+        logger.warning(
+            f"Coordinated spam detected in {message.guild.name}: {message.author} plus {len(others)} other account(s) "
+            f"posted near-identical content within {policy.coordinated_spam_window}s"
+        )
+        return True
+    
+    def take_coordinated_members(self, message: discord.Message) -> List[ClusterMember]:
+        """Other (user_id, channel_id, message_id) sightings flagged together with this message"""
+        return self.coordinated_members.pop(message.id, [])
+    
+    def _check_mention_spam(self, scan: _Scan) -> tuple:
         """Check for excessive mentions"""
-        max_mentions = config['spam_detection']['max_mentions_per_message']
+        message = scan.message
+        max_mentions = scan.policy.max_mentions_per_message
         
         total_mentions = len(message.mentions) + len(message.role_mentions)
         
@@ -182,21 +314,9 @@ class SpamDetector:
                 
         return 0, None
     
-    def _check_link_spam(self, message: discord.Message) -> tuple:
+    def _check_link_spam(self, scan: _Scan) -> tuple:
         """Check for suspicious links"""
-        content = message.content.lower()
-        
-        # Common spam link patterns
-        suspicious_domains = [
-            'discord.gg',  # Invite links (context dependent)
-            'bit.ly', 'tinyurl.com', 'ow.ly',  # URL shorteners
-            'free-discord-nitro', 'discord-nitro',  # Fake nitro scams
-            'steam-gift', 'free-csgo', 'free-game'  # Gaming scams
-        ]
-        
-        # Find URLs in message
-        url_pattern = r'https?://(?:[-\w.])+(?:\:[0-9]+)?(?:/(?:[\w/_.])*(?:\?(?:[\w&=%.])*)?(?:\#(?:[\w.])*)?)?'
-        urls = re.findall(url_pattern, content)
+        urls = scan.urls
         
         if not urls:
             return 0, None
@@ -209,22 +329,24 @@ class SpamDetector:
             spam_score += 1
             reasons.append(f"Multiple links ({len(urls)} URLs)")
         
-        # Check for suspicious domains
-        for url in urls:
-            for domain in suspicious_domains:
-                if domain in url:
-                    spam_score += 2
-                    reasons.append(f"Suspicious domain: {domain}")
-                    break
+        # Check for suspicious domains: one automaton pass over the normalised
+        # hosts, plus the homoglyph skeleton of any internationalised host
+        hosts = [url.host for url in urls]
+        hosts.extend(self.skeletons(url.unicode_host) for url in urls if url.unicode_host != url.host)
+        domain_hits = scan.policy.domain_matcher.find_all(' '.join(hosts))
+        if domain_hits:
+            spam_score += 2
+            reasons.append(f"Suspicious domain: {', '.join(domain_hits)}")
         
         return min(spam_score, 2), "; ".join(reasons) if reasons else None
     
-    def _check_content_patterns(self, message: discord.Message) -> tuple:
+    def _check_content_patterns(self, scan: _Scan) -> tuple:
         """Check message content for spam patterns"""
-        content = message.content.lower()
-        
-        if not content.strip():
+        if not scan.content:
             return 0, None
+        
+        message = scan.message
+        content = scan.lowered
             
         spam_score = 0
         reasons = []
@@ -237,18 +359,15 @@ class SpamDetector:
                 spam_score += 1
                 reasons.append("Excessive capital letters")
         
-        # Check for spam keywords
-        spam_keywords = [
-            'free nitro', 'discord nitro free', 'free discord',
-            'click here', 'limited time', 'act now',
-            'congratulations', 'you have won', 'claim now'
-        ]
-        
-        for keyword in spam_keywords:
-            if keyword in content:
-                spam_score += 1
-                reasons.append(f"Spam keyword detected")
-                break
+        # Check for spam keywords, also against the homoglyph skeleton ("frее nitrо" in Cyrillic)
+        keyword_matcher = scan.policy.keyword_matcher
+        keyword_hits = keyword_matcher.find_all(content)
+        folded = self.skeletons(scan.content)
+        if folded != content:
+            keyword_hits += [hit for hit in keyword_matcher.find_all(folded) if hit not in keyword_hits]
+        if keyword_hits:
+            spam_score += 1
+            reasons.append(f"Spam keyword detected: {', '.join(keyword_hits)}")
         
         return min(spam_score, 2), "; ".join(reasons) if reasons else None
     
@@ -265,13 +384,50 @@ class SpamDetector:
             'guild_id': message.guild.id if message.guild else None
         })
     
-    def clear_user_data(self, user_id: str):
+    def clear_user_data(self, user_id: str, guild_id: Optional[str] = None):
         """Clear tracking data for a user"""
         user_id = str(user_id)
         
-        if user_id in self.user_messages:
-            del self.user_messages[user_id]
-        if user_id in self.user_message_times:
-            del self.user_message_times[user_id]
-        if user_id in self.duplicate_messages:
-            del self.duplicate_messages[user_id]
+        self.user_messages.pop(user_id)
+        self.duplicate_indexes.pop(user_id)
+        if guild_id is not None:
+            self.rate_limiter.reset(('u', int(guild_id), int(user_id)))
+    
+    def sweep(self) -> int:
+        """Evict idle per-user state; returns how many entries were dropped"""
+        return self.user_messages.sweep() + self.rate_limiter.sweep() + self.duplicate_indexes.sweep()
+    
+    def get_pipeline_stats(self) -> Dict[str, Any]:
+        """Per-stage run/skip counts and timings plus recent scan latency percentiles"""
+        scan_times = sorted(self.scan_times_ns)
+        def percentile(fraction: float) -> float:
+            if not scan_times:
+                return 0.0
+            return scan_times[min(len(scan_times) - 1, int(len(scan_times) * fraction))] / 1000
+        
+        return {
+            'stages': {
+                name: {
+                    'runs': timing.runs,
+                    'skipped': timing.skipped,
+                    'avg_us': timing.total_ns / timing.runs / 1000 if timing.runs else 0.0,
+                    'max_us': timing.max_ns / 1000
+                }
+                for name, timing in self.stage_timings.items()
+            },
+            'early_exits': self.early_exits,
+            'url_host_cache': get_url_cache_stats(),
+            'skeleton_cache': self.skeletons.get_stats(),
+            'scan_p50_us': percentile(0.5),
+            'scan_p95_us': percentile(0.95)
+        }
+    
+    def get_state_stats(self) -> Dict[str, Any]:
+        """Tracked-user and eviction counters for BotMonitor"""
+        return {
+            'user_messages': self.user_messages.get_stats(),
+            'rate_limiter': self.rate_limiter.get_stats(),
+            'duplicate_indexes': self.duplicate_indexes.get_stats(),
+            'coordination_clusters': sum(len(index) for index in self.coordination_indexes.values()),
+            'pending_coordinated_messages': len(self.coordinated_members)
+        }
@@ -0,0 +1,528 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+import logging
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from cash_ledger import CashLedger
+from persistence import PersistenceWorker
+from economy_store import EconomyStore, STARTING_CASH, make_key
+from leaderboard import LeaderboardIndex
+
+try:
+    import asyncpg
+except ImportError:  # Only needed for the postgres backend
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+# (cash, last_daily, daily_streak)
+CashRow = Tuple[int, Optional[date], int]
+# compute(current_cash, last_daily, current_streak) -> (reward, new_cash, new_streak) or None if already claimed
+DailyClaimFn = Callable[[int, Optional[date], int], Optional[Tuple[int, int, int]]]
+# (reward, new_cash, new_streak, old_streak) on success, None if already claimed, False on storage error
+DailyClaimResult = Union[Tuple[int, int, int, int], None, bool]
+# New balance on success, None if the balance is too low, False on storage error
+SpendResult = Union[int, None, bool]
+# (giver's new balance, receiver's new balance) on success, None if the giver is short, False on storage error
+TransferResult = Union[Tuple[int, int], None, bool]
+
+class CashStorage(ABC):
+    """Async storage interface for the economy, trivia history and Tai/Xiu game tables"""
+    backend_name = 'base'
+
+    async def start(self):
+        """Open connections / load data"""
+
+    async def flush(self):
+        """Periodic maintenance from the backup loop (fsync, compaction)"""
+
+    def next_flush_delay(self) -> float:
+        """How long the backup loop may sleep before calling flush() again"""
+        return 1.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Persistence counters for monitoring"""
+        return {'backend': self.backend_name}
+
+    async def close(self):
+        """Flush and release resources"""
+
+    @abstractmethod
+    async def get_user_cash(self, guild_id: str, user_id: str) -> CashRow:
+        """(cash, last_daily, daily_streak), with starting cash for unknown users"""
+
+    @abstractmethod
+    async def add_cash(self, guild_id: str, user_id: str, delta: int) -> bool:
+        """Add delta (may be negative) to an account"""
+
+    @abstractmethod
+    async def add_cash_batch(self, guild_id: str, deltas: List[Tuple[str, int]]) -> bool:
+        """Apply several (user_id, delta) changes atomically: all or none"""
+
+    @abstractmethod
+    async def spend_cash(self, guild_id: str, user_id: str, amount: int) -> SpendResult:
+        """Atomically deduct amount if the balance covers it"""
+
+    @abstractmethod
+    async def transfer_cash(self, guild_id: str, from_user_id: str, to_user_id: str, amount: int) -> TransferResult:
+        """Atomically move amount between two accounts if the giver's balance covers it"""
+
+    @abstractmethod
+    async def set_cash(self, guild_id: str, user_id: str, cash: int, last_daily: Optional[date], daily_streak: int) -> bool:
+        """Set an account's absolute cash and daily streak state"""
+
+    @abstractmethod
+    async def claim_daily(self, guild_id: str, user_id: str, today: date, compute: DailyClaimFn) -> DailyClaimResult:
+        """Atomically read the account, run compute() and store the claim dated today"""
+
+    @abstractmethod
+    async def get_leaderboard_page(self, guild_id: str, page: int, per_page: int = 10) -> Tuple[List[Tuple[str, int, int]], int]:
+        """
+        One page of (user_id, cash, daily_streak) rows for users with positive
+        cash, richest first, plus the total number of ranked users
+        """
+
+    @abstractmethod
+    async def get_user_rank(self, guild_id: str, user_id: str) -> Optional[int]:
+        """1-based leaderboard position, or None if the user has no cash"""
+
+    @abstractmethod
+    async def get_shown_questions(self, guild_id: str) -> Set[str]:
+        """Trivia questions already shown in a guild"""
+
+    @abstractmethod
+    async def mark_questions_shown(self, guild_id: str, questions: Iterable[str]):
+        """Remember questions as shown in a guild"""
+
+    @abstractmethod
+    async def reset_question_history(self, guild_id: str):
+        """Forget a guild's shown questions"""
+
+    @abstractmethod
+    async def record_game(self, game_id: str, guild_id: str, channel_id: str):
+        """Store a new Tai/Xiu round"""
+
+    @abstractmethod
+    async def finish_game(self, game_id: str, result: str):
+        """Mark a Tai/Xiu round as ended with its result"""
+
+class MemoryCashStorage(CashStorage):
+    """
+    In-process storage backed by the JSON snapshot + cash ledger.
+
+    This is the default backend, and since it has the same semantics as
+    PostgresCashStorage it doubles as the in-process fake for CI.
+    """
+    backend_name = 'json'
+
+    def __init__(self, backup_file_path: str = "user_cash_backup.json", persist: bool = True,
+                 flush_debounce: float = 0.25, flush_max_latency: float = 1.0):
+        self.memory = EconomyStore()
+        # fsync and snapshot writes run on this thread, never on the event loop
+        self.worker = PersistenceWorker("cash-persistence") if persist else None
+        self.ledger = CashLedger(backup_file_path, worker=self.worker, flush_debounce=flush_debounce,
+                                 flush_max_latency=flush_max_latency) if persist else None
+        self.shown_questions: Dict[str, Set[str]] = defaultdict(set)
+        self.games: Dict[str, Dict[str, Any]] = {}
+        self._daily_locks: Dict[str, asyncio.Lock] = {}
+        self.leaderboard = LeaderboardIndex()
+
+    async def start(self):
+        if self.worker:
+            self.worker.start()
+        if self.ledger:
+            try:
+                self.memory = self.ledger.load()
+            except Exception as e:
+                logger.error(f"Error loading backup data: {e}")
+
+        # Build the ranking once; from here on every mutation keeps it in sync
+        self.leaderboard.clear()
+        for guild_id, user_id, account in self.memory.items():
+            self.leaderboard.update(guild_id, user_id, account.cash)
+
+    async def flush(self):
+        if not self.ledger:
+            return
+        self.ledger.sync_if_due()
+        if self.ledger.needs_compaction():
+            self.save_snapshot()
+
+    def next_flush_delay(self):
+        delay = self.ledger.flush_delay() if self.ledger else None
+        # Clean ledgers still get a 1s tick so time-based compaction is noticed
+        return 1.0 if delay is None else min(delay, 1.0)
+
+    def get_stats(self):
+        stats = super().get_stats()
+        stats['accounts'] = len(self.memory)
+        if self.ledger:
+            stats.update(self.ledger.get_stats())
+        if self.worker:
+            stats['worker'] = self.worker.get_stats()
+        return stats
+
+    async def close(self):
+        if self.ledger:
+            # Waits for queued writes, so keep it off the loop as well
+            await asyncio.to_thread(self.ledger.close)
+        if self.worker:
+            await asyncio.to_thread(self.worker.stop)
+
+    def save_snapshot(self):
+        """Compact the ledger into a full snapshot"""
+        # Don't save if memory is completely empty
+        if self.ledger and self.memory:
+            self.ledger.compact(self.memory)
+
+    async def get_user_cash(self, guild_id, user_id):
+        account = self.memory.get(guild_id, user_id)
+        if account is None:
+            # Give new users some starting cash
+            return STARTING_CASH, None, 0
+        return account.cash, account.last_daily, account.daily_streak
+
+    async def add_cash(self, guild_id, user_id, delta):
+        account = self.memory.add(guild_id, user_id, delta)
+        self.leaderboard.update(guild_id, user_id, account.cash)
+        if self.ledger:
+            self.ledger.record_add(make_key(guild_id, user_id), delta)
+        return True
+
+    async def add_cash_batch(self, guild_id, deltas):
+        for user_id, delta in deltas:
+            account = self.memory.add(guild_id, user_id, delta)
+            self.leaderboard.update(guild_id, user_id, account.cash)
+        if self.ledger:
+            # One ledger record, so a crash can never leave half a round paid out
+            self.ledger.record_add_batch([(make_key(guild_id, user_id), delta) for user_id, delta in deltas])
+        return True
+
+    def _balance(self, guild_id, user_id) -> int:
+        account = self.memory.get(guild_id, user_id)
+        return STARTING_CASH if account is None else account.cash
+
+    async def spend_cash(self, guild_id, user_id, amount):
+        # Nothing here suspends, so no other command can run between the check and the write
+        if self._balance(guild_id, user_id) < amount:
+            return None
+        account = self.memory.add(guild_id, user_id, -amount)
+        self.leaderboard.update(guild_id, user_id, account.cash)
+        if self.ledger:
+            self.ledger.record_add(make_key(guild_id, user_id), -amount)
+        return account.cash
+
+    async def transfer_cash(self, guild_id, from_user_id, to_user_id, amount):
+        if self._balance(guild_id, from_user_id) < amount:
+            return None
+        await self.add_cash_batch(guild_id, [(from_user_id, -amount), (to_user_id, amount)])
+        return self._balance(guild_id, from_user_id), self._balance(guild_id, to_user_id)
+
+    async def set_cash(self, guild_id, user_id, cash, last_daily, daily_streak):
+        self.memory.set(guild_id, user_id, cash, last_daily, daily_streak)
+        self.leaderboard.update(guild_id, user_id, cash)
+        if self.ledger:
+            self.ledger.record_set(make_key(guild_id, user_id), cash, last_daily, daily_streak)
+        return True
+
+    async def claim_daily(self, guild_id, user_id, today, compute):
+        key = make_key(guild_id, user_id)
+        if key not in self._daily_locks:
+            self._daily_locks[key] = asyncio.Lock()
+
+        async with self._daily_locks[key]:
+            current_cash, last_daily, current_streak = await self.get_user_cash(guild_id, user_id)
+            claim = compute(current_cash, last_daily, current_streak)
+            if claim is None:
+                return None
+
+            reward, new_cash, new_streak = claim
+            await self.set_cash(guild_id, user_id, new_cash, today, new_streak)
+            return (reward, new_cash, new_streak, current_streak)
+
+    async def get_leaderboard_page(self, guild_id, page, per_page=10):
+        rows = []
+        for user_id, cash in self.leaderboard.page(guild_id, page, per_page):
+            account = self.memory.get(guild_id, user_id)
+            rows.append((user_id, cash, account.daily_streak if account else 0))
+        return rows, self.leaderboard.count(guild_id)
+
+    async def get_user_rank(self, guild_id, user_id):
+        return self.leaderboard.rank(guild_id, user_id)
+
+    async def get_shown_questions(self, guild_id):
+        return set(self.shown_questions.get(guild_id, ()))
+
+    async def mark_questions_shown(self, guild_id, questions):
+        self.shown_questions[guild_id].update(questions)
+
+    async def reset_question_history(self, guild_id):
+        self.shown_questions.pop(guild_id, None)
+
+    async def record_game(self, game_id, guild_id, channel_id):
+        self.games[game_id] = {'guild_id': guild_id, 'channel_id': channel_id, 'status': 'active', 'result': None}
+
+    async def finish_game(self, game_id, result):
+        game = self.games.pop(game_id, None)
+        if game is not None:
+            logger.debug(f"Game {game_id} in guild {game['guild_id']} ended with {result}")
+
+class PostgresCashStorage(CashStorage):
+    """
+    PostgreSQL backend on an asyncpg connection pool.
+
+    Queries go through asyncpg's per-connection statement cache, so each
+    statement below is prepared once per pooled connection and reused.
+    Cash is stored as NUMERIC so ?moneyhack's 50-digit balances fit.
+    """
+    backend_name = 'postgres'
+
+    CREATE_TABLES = (
+        """CREATE TABLE IF NOT EXISTS user_cash (
+               guild_id VARCHAR(50) NOT NULL,
+               user_id VARCHAR(50) NOT NULL,
+               cash NUMERIC(80, 0) DEFAULT 0,
+               last_daily DATE,
+               daily_streak INTEGER DEFAULT 0,
+               PRIMARY KEY (guild_id, user_id)
+           )""",
+        """CREATE TABLE IF NOT EXISTS shown_questions (
+               guild_id VARCHAR(50) NOT NULL,
+               question_text TEXT NOT NULL,
+               PRIMARY KEY (guild_id, question_text)
+           )""",
+        """CREATE TABLE IF NOT EXISTS overunder_games (
+               game_id VARCHAR(50) PRIMARY KEY,
+               guild_id VARCHAR(50) NOT NULL,
+               channel_id VARCHAR(50) NOT NULL,
+               status VARCHAR(20) DEFAULT 'active',
+               result VARCHAR(10),
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+           )""",
+    )
+
+    SELECT_CASH = "SELECT cash, last_daily, daily_streak FROM user_cash WHERE guild_id = $1 AND user_id = $2"
+    SELECT_CASH_FOR_UPDATE = SELECT_CASH + " FOR UPDATE"
+    ADD_CASH = """INSERT INTO user_cash (guild_id, user_id, cash) VALUES ($1, $2, $3)
+                  ON CONFLICT (guild_id, user_id) DO UPDATE SET cash = user_cash.cash + $4"""
+    ENSURE_ACCOUNT = """INSERT INTO user_cash (guild_id, user_id, cash) VALUES ($1, $2, $3)
+                        ON CONFLICT (guild_id, user_id) DO NOTHING"""
+    LOCK_ACCOUNTS = """SELECT user_id FROM user_cash WHERE guild_id = $1 AND user_id = ANY($2::varchar[])
+                       ORDER BY user_id FOR UPDATE"""
+    SPEND_CASH = """UPDATE user_cash SET cash = cash - $3
+                    WHERE guild_id = $1 AND user_id = $2 AND cash >= $3 RETURNING cash"""
+    CREDIT_CASH = "UPDATE user_cash SET cash = cash + $3 WHERE guild_id = $1 AND user_id = $2 RETURNING cash"
+    SET_CASH = """INSERT INTO user_cash (guild_id, user_id, cash, last_daily, daily_streak) VALUES ($1, $2, $3, $4, $5)
+                  ON CONFLICT (guild_id, user_id)
+                  DO UPDATE SET cash = EXCLUDED.cash, last_daily = EXCLUDED.last_daily, daily_streak = EXCLUDED.daily_streak"""
+    SELECT_LEADERBOARD_PAGE = """SELECT user_id, cash, daily_streak FROM user_cash
+                                 WHERE guild_id = $1 AND cash > 0 ORDER BY cash DESC, user_id
+                                 LIMIT $2 OFFSET $3"""
+    COUNT_LEADERBOARD = "SELECT COUNT(*) FROM user_cash WHERE guild_id = $1 AND cash > 0"
+    SELECT_USER_RANK = """SELECT COUNT(*) + 1 FROM user_cash AS other, user_cash AS me
+                          WHERE me.guild_id = $1 AND me.user_id = $2 AND me.cash > 0
+                            AND other.guild_id = me.guild_id
+                            AND (other.cash > me.cash OR (other.cash = me.cash AND other.user_id < me.user_id))"""
+    SELECT_HAS_CASH = "SELECT 1 FROM user_cash WHERE guild_id = $1 AND user_id = $2 AND cash > 0"
+    SELECT_SHOWN_QUESTIONS = "SELECT question_text FROM shown_questions WHERE guild_id = $1"
+    INSERT_SHOWN_QUESTION = """INSERT INTO shown_questions (guild_id, question_text) VALUES ($1, $2)
+                               ON CONFLICT (guild_id, question_text) DO NOTHING"""
+    DELETE_SHOWN_QUESTIONS = "DELETE FROM shown_questions WHERE guild_id = $1"
+    INSERT_GAME = "INSERT INTO overunder_games (game_id, guild_id, channel_id) VALUES ($1, $2, $3)"
+    FINISH_GAME = "UPDATE overunder_games SET result = $1, status = 'ended' WHERE game_id = $2"
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pool = None
+
+    async def start(self):
+        if asyncpg is None:
+            raise RuntimeError("The postgres storage backend requires the asyncpg package")
+
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size)
+        async with self.pool.acquire() as connection:
+            for statement in self.CREATE_TABLES:
+                await connection.execute(statement)
+        logger.info("Database tables created/verified successfully")
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def get_user_cash(self, guild_id, user_id):
+        try:
+            row = await self.pool.fetchrow(self.SELECT_CASH, str(guild_id), str(user_id))
+        except Exception as e:
+            logger.error(f"Error getting user cash: {e}")
+            return 0, None, 0
+
+        if row is None:
+            return STARTING_CASH, None, 0
+        return int(row['cash']), row['last_daily'], row['daily_streak']
+
+    async def add_cash(self, guild_id, user_id, delta):
+        try:
+            await self.pool.execute(self.ADD_CASH, str(guild_id), str(user_id), Decimal(STARTING_CASH + delta), Decimal(delta))
+            return True
+        except Exception as e:
+            logger.error(f"Error updating user cash: {e}")
+            return False
+
+    async def add_cash_batch(self, guild_id, deltas):
+        values = [(str(guild_id), str(user_id), Decimal(STARTING_CASH + delta), Decimal(delta)) for user_id, delta in deltas]
+        try:
+            async with self.pool.acquire() as connection:
+                async with connection.transaction():
+                    await connection.executemany(self.ADD_CASH, values)
+            return True
+        except Exception as e:
+            logger.error(f"Error applying cash batch: {e}")
+            return False
+
+    async def spend_cash(self, guild_id, user_id, amount):
+        try:
+            async with self.pool.acquire() as connection:
+                async with connection.transaction():
+                    # Unknown users start with STARTING_CASH, as get_user_cash reports
+                    await connection.execute(self.ENSURE_ACCOUNT, str(guild_id), str(user_id), Decimal(STARTING_CASH))
+                    # The balance check and the write are one statement, so concurrent spends cannot overdraw
+                    remaining = await connection.fetchval(self.SPEND_CASH, str(guild_id), str(user_id), Decimal(amount))
+            return None if remaining is None else int(remaining)
+        except Exception as e:
+            logger.error(f"Error spending user cash: {e}")
+            return False
+
+    async def transfer_cash(self, guild_id, from_user_id, to_user_id, amount):
+        guild_id, from_user_id, to_user_id = str(guild_id), str(from_user_id), str(to_user_id)
+        # Rows are created and locked in user_id order so opposite transfers cannot deadlock
+        user_ids = sorted({from_user_id, to_user_id})
+        try:
+            async with self.pool.acquire() as connection:
+                async with connection.transaction():
+                    for user_id in user_ids:
+                        await connection.execute(self.ENSURE_ACCOUNT, guild_id, user_id, Decimal(STARTING_CASH))
+                    await connection.fetch(self.LOCK_ACCOUNTS, guild_id, user_ids)
+                    giver_cash = await connection.fetchval(self.SPEND_CASH, guild_id, from_user_id, Decimal(amount))
+                    if giver_cash is None:
+                        return None
+                    receiver_cash = await connection.fetchval(self.CREDIT_CASH, guild_id, to_user_id, Decimal(amount))
+            return int(giver_cash), int(receiver_cash)
+        except Exception as e:
+            logger.error(f"Error transferring cash: {e}")
+            return False
+
+    async def set_cash(self, guild_id, user_id, cash, last_daily, daily_streak):
+        try:
+            await self.pool.execute(self.SET_CASH, str(guild_id), str(user_id), Decimal(cash), last_daily, daily_streak)
+            return True
+        except Exception as e:
+            logger.error(f"Error updating user cash: {e}")
+            return False
+
+    async def claim_daily(self, guild_id, user_id, today, compute):
+        try:
+            async with self.pool.acquire() as connection:
+                async with connection.transaction():
+                    # Row lock prevents two concurrent claims from both succeeding
+                    row = await connection.fetchrow(self.SELECT_CASH_FOR_UPDATE, str(guild_id), str(user_id))
+                    if row is None:
+                        current_cash, last_daily, current_streak = STARTING_CASH, None, 0
+                    else:
+                        current_cash, last_daily, current_streak = int(row['cash']), row['last_daily'], row['daily_streak']
+
+                    claim = compute(current_cash, last_daily, current_streak)
+                    if claim is None:
+                        return None
+
+                    reward, new_cash, new_streak = claim
+                    await connection.execute(self.SET_CASH, str(guild_id), str(user_id), Decimal(new_cash), today, new_streak)
+                    return (reward, new_cash, new_streak, current_streak)
+        except Exception as e:
+            logger.error(f"Error claiming daily reward: {e}")
+            return False
+
+    async def get_leaderboard_page(self, guild_id, page, per_page=10):
+        try:
+            async with self.pool.acquire() as connection:
+                total = await connection.fetchval(self.COUNT_LEADERBOARD, str(guild_id))
+                rows = await connection.fetch(self.SELECT_LEADERBOARD_PAGE, str(guild_id), per_page, (page - 1) * per_page)
+        except Exception as e:
+            logger.error(f"Error getting leaderboard page: {e}")
+            return [], 0
+        return [(row['user_id'], int(row['cash']), row['daily_streak']) for row in rows], total
+
+    async def get_user_rank(self, guild_id, user_id):
+        try:
+            async with self.pool.acquire() as connection:
+                if not await connection.fetchval(self.SELECT_HAS_CASH, str(guild_id), str(user_id)):
+                    return None
+                return await connection.fetchval(self.SELECT_USER_RANK, str(guild_id), str(user_id))
+        except Exception as e:
+            logger.error(f"Error getting user rank: {e}")
+            return None
+
+    async def get_shown_questions(self, guild_id):
+        try:
+            rows = await self.pool.fetch(self.SELECT_SHOWN_QUESTIONS, guild_id)
+            return {row['question_text'] for row in rows}
+        except Exception as e:
+            logger.error(f"Error getting shown questions: {e}")
+            return set()
+
+    async def mark_questions_shown(self, guild_id, questions):
+        values = [(guild_id, question) for question in questions]
+        if not values:
+            return
+        try:
+            await self.pool.executemany(self.INSERT_SHOWN_QUESTION, values)
+        except Exception as e:
+            logger.error(f"Error marking questions as shown: {e}")
+
+    async def reset_question_history(self, guild_id):
+        try:
+            await self.pool.execute(self.DELETE_SHOWN_QUESTIONS, guild_id)
+            logger.info(f"Reset question history for guild {guild_id}")
+        except Exception as e:
+            logger.error(f"Error resetting question history: {e}")
+
+    async def record_game(self, game_id, guild_id, channel_id):
+        try:
+            await self.pool.execute(self.INSERT_GAME, game_id, guild_id, channel_id)
+        except Exception as e:
+            logger.error(f"Error storing game in database: {e}")
+
+    async def finish_game(self, game_id, result):
+        try:
+            await self.pool.execute(self.FINISH_GAME, result, game_id)
+        except Exception as e:
+            logger.error(f"Error updating game result: {e}")
+
+def create_storage(backup_file_path: str = "user_cash_backup.json") -> CashStorage:
+    """
+    Pick the storage backend from the environment.
+
+    STORAGE_BACKEND=postgres (with DATABASE_URL) selects PostgreSQL; anything
+    else, and always under Colab, uses the JSON snapshot + ledger backend.
+    """
+    backend = os.environ.get('STORAGE_BACKEND', 'json').lower()
+    database_url = os.environ.get('DATABASE_URL')
+
+    if backend == 'postgres' and os.environ.get('COLAB_ENVIRONMENT') != 'true':
+        if database_url:
+            logger.info("🐘 Using PostgreSQL storage backend")
+            return PostgresCashStorage(database_url)
+        logger.warning("STORAGE_BACKEND=postgres but DATABASE_URL is not set, falling back to JSON storage")
+
+    logger.info("📱 Using file-based storage (JSON backup) for data persistence")
+    return MemoryCashStorage(
+        backup_file_path,
+        flush_debounce=float(os.environ.get('CASH_FLUSH_DEBOUNCE', 0.25)),
+        flush_max_latency=float(os.environ.get('CASH_FLUSH_MAX_LATENCY', 1.0))
+    )
@@ -0,0 +1,57 @@
+"""
+CoordinatedSpamIndex: waves of the same content from many accounts are
+flagged, ordinary chatter from many accounts is not.
+"""
+import random
+import string
+
+from coordinated_spam import CoordinatedSpamIndex
+
+WORDS = ("the a to is in it you that of and i for on was with he she they we this my your game play server "
+         "discord time help get can will just like know what so good when one all do new out up see about how").split()
+SCAM = "FREE NITRO for everyone click here https://discord-gift.com/abc"
+
+def chatter(rng, count, min_length=30):
+    lines = []
+    while len(lines) < count:
+        line = ' '.join(rng.choices(WORDS, k=rng.randint(3, 20)))
+        if len(line) >= min_length:
+            lines.append(line)
+    return lines
+
+def mutate(rng, text):
+    i = rng.randrange(len(text))
+    return text[:i] + rng.choice(string.ascii_letters + string.digits) + text[i + 1:]
+
+def test_verbatim_wave_is_flagged_at_threshold():
+    index = CoordinatedSpamIndex(threshold=5)
+    results = [index.observe(SCAM, author_id, 1, author_id, now=float(author_id)) for author_id in range(5)]
+    assert results[:4] == [[], [], [], []]
+    assert sorted(member[0] for member in results[4]) == [0, 1, 2, 3, 4]
+    # Later authors are returned on their own while the cluster stays flagged
+    assert index.observe(SCAM, 5, 1, 5, now=5.0) == [(5, 1, 5)]
+
+def test_mutated_waves_are_flagged():
+    # str hashes are salted per process, so average over many bases rather than pin one fingerprint
+    rng = random.Random(1)
+    caught = 0
+    for base in chatter(rng, 50, min_length=40):
+        index = CoordinatedSpamIndex(threshold=5)
+        caught += any(index.observe(mutate(rng, base), author_id, 1, author_id, now=0.0) for author_id in range(8))
+    assert caught >= 25
+
+def test_distinct_chatter_is_not_flagged():
+    rng = random.Random(1)
+    index = CoordinatedSpamIndex()
+    now = 0.0
+    for author_id, line in enumerate(chatter(rng, 20000)):
+        now += 0.01
+        assert index.observe(line, author_id, 1, author_id, now=now) == []
+    assert max(len(bucket) for band in index._bands for bucket in band.values()) <= index.MAX_BUCKET
+
+def test_expired_clusters_release_their_keys():
+    index = CoordinatedSpamIndex(window_seconds=10)
+    index.observe(SCAM, 1, 1, 1, now=0.0)
+    index.observe("something else entirely, long enough to count", 2, 1, 2, now=20.0)
+    assert len(index) == 1
+    assert len(index._exact) == 1
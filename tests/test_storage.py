@@ -0,0 +1,140 @@
+"""
+The CashStorage contract, run against the in-process MemoryCashStorage and
+against PostgresCashStorage. The Postgres run needs TEST_DATABASE_URL
+pointing at a scratch database and is skipped without it.
+"""
+import asyncio
+import itertools
+import os
+import time
+from datetime import date
+
+import pytest
+
+from economy_store import STARTING_CASH
+from storage import CashStorage, MemoryCashStorage, PostgresCashStorage, asyncpg
+
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+
+# Fresh guild per test so Postgres runs never see each other's rows
+_guild_ids = itertools.count(int(time.time() * 1000) * 1000)
+
+@pytest.fixture(params=['memory', 'postgres'])
+def backend(request):
+    if request.param == 'postgres':
+        if not TEST_DATABASE_URL:
+            pytest.skip("TEST_DATABASE_URL is not set")
+        if asyncpg is None:
+            pytest.skip("asyncpg is not installed")
+    return request.param
+
+def run(backend, test):
+    """Run test(storage, guild_id) on a started storage of the given backend, inside one event loop"""
+    async def main():
+        if backend == 'memory':
+            storage = MemoryCashStorage(persist=False)
+        else:
+            storage = PostgresCashStorage(TEST_DATABASE_URL, max_size=4)
+        await storage.start()
+        guild_id = str(next(_guild_ids))
+        try:
+            await test(storage, guild_id)
+        finally:
+            if backend == 'postgres':
+                await storage.pool.execute("DELETE FROM user_cash WHERE guild_id = $1", guild_id)
+            await storage.close()
+    asyncio.run(main())
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        CashStorage()
+
+def test_unknown_user_gets_starting_cash(backend):
+    async def test(storage, guild_id):
+        assert await storage.get_user_cash(guild_id, '1') == (STARTING_CASH, None, 0)
+    run(backend, test)
+
+def test_add_and_set_cash(backend):
+    async def test(storage, guild_id):
+        assert await storage.add_cash(guild_id, '1', 500)
+        assert (await storage.get_user_cash(guild_id, '1'))[0] == STARTING_CASH + 500
+        assert await storage.add_cash(guild_id, '1', -200)
+        assert (await storage.get_user_cash(guild_id, '1'))[0] == STARTING_CASH + 300
+
+        day = date(2026, 10, 17)
+        assert await storage.set_cash(guild_id, '1', 42, day, 3)
+        assert await storage.get_user_cash(guild_id, '1') == (42, day, 3)
+    run(backend, test)
+
+def test_large_balances_survive(backend):
+    async def test(storage, guild_id):
+        huge = 10 ** 49
+        assert await storage.set_cash(guild_id, '1', huge, None, 0)
+        assert await storage.add_cash(guild_id, '1', huge)
+        assert (await storage.get_user_cash(guild_id, '1'))[0] == 2 * huge
+    run(backend, test)
+
+def test_add_cash_batch(backend):
+    async def test(storage, guild_id):
+        assert await storage.add_cash_batch(guild_id, [('1', 100), ('2', -100), ('1', 50)])
+        assert (await storage.get_user_cash(guild_id, '1'))[0] == STARTING_CASH + 150
+        assert (await storage.get_user_cash(guild_id, '2'))[0] == STARTING_CASH - 100
+    run(backend, test)
+
+def test_spend_cash_rejects_overdraw(backend):
+    async def test(storage, guild_id):
+        assert await storage.spend_cash(guild_id, '1', 400) == STARTING_CASH - 400
+        assert await storage.spend_cash(guild_id, '1', STARTING_CASH) is None
+        assert (await storage.get_user_cash(guild_id, '1'))[0] == STARTING_CASH - 400
+        assert await storage.spend_cash(guild_id, '1', STARTING_CASH - 400) == 0
+    run(backend, test)
+
+def test_concurrent_spends_cannot_overdraw(backend):
+    async def test(storage, guild_id):
+        results = await asyncio.gather(*(storage.spend_cash(guild_id, '1', 300) for _ in range(10)))
+        spent = [result for result in results if result is not None]
+        assert len(spent) == STARTING_CASH // 300
+        assert (await storage.get_user_cash(guild_id, '1'))[0] == STARTING_CASH % 300
+    run(backend, test)
+
+def test_transfer(backend):
+    async def test(storage, guild_id):
+        assert await storage.transfer_cash(guild_id, '1', '2', 250) == (STARTING_CASH - 250, STARTING_CASH + 250)
+        assert (await storage.get_user_cash(guild_id, '1'))[0] == STARTING_CASH - 250
+        assert (await storage.get_user_cash(guild_id, '2'))[0] == STARTING_CASH + 250
+    run(backend, test)
+
+def test_transfer_rejects_overdraw(backend):
+    async def test(storage, guild_id):
+        assert await storage.transfer_cash(guild_id, '1', '2', STARTING_CASH + 1) is None
+        assert (await storage.get_user_cash(guild_id, '1'))[0] == STARTING_CASH
+        assert (await storage.get_user_cash(guild_id, '2'))[0] == STARTING_CASH
+    run(backend, test)
+
+def test_concurrent_transfers_lose_no_updates(backend):
+    async def test(storage, guild_id):
+        transfers = [storage.transfer_cash(guild_id, '1', '2', 10) for _ in range(20)]
+        transfers += [storage.transfer_cash(guild_id, '2', '1', 5) for _ in range(20)]
+        results = await asyncio.gather(*transfers)
+        assert all(result not in (None, False) for result in results)
+        assert (await storage.get_user_cash(guild_id, '1'))[0] == STARTING_CASH - 100
+        assert (await storage.get_user_cash(guild_id, '2'))[0] == STARTING_CASH + 100
+    run(backend, test)
+
+def test_leaderboard_paging(backend):
+    async def test(storage, guild_id):
+        for user, cash in enumerate([500, 3000, 0, 1200, 3000, 50, 800], start=1):
+            assert await storage.set_cash(guild_id, str(user), cash, None, user)
+
+        first, total = await storage.get_leaderboard_page(guild_id, 1, per_page=4)
+        second, _ = await storage.get_leaderboard_page(guild_id, 2, per_page=4)
+        empty, _ = await storage.get_leaderboard_page(guild_id, 3, per_page=4)
+
+        # Users with no cash are not ranked; ties break on user_id
+        assert total == 6
+        assert first == [('2', 3000, 2), ('5', 3000, 5), ('4', 1200, 4), ('7', 800, 7)]
+        assert second == [('1', 500, 1), ('6', 50, 6)]
+        assert empty == []
+        assert await storage.get_user_rank(guild_id, '4') == 3
+        assert await storage.get_user_rank(guild_id, '3') is None
+    run(backend, test)
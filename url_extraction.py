@@ -0,0 +1,102 @@
+import re
+from functools import lru_cache
+from typing import List, Tuple
+
+# Invisible characters spammers insert to break up links (h​ttps://...)
+ZERO_WIDTH = dict.fromkeys(map(ord, '­᠎​‌‍‎‏⁠⁡⁢⁣⁤﻿'))
+
+# Defanged dots ("example[.]com") are folded back before matching
+_DEFANGED_DOT = re.compile(r'\[\.\]|\(\.\)|\{\.\}')
+
+_URL_PATTERN = re.compile(
+    r'(?:\b(?:https?|hxxps?)://|\bwww\.'   # scheme, including defanged hxxp, or a bare www.
+    # or a bare dotted host followed by a path; only tried where a host could start, and atomic,
+    # so a long run of dots is scanned once rather than from every label
+    r'|(?<![\w.-])(?P<bare>)(?=(?>[\w-]+(?:\.[\w-]+)+)/))'
+    r'(?P<host>[\w-]+(?:\.[\w-]+)*\.?)'    # host; \w covers internationalised labels
+    r'(?::\d{1,5})?'
+    r'(?P<rest>[/?#][^\s<>"\'`]*)?',
+    re.IGNORECASE
+)
+_TRAILING_PUNCTUATION = '.,;:!?)]}\'"*_~|>'
+
+class ExtractedURL:
+    """One link found in a message, with its host normalised for matching"""
+    __slots__ = ('url', 'host', 'unicode_host')
+
+    def __init__(self, url: str, host: str, unicode_host: str):
+        self.url = url
+        # Lowercase ASCII (punycode) form, no trailing dot
+        self.host = host
+        # Same host with punycode labels decoded, for homoglyph checks
+        self.unicode_host = unicode_host
+
+    def __repr__(self):
+        return f"ExtractedURL({self.url!r}, host={self.host!r})"
+
+def might_contain_url(text: str) -> bool:
+    """Cheap pre-check on cleaned text: every link host has a dot, so without one there is no link to find"""
+    return '.' in text
+
+@lru_cache(maxsize=4096)
+def normalize_host(host: str) -> Tuple[str, str]:
+    """Return (ascii_host, unicode_host) for a raw host: lowercased, trailing dots dropped, IDNA applied"""
+    host = host.lower().rstrip('.')
+    if host.isascii():
+        ascii_host = host
+        if 'xn--' not in host:
+            return host, host
+        try:
+            unicode_host = host.encode('ascii').decode('idna')
+        except UnicodeError:
+            unicode_host = host
+        return ascii_host, unicode_host
+
+    unicode_host = host
+    try:
+        ascii_host = host.encode('idna').decode('ascii')
+    except UnicodeError:
+        # Labels that IDNA rejects (too long, disallowed characters) are kept as written
+        ascii_host = host
+    return ascii_host, unicode_host
+
+def _is_letter_tld(host: str) -> bool:
+    tld = host.rpartition('.')[2]
+    return len(tld) >= 2 and tld.isalpha()
+
+def clean_text(text: str) -> str:
+    """Strip zero-width characters and re-fang defanged dots"""
+    if not text.isascii():
+        text = text.translate(ZERO_WIDTH)
+    if '[' in text or '(' in text or '{' in text:
+        text = _DEFANGED_DOT.sub('.', text)
+    return text
+
+def extract_urls(text: str) -> List[ExtractedURL]:
+    """Find the links in a message, seeing through hxxp, zero-width characters and defanged dots"""
+    # Cleaned first, so zero-width characters cannot hide the markers the pre-check looks for
+    text = clean_text(text)
+    if not might_contain_url(text):
+        return []
+
+    urls = []
+    for match in _URL_PATTERN.finditer(text):
+        url = match.group(0).rstrip(_TRAILING_PUNCTUATION)
+        host, unicode_host = normalize_host(match.group('host'))
+        if '.' not in host:
+            continue
+        # Bare hosts need a letter TLD, so "1.5/2" or "v2.0/docs" are not links
+        if match.group('bare') is not None and not _is_letter_tld(unicode_host):
+            continue
+        urls.append(ExtractedURL(url, host, unicode_host))
+    return urls
+
+def get_cache_stats():
+    info = normalize_host.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hosts_cached': info.currsize,
+        'hits': info.hits,
+        'misses': info.misses,
+        'hit_rate': info.hits / lookups if lookups else 0.0
+    }
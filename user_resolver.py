@@ -0,0 +1,121 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+class UserResolver:
+    """
+    Resolves user IDs to display names for leaderboard-style embeds.
+
+    Lookup order: gateway member cache (guild.get_member), then a TTL/LRU
+    cache of names from earlier REST lookups, and only for true misses a
+    fetch_user call. All misses for one render are fetched concurrently, so
+    a page costs at most one network round trip.
+    """
+
+    def __init__(self, bot, ttl: float = 600.0, max_size: int = 5000):
+        self.bot = bot
+        self.ttl = ttl
+        self.max_size = max_size
+        # user_id -> (display_name, expires_at); ordered oldest -> most recently used
+        self._names: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()
+
+        self.member_hits = 0
+        self.cache_hits = 0
+        self.fetches = 0
+        self.fetch_failures = 0
+
+    def _get_cached(self, user_id: int, now: float) -> Optional[str]:
+        """Return a cached name if it has not expired"""
+        entry = self._names.get(user_id)
+        if entry is None:
+            return None
+        name, expires_at = entry
+        if expires_at <= now:
+            del self._names[user_id]
+            return None
+        self._names.move_to_end(user_id)
+        return name
+
+    def _store(self, user_id: int, name: str, now: float):
+        """Cache a name, evicting the least recently used entries past max_size"""
+        self._names[user_id] = (name, now + self.ttl)
+        self._names.move_to_end(user_id)
+        while len(self._names) > self.max_size:
+            self._names.popitem(last=False)
+
+    async def resolve_names(self, guild: Optional[discord.Guild], user_ids: Iterable) -> Dict[str, str]:
+        """
+        Map user IDs (str or int) to display names, keyed by the ID as given.
+        Users that cannot be resolved are left out of the result.
+        """
+        now = time.monotonic()
+        names: Dict[str, str] = {}
+        misses: Dict[int, list] = {}
+
+        for raw_id in user_ids:
+            try:
+                user_id = int(raw_id)
+            except (TypeError, ValueError):
+                continue
+
+            member = guild.get_member(user_id) if guild else None
+            if member is not None:
+                names[raw_id] = member.display_name
+                self.member_hits += 1
+                continue
+
+            cached = self._get_cached(user_id, now)
+            if cached is not None:
+                names[raw_id] = cached
+                self.cache_hits += 1
+                continue
+
+            misses.setdefault(user_id, []).append(raw_id)
+
+        if misses:
+            # The client's own user cache is free; only go to REST for what is left
+            pending = []
+            for user_id, raw_ids in misses.items():
+                user = self.bot.get_user(user_id)
+                if user is not None:
+                    self._store(user_id, user.display_name, now)
+                    for raw_id in raw_ids:
+                        names[raw_id] = user.display_name
+                else:
+                    pending.append(user_id)
+
+            if pending:
+                self.fetches += len(pending)
+                results = await asyncio.gather(
+                    *(self.bot.fetch_user(user_id) for user_id in pending),
+                    return_exceptions=True
+                )
+                for user_id, result in zip(pending, results):
+                    if isinstance(result, Exception):
+                        self.fetch_failures += 1
+                        logger.debug(f"Could not fetch user {user_id}: {result}")
+                        continue
+                    self._store(user_id, result.display_name, now)
+                    for raw_id in misses[user_id]:
+                        names[raw_id] = result.display_name
+
+        return names
+
+    def invalidate(self, user_id):
+        """Drop a cached name (e.g. after a username change)"""
+        self._names.pop(int(user_id), None)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'cached_names': len(self._names),
+            'member_hits': self.member_hits,
+            'cache_hits': self.cache_hits,
+            'fetches': self.fetches,
+            'fetch_failures': self.fetch_failures
+        }